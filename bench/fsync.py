@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""Measure cost of fsync policies ("objects.fsync" configuration).
+
+Usage:
+
+    bench/fsync.py [<directory>]
+
+For every policy a scratch repository is created in the directory (by
+default, the current one; note that syncing is free on tmpfs, e.g. /tmp) and
+issues are opened in it, first one per group (as separate commands do), and
+then all of them in one batch.  Reported is the median time per issue.
+"""
+
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import issue
+
+
+ISSUES = 50
+
+CONFIG = {
+    'author.email': 'bench@example.com',
+    'author.name': 'Benchmark',
+}
+
+
+def open_separately(repository, n):
+    times = []
+    for i in range(n):
+        begin = time.perf_counter()
+        with issue.util.atomic.group():
+            repository.open('issue {0}'.format(i))
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times)
+
+def open_batched(repository, n):
+    begin = time.perf_counter()
+    with repository.batched():
+        for i in range(n):
+            repository.open('batched issue {0}'.format(i))
+    return (time.perf_counter() - begin) / n
+
+def measure(directory, policy):
+    root = tempfile.mkdtemp(dir = directory, prefix = 'issue-fsync-')
+    cwd = os.getcwd()
+    try:
+        os.chdir(root)
+        issue.util.paths.set_repository_path(os.path.join(root, issue.util.paths.ISSUE_HIDDEN_DIRECTORY))
+        issue.repository.init(where = '.', status = 'endpoint')
+        with open(os.path.join('.issue', 'config.json'), 'w') as ofstream:
+            ofstream.write(json.dumps(dict(CONFIG, **{'objects.fsync': policy})))
+        issue.config.invalidate()
+        repository = issue.Repository(where = root)
+        return (open_separately(repository, ISSUES), open_batched(repository, ISSUES))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+def main(args):
+    directory = os.path.abspath(args[0] if args else '.')
+    for policy in issue.util.atomic.FSYNC_POLICIES:
+        separately, batched = measure(directory, policy)
+        print('{0:8} separately {1:8.2f} ms/issue  batched {2:8.2f} ms/issue'.format(
+            policy,
+            (separately * 1000),
+            (batched * 1000),
+        ))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
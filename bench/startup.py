@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""Measure startup time and import time of commands.
+
+Usage:
+
+    bench/startup.py [<repository>]
+
+Every command is run a few times in the repository (by default, the current
+directory) with `python3 -X importtime`.  Reported are the median wall time
+of a run, the cumulative time of all imports, and the slowest top-level
+imports of the command.  Commands are run with the `issue.py` next to this
+directory, so the UI description and clap must be installed.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROUNDS = 5
+SLOWEST = 3
+
+COMMANDS = (
+    ('--version',),
+    ('--where',),
+    ('ls',),
+    ('log',),
+    ('statistics',),
+)
+
+ISSUE_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'issue.py')
+
+
+def top_level_imports(stderr):
+    """Return a dict mapping top-level imported modules to their cumulative
+    import time (in microseconds), parsed from `-X importtime` output.
+    """
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            # Nested import, already accounted for by its importer.
+            continue
+        imports[name.strip()] = int(cumulative)
+    return imports
+
+def measure(command):
+    walls, imports = [], {}
+    for _ in range(ROUNDS):
+        begin = time.perf_counter()
+        p = subprocess.run(
+            (sys.executable, '-X', 'importtime', ISSUE_PY) + command,
+            stdout = subprocess.DEVNULL,
+            stderr = subprocess.PIPE,
+            universal_newlines = True,
+        )
+        walls.append(time.perf_counter() - begin)
+        imports = top_level_imports(p.stderr)
+    return (statistics.median(walls), imports)
+
+def main(args):
+    if args:
+        os.chdir(args[0])
+    for command in COMMANDS:
+        wall, imports = measure(command)
+        slowest = sorted(imports.items(), key = lambda each: each[1], reverse = True)[:SLOWEST]
+        print('{0:12} {1:8.2f} ms  imports {2:8.2f} ms ({3} modules)  slowest: {4}'.format(
+            ' '.join(command),
+            (wall * 1000),
+            (sum(imports.values()) / 1000),
+            len(imports),
+            ', '.join('{0} {1:.2f} ms'.format(name, (us / 1000)) for name, us in slowest),
+        ))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,33 +1,84 @@
 #!/usr/bin/env python3
 
+import time
+startup_timing = [('start', time.perf_counter(), '')]
+
+import contextlib
 import datetime
+import hashlib
+import io
 import json
 import os
-import random
+import pickle
 import re
-import shutil
-import subprocess
 import sys
 
-import unidecode
-try:
-    import colored
-except ImportError:
-    colored = None
-
 import clap
 
 import issue
 
+# Only needed by some commands (git, packs, templates, batches) or for colours;
+# imported on first use to keep startup of read-only commands short.
+shlex = issue.util.misc.LazyModule('shlex')
+shutil = issue.util.misc.LazyModule('shutil')
+subprocess = issue.util.misc.LazyModule('subprocess')
+colored = issue.util.misc.LazyModule('colored', optional = True)
+
+
+startup_timing.append(('imports', time.perf_counter(), ''))
+
+# Querying commands are answered by `issue serve` if it runs for this repository.
+served_status = issue.serve.forward(sys.argv[1:])
+if served_status is not None:
+    exit(served_status)
+
 
 filename_ui = os.path.expanduser('~/.local/share/issue/ui.json')
 
-model = {}
-with open(filename_ui, 'r') as ifstream: model = json.loads(ifstream.read())
+def load_command(filename_ui):
+    """Return a tuple `(command, cached)` with the clap command built from `filename_ui`.
+
+    Building the command tree is a large part of startup time, so the built
+    command is pickled to the cache directory, keyed on the hash of the UI
+    description and clap version, and rebuilt whenever the key changes.
+    """
+    with open(filename_ui, 'rb') as ifstream:
+        ui_source = ifstream.read()
+    cache_key = '{0}:{1}'.format(hashlib.sha256(ui_source).hexdigest(), getattr(clap, '__version__', ''))
+    remembered_command = issue.serve.recall(cache_key)
+    if remembered_command is not None:
+        return (remembered_command, True)
+    cache_path = os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'issue',
+        'ui.pickle',
+    )
+    try:
+        with open(cache_path, 'rb') as ifstream:
+            cached_key, cached_command = pickle.load(ifstream)
+        if cached_key == cache_key:
+            issue.serve.remember(cache_key, cached_command)
+            return (cached_command, True)
+    except Exception:
+        # Missing, unreadable or written by an incompatible version: rebuild.
+        pass
+
+    command = clap.builder.Builder(json.loads(ui_source.decode('utf-8'))).insertHelpCommand().build().get()
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+        with open('{0}.tmp'.format(cache_path), 'wb') as ofstream:
+            pickle.dump((cache_key, command), ofstream)
+        os.rename('{0}.tmp'.format(cache_path), cache_path)
+    except Exception:
+        # Caching is an optimisation; failing to cache is not an error.
+        pass
+    issue.serve.remember(cache_key, command)
+    return (command, False)
 
 args = list(clap.formatter.Formatter(sys.argv[1:]).format())
 
-command = clap.builder.Builder(model).insertHelpCommand().build().get()
+command, command_cached = load_command(filename_ui)
+startup_timing.append(('ui model', time.perf_counter(), ('cached' if command_cached else 'built')))
 parser = clap.parser.Parser(command).feed(args)
 checker = clap.checker.RedChecker(parser)
 
@@ -62,6 +113,16 @@ except clap.errors.AmbiguousCommandError as e:
 finally:
     if fail: exit(1)
     ui = parser.parse().ui().finalise()
+startup_timing.append(('parsing', time.perf_counter(), ''))
+
+def print_startup_timing():
+    timing = startup_timing + [('command', time.perf_counter(), '')]
+    for (_, previous, _), (phase, point, note) in zip(timing, timing[1:]):
+        sys.stderr.write('timing: {0:10} {1:9.2f} ms{2}\n'.format(phase, ((point - previous) * 1000), (' ({})'.format(note) if note else '')))
+    sys.stderr.write('timing: {0:10} {1:9.2f} ms\n'.format('total', ((timing[-1][1] - timing[0][1]) * 1000)))
+
+if '--timing' in ui:
+    issue.serve.at_exit(print_startup_timing)
 
 
 if '--version' in ui:
@@ -82,7 +143,7 @@ LS_KEYWORD_MATCH_THRESHOLD = 1
 
 # Colorisation utilities.
 def colorise_if_possible(color, s):
-    if colored is None:
+    if not colored:
         return s
     return (colored.fg(color) + s + colored.attr('reset'))
 
@@ -102,64 +163,20 @@ COLOR_BRANCH_NAME = 'white'
 COLOR_DATETIME = 'cyan'
 
 
-# remote-related utility functions
-def getRemotes():
-    remotes = {}
-    remotes_path = os.path.join(issue.util.paths.get_repository_path(), 'remotes.json')
-    if os.path.isfile(remotes_path):
-        with open(remotes_path) as ifstream:
-            remotes = json.loads(ifstream.read())
-    return remotes
-
-def saveRemotes(remotes):
-    remotes_path = os.path.join(issue.util.paths.get_repository_path(), 'remotes.json')
-    with open(remotes_path, 'w') as ofstream:
-        ofstream.write(json.dumps(remotes))
-
-def getPack():
-    pack_data = {
-        'issues': [],
-        'comments': {},
-        'diffs': {},
-    }
-
-    pack_issue_list = issue.util.issues.ls()
-    pack_data['issues'] = pack_issue_list
-
-    pack_comments = {}
-    for p in pack_issue_list:
-        pack_comments_path = issue.util.paths.comments_path_of(p)
-        pack_comments[p] = [sp.split('.')[0] for sp in os.listdir(pack_comments_path)]
-    pack_data['comments'] = pack_comments
-
-    pack_diffs = {}
-    for p in pack_issue_list:
-        pack_diffs_path = os.path.join(issue.util.paths.issues_path(), p[:2], p, 'diff')
-        pack_diffs[p] = [sp.split('.')[0] for sp in os.listdir(pack_diffs_path)]
-    pack_data['diffs'] = pack_diffs
-
-    return pack_data
-
-def savePack(pack_data=None):
-    if pack_data is None:
-        pack_data = getPack()
-    with open(issue.util.paths.pack_path(), 'w') as ofstream:
-        ofstream.write(json.dumps(pack_data))
+# misc utility functions
+_repository = None
 
+def get_repository():
+    """Return the repository of the current working directory, shared by all
+    commands of this invocation.
+    """
+    global _repository
+    if _repository is None:
+        _repository = issue.Repository()
+    return _repository
 
-# misc utility functions
 def expandIssueUID(issue_sha1_part):
-    if issue_sha1_part == '-':
-        return getLastIssue()
-    issue_sha1 = []
-    issues = issue.util.issues.ls()
-    for i_sha1 in issues:
-        if i_sha1.startswith(issue_sha1_part): issue_sha1.append(i_sha1)
-    if len(issue_sha1) == 0:
-        raise issue.exceptions.IssueUIDNotMatched(issue_sha1_part)
-    if len(issue_sha1) > 1:
-        raise issue.exceptions.IssueUIDAmbiguous(issue_sha1_part)
-    return issue_sha1[0]
+    return get_repository().expand(issue_sha1_part)
 
 def expand_issue_uid_or_exir(issue_uid_part):
     try:
@@ -177,13 +194,40 @@ def expand_issue_uid_or_exir(issue_uid_part):
         ))
         exit(1)
 
-def runShell(*command):
-    p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, error = p.communicate()
-    output = output.decode('utf-8').strip()
-    error = error.decode('utf-8').strip()
-    exit_code = p.wait()
-    return (exit_code, output, error)
+def selecting(ui):
+    """Return True if issues are selected by filters (`--status`, `--tag`,
+    `--keyword`) given to a command.
+    """
+    return any((each in ui) for each in ('--status', '--tag', '--keyword'))
+
+def select_issues(ui, issue_uid_parts, statuses=None):
+    """Return list of full UIDs of issues given by `issue_uid_parts`, followed
+    by issues selected by filters in `ui` (without duplicates).
+
+    Filters work as in `issue ls`; `statuses` are accepted when no `--status`
+    is given (None accepts all).
+    """
+    issue_list = []
+    for each in issue_uid_parts:
+        each = expand_issue_uid_or_exir(each)
+        if each not in issue_list:
+            issue_list.append(each)
+    if not selecting(ui):
+        return issue_list
+
+    if '--status' in ui:
+        statuses = set(s[0] for s in ui.get('--status'))
+    summaries, _ = get_repository().query(
+        statuses = statuses,
+        tags = ([s[0] for s in ui.get('--tag')] if '--tag' in ui else []),
+        keywords = ([s[0].lower() for s in ui.get('--keyword')] if '--keyword' in ui else []),
+        threshold = LS_KEYWORD_MATCH_THRESHOLD,
+    )
+    selected = set(issue_list)
+    issue_list.extend(sorted(each for each in summaries if each not in selected))
+    if '--verbose' in ui:
+        print('selected {0} issue(s)'.format(len(issue_list)))
+    return issue_list
 
 def shortestUnique(lst):
     if not lst:
@@ -211,12 +255,12 @@ def shortestUnique(lst):
 
 def shortest_unique_prefix(seq = None):
     if seq is None:
-        seq = issue.util.issues.ls()
+        return issue.index.uids.shortest_unique_prefix()
     return shortestUnique(seq)
 
 def listIssuesUsingShortestPossibleUIDs(with_full=False):
-    list_of_issues = issue.util.issues.ls()
-    n = shortestUnique(list_of_issues)
+    list_of_issues = issue.index.uids.ls()
+    n = issue.index.uids.shortest_unique_prefix()
     if with_full:
         final_list_of_issues = [(i[:n], i) for i in list_of_issues]
     else:
@@ -224,15 +268,10 @@ def listIssuesUsingShortestPossibleUIDs(with_full=False):
     return final_list_of_issues
 
 def markLastIssue(issue_sha1):
-    with open(issue.util.paths.last_issue_path(), 'w') as ofstream:
-        ofstream.write(issue_sha1)
+    get_repository().mark_last(issue_sha1)
 
 def getLastIssue():
-    last_issue_sha1 = ''
-    if os.path.isfile(issue.util.paths.last_issue_path()):
-        with open(issue.util.paths.last_issue_path()) as ifstream:
-            last_issue_sha1 = ifstream.read()
-    return last_issue_sha1
+    return get_repository().last()
 
 def get_time_delta_arguments(delta_mods):
     time_delta = {}
@@ -261,230 +300,16 @@ def get_time_delta_arguments(delta_mods):
             raise issue.exceptions.Invalid_time_delta_specification(delta_mods)
     return time_delta
 
-def fetchRemote(remote_name, remote_data=None, local_pack=None):
-    if remote_data is None:
-        remote_data = getRemotes()[remote_name]
-    if local_pack is None:
-        local_pack = getPack()
-    remote_pack_fetch_command = ('scp', '{0}/pack.json'.format(remote_data['url']),
-            issue.util.paths.remote_pack_path())
-    exit_code, output, error = runShell(*remote_pack_fetch_command)
-
-    if exit_code:
-        print('  * fail ({0}): {1}'.format(exit_code, error))
-        return 1
-
-    remote_pack = {}
-    with open(issue.util.paths.remote_pack_path()) as ifstream:
-        remote_pack = json.loads(ifstream.read())
-
-    new_issues = set(remote_pack['issues']) - set(local_pack['issues'])
-    # print(new_issues)
-
-    new_comments = {}
-    for k, v in remote_pack['comments'].items():
-        if k in local_pack['comments']:
-            new_comments[k] = set(remote_pack['comments'][k]) - set(local_pack['comments'][k])
-        else:
-            new_comments[k] = remote_pack['comments'][k]
-    # print(new_comments)
-
-    new_diffs = {}
-    for k, v in remote_pack.get('diffs', {}).items():
-        if k in local_pack['diffs']:
-            new_diffs[k] = set(remote_pack['diffs'][k]) - set(local_pack['diffs'][k])
-        else:
-            new_diffs[k] = remote_pack['diffs'][k]
-    # print(new_diffs)
-
-    print('  * issues:   {0} object(s)'.format(len(new_issues)))
-    print('  * comments: {0} object(s)'.format(sum([len(new_comments[k]) for k in new_comments])))
-    print('  * diffs:    {0} object(s)'.format(sum([len(new_diffs[k]) for k in new_diffs])))
-
-    if '--probe' in ui:
-        return 0
-
-    for issue_sha1 in new_issues:
-        issue_group_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2])
-        if not os.path.isdir(issue_group_path):
-            os.mkdir(issue_group_path)
-        # make directories for issue-specific objects
-        os.mkdir(os.path.join(issue_group_path, issue_sha1))
-        os.mkdir(os.path.join(issue_group_path, issue_sha1, 'comments'))
-        os.mkdir(os.path.join(issue_group_path, issue_sha1, 'diff'))
-
-    for issue_sha1 in new_comments:
-        if not new_comments[issue_sha1]:
-            continue
-
-        for cmt_sha1 in new_comments[issue_sha1]:
-            exit_code, output, error = runShell(
-                'scp',
-                '{0}/objects/issues/{1}/{2}/comments/{3}.json'.format(
-                    remote_data['url'],
-                    issue_sha1[:2],
-                    issue_sha1,
-                    cmt_sha1,
-                ),
-                os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'comments', '{0}.json'.format(cmt_sha1))
-            )
-
-            if exit_code:
-                print('  * fail ({0}): comment {1}.{2}: {3}'.format(exit_code, issue_sha1, cmt_sha1, error))
-                continue
-
-    for issue_sha1 in new_diffs:
-        if not new_diffs[issue_sha1]:
-            continue
-
-        if '--verbose' in ui:
-            print(' -> fetching issue: {0}'.format(issue_sha1))
-
-        total_diffs = len(new_diffs[issue_sha1])
-        for i, cmt_sha1 in enumerate(new_diffs[issue_sha1]):
-            if '--verbose' in ui:
-                print('    + diff: {0}: {1}/{2}'.format(cmt_sha1, (i+1), total_diffs))
-            exit_code, output, error = runShell(
-                'scp',
-                '{0}/objects/issues/{1}/{2}/diff/{3}.json'.format(
-                    remote_data['url'],
-                    issue_sha1[:2],
-                    issue_sha1,
-                    cmt_sha1,
-                ),
-                os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(cmt_sha1))
-            )
-
-            if exit_code:
-                print('  * fail ({0}): diff {1}.{2}: {3}'.format(exit_code, issue_sha1, cmt_sha1, error))
-                continue
-
-def publishToRemote(remote_name, remote_data=None, local_pack=None, republish=False):
-    if remote_data is None:
-        remote_data = getRemotes()[remote_name]
-    if local_pack is None:
-        local_pack = getPack()
-
-    remote_status = remote_data.get('status', 'unknown')
-    if remote_status != 'exchange':
-        print('cannot publish to "{0}": invalid remote status: {1}'.format(remote_name, remote_status))
-        if '--verbose' in ui:
-            if remote_status == 'endpoint':
-                print('note: create a shared exchange from which "{0}" endpoint can fetch objects'.format(remote_name))
-            elif remote_status == 'unknown':
-                print('note: run "issue fetch --status {0}" to obtain status of this node'.format(remote_name))
-            else:
-                print('note: broken status, run "issue fetch --status {0}" to fix it'.format(remote_name))
-        return 1
-    print('publishing objects to remote: {0}'.format(remote_name))
-
-    remote_pack = {'issues': [], 'comments': {}}
-
-    if not republish:
-        remote_pack_fetch_command = ('scp', '{0}/pack.json'.format(remote_data['url']), issue.util.paths.remote_pack_path())
-        exit_code, output, error = runShell(*remote_pack_fetch_command)
-
-        if exit_code == 0:
-            with open(issue.util.paths.remote_pack_path()) as ifstream:
-                remote_pack = json.loads(ifstream.read())
-
-    new_issues = set(local_pack['issues']) - set(remote_pack['issues'])
-    # print(new_issues)
-
-    new_comments = {}
-    for k, v in local_pack['comments'].items():
-        if k in remote_pack.get('comments', []):
-            new_comments[k] = set(local_pack['comments'][k]) - set(remote_pack.get('comments', {}).get(k, []))
-        else:
-            new_comments[k] = local_pack['comments'][k]
-    # print(new_comments)
-
-    new_diffs = {}
-    for k, v in local_pack['diffs'].items():
-        if k in remote_pack.get('diffs', {}):
-            new_diffs[k] = set(local_pack['diffs'][k]) - set(remote_pack.get('diffs', {}).get(k, []))
-        else:
-            new_diffs[k] = local_pack['diffs'][k]
-    # print(new_diffs)
-
-    print('  * publishing issues:   {0} object(s)'.format(len(new_issues)))
-    print('  * publishing comments: {0} object(s)'.format(sum([len(new_comments[k]) for k in new_comments])))
-    print('  * publishing diffs:    {0} object(s)'.format(sum([len(new_diffs[k]) for k in new_diffs])))
-
-    for issue_sha1 in new_issues:
-        print(' -> publishing issue: {0}'.format(issue_sha1))
-        issue_group_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2])
-
-        required_directories = [
-            os.path.join('objects', 'issues', issue_sha1[:2]),
-            os.path.join('objects', 'issues', issue_sha1[:2], issue_sha1),
-            os.path.join('objects', 'issues', issue_sha1[:2], issue_sha1, 'comments'),
-            os.path.join('objects', 'issues', issue_sha1[:2], issue_sha1, 'diff'),
-        ]
-
-        remote_repository_host, remote_repository_path = remote_data['url'].split(':')
-        required_directories = [os.path.join(remote_repository_path, rd) for rd in required_directories]
-        remote_mkdir_command = 'mkdir -p {0}'.format(' '.join(required_directories))
-
-        exit_code, output, error = runShell(
-            'ssh',
-            remote_repository_host,
-            remote_mkdir_command,
-        )
-
-        if exit_code:
-            print('  * fail ({0}): cannot create required directories: {1}'.format(exit_code, error))
-            continue
-
-    for issue_sha1 in new_comments:
-        if not new_comments[issue_sha1]:
-            continue
-
-        for cmt_sha1 in new_comments[issue_sha1]:
-            exit_code, output, error = runShell(
-                'scp',
-                os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'comments', '{0}.json'.format(cmt_sha1)),
-                '{0}/objects/issues/{1}/{2}/comments/{3}.json'.format(
-                    remote_data['url'],
-                    issue_sha1[:2],
-                    issue_sha1,
-                    cmt_sha1,
-                )
-            )
-
-            if exit_code:
-                print('  * fail ({0}): comment {1}.{2}: {3}'.format(exit_code, issue_sha1, cmt_sha1, error))
-                continue
-
-    for issue_sha1 in new_diffs:
-        if not new_diffs[issue_sha1]:
-            continue
-
-        total_diffs = len(new_diffs[issue_sha1])
-        for i, diff_sha1 in enumerate(new_diffs[issue_sha1]):
-            if '--verbose' in ui:
-                print('    + diff: {0}: {1}/{2}'.format(diff_sha1, (i+1), total_diffs))
-            exit_code, output, error = runShell(
-                'scp',
-                os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(diff_sha1)),
-                '{0}/objects/issues/{1}/{2}/diff/{3}.json'.format(
-                    remote_data['url'],
-                    issue_sha1[:2],
-                    issue_sha1,
-                    diff_sha1,
-                )
-            )
-
-            if exit_code:
-                print('  * fail ({0}): diff {1}.{2}: {3}'.format(exit_code, issue_sha1, diff_sha1, error))
-                continue
-
-    remote_pack_publish_command = ('scp', os.path.join(issue.util.paths.pack_path()), '{0}/pack.json'.format(remote_data['url']))
-    exit_code, output, error = runShell(*remote_pack_publish_command)
-
-    if exit_code:
-        print('  * fail ({0}): failed to send pack: {1}'.format(exit_code, error))
-        return 1
+def get_time_point(delta_mods):
+    """Return datetime given either as a date (YYYY-MM-DD), or as a time
+    delta from now (e.g. "2weeks", "1day").
+    """
+    for each in delta_mods:
+        try:
+            return datetime.datetime.strptime(each, '%Y-%m-%d')
+        except ValueError:
+            pass
+    return (datetime.datetime.now() - datetime.timedelta(**get_time_delta_arguments(delta_mods)))
 
 def timestamp(dt=None):
     return (dt or datetime.datetime.now()).timestamp()
@@ -529,19 +354,19 @@ def display_events_log(events_log, head=None, tail=None):
     if tail is not None:
         events_log = events_log[tail:]
     try:
-        shortened_uids = dict(map(lambda each: (each[1], each[0],),
-            listIssuesUsingShortestPossibleUIDs(with_full = True)))
+        # Only issues mentioned by displayed events are looked up, all at once.
+        event_uids = set(event['issue_uid'] for event in events_log)
+        short_uid_length = shortest_unique_prefix()
+        shortened_uids = dict((uid, uid[:short_uid_length]) for uid in issue.index.uids.present(event_uids))
+        summaries = issue.index.summary.get(event_uids)
 
         for event in events_log:
             event_name = event['event']
             event_parameters = event.get('parameters', {})
             event_description = ''
             if event_name == 'show':
-                try:
-                    event_description = issue.util.issues.getIssue(event['issue_uid']).get('message').splitlines()[0]
-                except issue.exceptions.NotAnIssue:
-                    # This happens when an issue was dropped.
-                    pass
+                # Dropped issues are not present in the summary.
+                event_description = summaries.get(event['issue_uid'], {}).get('message', '')
             elif event_name == 'slug':
                 event_description = 'sluggified to {}'.format(colorise_repr(
                     COLOR_BRANCH_NAME,
@@ -568,10 +393,8 @@ def display_events_log(events_log, head=None, tail=None):
                     event_description = (': ' * bool(event_description)) + event_description,
                 ))
             else:
-                n = list(shortened_uids.values())
-                n = (len(n[0]) if n else 4)
                 print('{issue_key} [{event_datetime}] {error_msg}: {event_name}{event_description}'.format(
-                    issue_key = colorise(COLOR_HASH, event['issue_uid'][:n]),
+                    issue_key = colorise(COLOR_HASH, event['issue_uid'][:(short_uid_length or 4)]),
                     event_datetime = colorise(COLOR_DATETIME, event_datetime),
                     event_name = event_name,
                     event_description = (': ' * bool(event_description)) + event_description,
@@ -583,89 +406,12 @@ def display_events_log(events_log, head=None, tail=None):
         pass
 
 
-######################################################################
-# BACKEND FUNCTIONS
-#
-def get_release_path(release_name):
-    return os.path.join(issue.util.paths.releases_path(), 'r', release_name)
-
-def release_name_exists(release_name):
-    return os.path.isdir(get_release_path(release_name))
-
-def get_release_notes_path(release_name):
-    return os.path.join(get_release_path(release_name), 'notes')
-
-def store_next_release_pointer(release_name):
-    with open(os.path.join(issue.util.paths.releases_path(), 'next'), 'w') as ofstream:
-        ofstream.write(release_name)
-
-def get_next_release_pointer():
-    next_relese_pointer_path = os.path.join(issue.util.paths.releases_path(), 'next')
-    if not os.path.isfile(next_relese_pointer_path):
-        return ''
-    with open(next_relese_pointer_path) as ifstream:
-        return ifstream.read().strip()
-
-def _store_release_diff_simple_named_action(release_name, action_name):
-    repo_config = issue.config.getConfig()
-    release_differences = [
-        {
-            'action': action_name,
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        },
-    ]
-    release_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-    release_diff_sha1 = issue.util.misc.create_hash(release_diff_sha1)
-    release_diff_file_path = os.path.join(get_release_path(release_name), 'diff', '{0}.json'.format(release_diff_sha1))
-    with open(release_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(release_differences))
-
-def store_release_diff_open(release_name):
-    _store_release_diff_simple_named_action(release_name, 'open')
-
-def store_release_diff_close(release_name):
-    _store_release_diff_simple_named_action(release_name, 'close')
-
-def store_release_diff(release_name, action, params=None):
-    repo_config = issue.config.getConfig()
-    release_differences = [
-        {
-            'action': action,
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        },
-    ]
-    if params is not None:
-        release_differences[0]['params'] = params
-    release_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-    release_diff_sha1 = issue.util.misc.create_hash(release_diff_sha1)
-    release_diff_file_path = os.path.join(get_release_path(release_name), 'diff', '{0}.json'.format(release_diff_sha1))
-    with open(release_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(release_differences))
-
-def get_release_diffs(release_name):
-    release_diff_path = os.path.join(get_release_path(release_name), 'diff')
-    release_diff_files = os.listdir(release_diff_path)
-    release_diffs = []
-    for p in release_diff_files:
-        with open(os.path.join(release_diff_path, p)) as ifstream:
-            release_diffs.extend(json.loads(ifstream.read()))
-    return release_diffs
-
-
 ######################################################################
 # LOGIC CODE
 #
 if '--pack' in ui:
     print('packing objects:')
-    pack_data = getPack()
+    pack_data = issue.remote.getPack()
 
     count_issues = len(pack_data['issues'])
     count_comments = sum([len(pack_data['comments'][n]) for n in pack_data['comments'].keys()])
@@ -680,7 +426,7 @@ if '--pack' in ui:
     print('  * diffs   ', end='')
     print(' [{0} object(s)]'.format(count_diffs))
 
-    savePack(pack_data)
+    issue.remote.savePack(pack_data)
     exit(0)
 
 if '--nuke' in ui:
@@ -714,9 +460,9 @@ def commandInit(ui):
 
 def commandOpen(ui):
     tags = ([l[0] for l in ui.get('--tag')] if '--tag' in ui else [])
-    gathered_tags = issue.objects.tags.gather()
+    known_tags = (issue.index.tags.known() if tags else set())
     for t in tags:
-        if t not in gathered_tags[0]:
+        if t not in known_tags:
             print('fatal: tag "{0}" does not exist'.format(t))
             print('note: use "issue tag new {0}" to create it'.format(t))
             exit(1)
@@ -734,12 +480,19 @@ def commandOpen(ui):
             ), e)
             exit(1)
 
+    chain_to = []
+    for link_issue_sha1 in (ui.get('--chain-to') if '--chain-to' in ui else []):
+        try:
+            chain_to.append(expandIssueUID(link_issue_sha1))
+        except Exception as e:
+            print('warning: could not link issue identified by "{0}":'.format(link_issue_sha1), e)
+
     message_fmt = {
         'parent_message': '#',
     }
     if parent_uid is not None:
         formatted_parent_message = '#\n# Parent message:\n#\n'
-        parent_message_lines = issue.util.issues.getIssue(parent_uid).get('message').splitlines()
+        parent_message_lines = get_repository().get(parent_uid).get('message').splitlines()
         indented_parent_message_lines = ['    {}'.format(l) for l in parent_message_lines]
         formatted_parent_message += '\n'.join(map(lambda each: '#  {}'.format(each),
             indented_parent_message_lines,
@@ -750,202 +503,14 @@ def commandOpen(ui):
         print('fatal: aborting due to empty message')
         exit(1)
 
-    issue_sha1 = '{0}{1}{2}{3}{4}'.format(message, tags, milestones, parent_uid, random.random())
-    issue_sha1 = issue.util.misc.create_hash(issue_sha1)
-
-    repo_config = issue.config.getConfig()
-
-    issue_group_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2])
-    if not os.path.isdir(issue_group_path):
-        os.mkdir(issue_group_path)
-
-    # make directories for issue-specific objects
-    os.mkdir(os.path.join(issue_group_path, issue_sha1))
-    os.mkdir(os.path.join(issue_group_path, issue_sha1, 'comments'))
-    os.mkdir(os.path.join(issue_group_path, issue_sha1, 'diff'))
-
-    issue_differences = [
-        {
-            'action': 'open',
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        },
-        {
-            'action': 'set-message',
-            'params': {
-                'text': message,
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        },
-        {
-            'action': 'push-tags',
-            'params': {
-                'tags': tags,
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        },
-        {
-            'action': 'push-milestones',
-            'params': {
-                'milestones': milestones,
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        }
-    ]
-
-    repo_config = issue.config.getConfig()
-    if 'project.tag' in repo_config:
-        issue_differences.append({
-            'action': 'push-tags',
-            'params': {
-                'tags': [repo_config['project.tag']],
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        })
-        issue_differences.append({
-            'action': 'set-project-tag',
-            'params': {
-                'tag': repo_config['project.tag'],
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        })
-    if 'project.name' in repo_config:
-        issue_differences.append({
-            'action': 'set-project-name',
-            'params': {
-                'name': repo_config['project.name'],
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        })
-
-    if '--param' in ui:
-        for k, v in ui.get('--param'):
-            issue_differences.append({
-                'action': 'parameter-set',
-                'params': {
-                    'key': k,
-                    'value': v,
-                },
-                'author': {
-                    'author.email': repo_config['author.email'],
-                    'author.name': repo_config['author.name'],
-                },
-                'timestamp': timestamp(),
-            })
-
-    issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-    issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-    issue_diff_file_path = os.path.join(issue_group_path, issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-    with open(issue_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(issue_differences))
-
-    next_relese_pointer = get_next_release_pointer()
-    if next_relese_pointer:
-        store_release_diff(next_relese_pointer, 'open-issue', {
-            'id': issue_sha1,
-            'message': message.splitlines()[0],
-        })
-
-    if parent_uid is not None:
-        try:
-            issue_differences = [
-                {
-                    'action': 'set-parent',
-                    'params': {
-                        'uid': parent_uid,
-                    },
-                    'author': {
-                        'author.email': repo_config['author.email'],
-                        'author.name': repo_config['author.name'],
-                    },
-                    'timestamp': timestamp(),
-                }
-            ]
-
-            issue_diff_uid = '{0}{1}{2}{3}'.format(
-                repo_config['author.email'],
-                repo_config['author.name'],
-                timestamp(),
-                random.random(),
-            )
-            issue_diff_uid = issue.util.misc.create_hash(issue_diff_uid)
-            issue_diff_file_path = os.path.join(
-                issue.util.paths.issues_path(),
-                issue_sha1[:2],
-                issue_sha1,
-                'diff',
-                '{0}.json'.format(issue_diff_uid),
-            )
-            with open(issue_diff_file_path, 'w') as ofstream:
-                ofstream.write(json.dumps(issue_differences))
-        except Exception as e:
-            print('{error}: could not set parent issue (identified by "{parent_uid}"):'.format(
-                error = colorise(COLOR_WARNING, 'warning'),
-                parent_uid = colorise(COLOR_HASH, parent_uid),
-            ), e)
-
-    issue.util.issues.indexIssue(issue_sha1)
-    markLastIssue(issue_sha1)
-
-    issue.shortlog.append_event_open(issue_sha1, message)
-    issue.shortlog.append_event_tagged(issue_sha1, tags)
-
-    if '--chain-to' in ui or '--parent' in ui:
-        chained_to = []
-        for link_issue_sha1 in ui.get('--chain-to') + [parent_uid,]:
-            try:
-                link_issue_sha1 = expandIssueUID(link_issue_sha1)
-                chained_to.append(link_issue_sha1)
-                issue_differences = [
-                    {
-                        'action': 'chain-link',
-                        'params': {
-                            'sha1': [issue_sha1],
-                        },
-                        'author': {
-                            'author.email': repo_config['author.email'],
-                            'author.name': repo_config['author.name'],
-                        },
-                        'timestamp': timestamp(),
-                    }
-                ]
-
-                issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-                issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-                issue_diff_file_path = os.path.join(issue.util.paths.issues_path(), link_issue_sha1[:2], link_issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-                with open(issue_diff_file_path, 'w') as ofstream:
-                    ofstream.write(json.dumps(issue_differences))
-                issue.util.issues.indexIssue(link_issue_sha1, issue_diff_sha1)
-            except Exception as e:
-                print('warning: could not link issue identified by "{0}":'.format(link_issue_sha1), e)
-        issue.shortlog.append_event_chained_to(issue_sha1, chained_to)
+    issue_sha1 = get_repository().open(
+        message,
+        tags = tags,
+        milestones = milestones,
+        params = (ui.get('--param') if '--param' in ui else ()),
+        parent = parent_uid,
+        chain_to = chain_to,
+    )
 
     if '--git' in ui:
         print('issue/{0}'.format(issue.util.issues.sluggify(message)))
@@ -953,44 +518,16 @@ def commandOpen(ui):
         print(issue_sha1)
 
 def commandClose(ui):
-    repo_config = issue.config.getConfig()
-    issue_sha1 = (getLastIssue() if '--last' in ui else operands[0])
-    issue_sha1 = expand_issue_uid_or_exir(issue_sha1)
-    issue_data = issue.util.issues.getIssue(issue_sha1)
-
-    if issue_data['status'] == 'closed':
-        print('fatal: issue already closed by {0}{1}'.format(issue_data.get('close.author.name', 'Unknown author'), (' ({0})'.format(issue_data['close.author.email']) if 'close.author.email' else '')))
-        exit(1)
-
-    chained_issues = issue_data.get('chained', [])
-    unclosed_chained_issues = []
-    for c in chained_issues:
-        ci = issue.util.issues.getIssue(c, index=True)
-        if ci['status'] != 'closed':
-            unclosed_chained_issues.append((c, ci['message'].splitlines()[0]))
-    if unclosed_chained_issues:
-        print('fatal: unclosed chained issues exist:')
-        for ui_sha1, ui_msg in unclosed_chained_issues:
-            print('  {0}: {1}'.format(ui_sha1, ui_msg))
+    issue_list = select_issues(ui, ([getLastIssue()] if '--last' in ui else operands), statuses = {'open', ''})
+    if not (issue_list or selecting(ui)):
+        print('{0}: no issues to close'.format(colorise(COLOR_ERROR, 'error')))
         exit(1)
 
     ts = None
-
     if '-t' in ui:
-        ts = datetime.datetime.strptime(ui.get('-t'), '%Y-%m-%dT%H:%M:%S')
-    issue_differences = [
-        {
-            'action': 'close',
-            'params': {
-            },
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(ts),
-        },
-    ]
+        ts = datetime.datetime.strptime(ui.get('-t'), '%Y-%m-%dT%H:%M:%S').timestamp()
 
+    closing_git_commit = None
     if '--git-commit' in ui:
         closing_git_commit = ui.get('--git-commit')
         if closing_git_commit == '-':
@@ -1012,27 +549,39 @@ def commandClose(ui):
             exit(exit_code)
         output_lines = output.splitlines()
         closing_git_commit = output_lines[0].split(' ')[1]
-        issue_differences[0]['timestamp'] = datetime.datetime.strptime(
+        ts = datetime.datetime.strptime(
             output_lines[2],
             'Date:\t%Y-%m-%d %H:%M:%S %z',
         ).timestamp()
-        issue_differences[0]['params']['closing_git_commit'] = closing_git_commit
-
-    issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-    issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-    issue_diff_file_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-    with open(issue_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(issue_differences))
-    issue.shortlog.append_event_close(issue_sha1)
-
-    next_relese_pointer = get_next_release_pointer()
-    if next_relese_pointer:
-        store_release_diff(next_relese_pointer, 'close-issue', {
-            'id': issue_sha1,
-        })
-    markLastIssue(issue_sha1)
-    issue.util.issues.indexIssue(issue_sha1, issue_diff_sha1)
-    issue.shortlog.append_event_close(issue_sha1)
+
+    repository = get_repository()
+    prefix = ('' if len(issue_list) == 1 else '{0}: ')
+    failed = False
+    with repository.batched():
+        # An issue is closed after issues chained to it, if they are closed
+        # by the same command.
+        remaining = issue_list
+        while remaining:
+            postponed = []
+            for issue_sha1 in remaining:
+                try:
+                    repository.close(issue_sha1, timestamp = ts, closing_git_commit = closing_git_commit)
+                except issue.exceptions.IssueClosed:
+                    issue_data = repository.get(issue_sha1)
+                    print((prefix + 'fatal: issue already closed by {1}{2}').format(issue_sha1, issue_data.get('close.author.name', 'Unknown author'), (' ({0})'.format(issue_data['close.author.email']) if 'close.author.email' else '')))
+                    failed = True
+                except issue.exceptions.UnclosedChainedIssues as e:
+                    postponed.append((issue_sha1, e.args[0]))
+            if len(postponed) == len(remaining) or not any(set(chained).intersection(remaining) for _, chained in postponed):
+                for issue_sha1, chained in postponed:
+                    print((prefix + 'fatal: unclosed chained issues exist:').format(issue_sha1))
+                    for c in chained:
+                        print('  {0}: {1}'.format(c, issue.index.summary.get([c]).get(c, {}).get('message', '')))
+                failed = (failed or bool(postponed))
+                break
+            remaining = [issue_sha1 for issue_sha1, _ in postponed]
+    if failed:
+        exit(1)
 
 def ls_with_details(unique_id, data):
     first_message_line = data['message'].splitlines()[0]
@@ -1087,32 +636,31 @@ def commandLs(ui):
         delta_mods_since = issue.config.getConfig().get('default.time.recent', '1day').split(',')
 
     if '--since' in ui or '--recent' in ui:
-        set_by_timepoint = False
-        for each in delta_mods_since:
-            try:
-                since = datetime.datetime.strptime(each, '%Y-%m-%d')
-                set_by_timepoint = True
-                break
-            except ValueError:
-                pass
-        if not set_by_timepoint:
-            since = (
-                datetime.datetime.now() - datetime.timedelta(
-                    **get_time_delta_arguments(delta_mods_since)))
-
+        since = get_time_point(delta_mods_since)
     if '--until' in ui:
-        set_by_timepoint = False
-        for each in delta_mods_until:
-            try:
-                until = datetime.datetime.strptime(each, '%Y-%m-%d')
-                set_by_timepoint = True
-                break
-            except ValueError:
-                pass
-        if not set_by_timepoint:
-            until = (
-                datetime.datetime.now() - datetime.timedelta(
-                    **get_time_delta_arguments(delta_mods_until)))
+        until = get_time_point(delta_mods_until)
+
+    # Filter by status while reading the summary index, so that records of
+    # issues which are not going to be listed are not even decoded.
+    listed_statuses = None
+    if '--open' in ui:
+        listed_statuses = {'open', ''}
+    if '--closed' in ui:
+        listed_statuses = {'closed'}
+    if '--status' in ui:
+        listed_statuses = (set(accepted_statuses) if listed_statuses is None
+            else listed_statuses.intersection(accepted_statuses))
+
+    summaries, not_indexed = get_repository().query(
+        statuses = listed_statuses,
+        tags = accepted_tags,
+        since = since,
+        until = until,
+        field = ('close.timestamp' if '--closed' in ui else 'open.timestamp'),
+        keywords = ls_keywords,
+        threshold = LS_KEYWORD_MATCH_THRESHOLD,
+    )
+    not_indexed = set(not_indexed)
 
     issues_to_list = []
     for short, i in issues:
@@ -1120,41 +668,26 @@ def commandLs(ui):
             short = (colored.fg('yellow') + short + colored.attr('reset'))
 
         issue_sha1 = i.split('.', 1)[0]
-        try:
-            issue_data = issue.util.issues.getIssue(issue_sha1)
-        except issue.exceptions.NotIndexed as e:
+        if issue_sha1 in not_indexed:
             not_indexed_message = '[not indexed]'
             if colored:
                 not_indexed_message = (colored.fg('red') + not_indexed_message + colored.attr('reset'))
             print('{0} {1}'.format(short, not_indexed_message))
             continue
+        if issue_sha1 not in summaries:
+            continue
+        issue_data = summaries[issue_sha1]
 
         if '--open' in ui and (issue_data['status'] if 'status' in issue_data else '') not in ('open', ''): continue
         if '--closed' in ui and (issue_data['status'] if 'status' in issue_data else '') != 'closed': continue
         if '--status' in ui and (issue_data['status'] if 'status' in issue_data else '') not in accepted_statuses: continue
-        if '--tag' in ui:
-            issue_tags = (issue_data['tags'] if 'tags' in issue_data else [])
-            tags_positive = list(filter(lambda x: x[0] != '^', accepted_tags))
-            tags_negative = list(filter(lambda x: x[0] == '^', accepted_tags))
-
-            tags_match = False
-            if (not tags_positive) and tags_negative:
-                tags_match = True
-
-            for l in tags_positive:
-                if l in issue_tags:
-                    tags_match = True
-                    break
-            for l in tags_negative:
-                if l[1:] in issue_tags:
-                    tags_match = False
-                    break
-            if not tags_match:
-                continue
         issues_to_list.append((short, i, issue_data))
 
     if '--chained-to' in ui:
-        chained_issues = issue.util.issues.getIssue(expandIssueUID(ui.get('--chained-to'))).get('chained', [])
+        chained_issues = set(c for c, _ in issue.index.graph.related(expandIssueUID(ui.get('--chained-to')), 'chained'))
+        issues_to_list = list(filter(lambda i: (i[1] in chained_issues), issues_to_list))
+    if '--chained-from' in ui:
+        chained_issues = set(c for c, _ in issue.index.graph.related(expandIssueUID(ui.get('--chained-from')), 'chained-by'))
         issues_to_list = list(filter(lambda i: (i[1] in chained_issues), issues_to_list))
 
     if '--priority' in ui:
@@ -1175,40 +708,10 @@ def commandLs(ui):
     limit = len(issues_to_list) - 1
     for n, each in enumerate(issues_to_list):
         short, i, issue_data = each
-        if since is not None:
-            issue_timestamp = ('close.timestamp' if '--closed' in ui else 'open.timestamp')
-            issue_timestamp = datetime.datetime.fromtimestamp(issue_data.get(issue_timestamp, 0))
-            if issue_timestamp < since:
-                continue
-        if until is not None:
-            issue_timestamp = ('close.timestamp' if '--closed' in ui else 'open.timestamp')
-            issue_timestamp = datetime.datetime.fromtimestamp(issue_data.get(issue_timestamp, 0))
-            if issue_timestamp > until:
-                continue
         if '--author' in ui:
             author = ui.get('--author')
             if not (author in issue_data['open.author.name'] or author in issue_data['open.author.email']):
                 continue
-        if ls_keywords:
-            message_lower = issue_data['message'].lower()
-            found = 0
-            for kw in ls_keywords:
-                if kw[0] == '-' and kw[1:] in message_lower:
-                    found -= 1
-                    continue
-                if kw[0] == '^' and kw[1:] in message_lower:
-                    found = 0
-                    break
-                if kw[0] == '+':
-                    found += (1 if kw[1:] in message_lower else -1)
-                    continue
-                if kw[0] == '=' and kw[1:] not in message_lower:
-                    found = 0
-                    break
-                if kw in message_lower:
-                    found += 1
-            if found < LS_KEYWORD_MATCH_THRESHOLD:
-                continue
 
         full = i
         if colored:
@@ -1244,7 +747,7 @@ def commandDrop(ui):
     issue_list = ([getLastIssue()] if '--last' in ui else operands)
     for issue_sha1 in issue_list:
         try:
-            issue.util.issues.dropIssue(expandIssueUID(issue_sha1))
+            get_repository().drop(expandIssueUID(issue_sha1))
         except issue.exceptions.IssueUIDAmbiguous:
             print('fail: issue uid {0} is ambiguous'.format(repr(issue_sha1)))
 
@@ -1255,11 +758,11 @@ def commandSlug(ui):
     issue_data = {}
     issue_sha1 = (getLastIssue() if '--last' in ui else operands[0])
     issue_sha1 = expand_issue_uid_or_exir(issue_sha1)
-    issue_data = issue.util.issues.getIssue(issue_sha1)
+    issue_data = issue.util.issues.getIssue(issue_sha1, comments = False)
     issue_message = issue_data['message'].splitlines()[0].strip()
     issue_slug = issue.util.issues.sluggify(issue_message)
     issue_uid, issue_short_uid = issue_sha1, make_short_uid(
-        issue_sha1, limit = shortestUnique(issue.util.issues.ls()))
+        issue_sha1, limit = shortest_unique_prefix())
 
     slug_format = issue.config.getConfig().get('slug.format.default', '')
     if slug_format.startswith('@'):
@@ -1350,7 +853,7 @@ def commandComment(ui):
         print('fail: issue uid {0} is ambiguous'.format(repr(issue_sha1)))
         exit(1)
 
-    issue_data = issue.util.issues.getIssue(issue_sha1)
+    issue_data = get_repository().get(issue_sha1)
 
     issue_comment = ''
     if '--message' in ui:
@@ -1369,44 +872,26 @@ def commandComment(ui):
         print('fatal: aborting due to empty message')
         exit(1)
 
-    issue_comment_timestamp = datetime.datetime.now().timestamp()
-    issue_comment_sha1 = issue.util.misc.create_hash('{0}{1}{2}'.format(issue_sha1, issue_comment_timestamp, issue_comment))
-    issue_comment_data = {
-        'message': issue_comment,
-        'timestamp': issue_comment_timestamp,
-    }
-    config_data = issue.config.getConfig()
-    issue_comment_data = {
-        'author.name': config_data['author.name'],
-        'author.email': config_data['author.email'],
-        'message': issue_comment,
-        'timestamp': issue_comment_timestamp,
-    }
-
-    os.makedirs(issue.util.paths.comments_path_of(issue_sha1), exist_ok = True)
-    with open(os.path.join(issue.util.paths.comments_path_of(issue_sha1), '{0}.json'.format(issue_comment_sha1)), 'w') as ofstream:
-        ofstream.write(json.dumps(issue_comment_data))
-    markLastIssue(issue_sha1)
+    get_repository().comment(issue_sha1, issue_comment)
 
 def commandTag(ui):
     ui = ui.down()
     subcommand = str(ui)
     if subcommand == 'ls':
-        available_tags, tag_to_issue_map = issue.objects.tags.gather()
+        tag_counts = issue.index.tags.counts()
         created_tags = set(issue.objects.tags.ls())
-        for t in sorted(set(available_tags)):
+        for t in sorted(created_tags.union(tag_counts)):
             s = '{0}{1}'
             if '--verbose' in ui:
                 s += '/{2}'
             tag_marker = ' '
             if t not in created_tags:
                 tag_marker = '!'
-            print(s.format(tag_marker, t, len(tag_to_issue_map[t])))
+            print(s.format(tag_marker, t, tag_counts.get(t, 0)))
     elif subcommand == 'new':
         if '--missing' in ui:
-            available_tags, tag_to_issue_map = issue.objects.tags.gather()
             created_tags = set(issue.objects.tags.ls())
-            missing_tags = (set(available_tags) - created_tags)
+            missing_tags = (set(issue.index.tags.counts()) - created_tags)
             n = 0
             for t in missing_tags:
                 issue.objects.tags.make(t)
@@ -1426,92 +911,57 @@ def commandTag(ui):
     elif subcommand == 'show':
         print('details of tag: {0}'.format(ui.operands()[0]))
     elif subcommand == 'tag':
-        issue_sha1 = (getLastIssue() if '--last' in ui else operands[1])
-        try:
-            issue_sha1 = expandIssueUID(issue_sha1)
-        except issue.exceptions.IssueUIDAmbiguous:
-            print('fail: issue uid {0} is ambiguous'.format(repr(issue_sha1)))
-            exit(1)
-
         issue_tag = operands[0]
 
-        if issue_tag not in issue.objects.tags.gather()[0]:
-            print('fatal: tag "{0}" does not exist'.format(issue_tag))
-            print('note: use "issue tag new {0}" to create it'.format(issue_tag))
-            exit(1)
-
         if not issue_tag:
             print('fatal: aborting due to empty tag')
             exit(1)
 
-        repo_config = issue.config.getConfig()
-
-        issue_differences = [
-            {
-                'action': ('remove-tags' if '--remove' in ui else 'push-tags'),
-                'params': {
-                    'tags': [issue_tag],
-                },
-                'author': {
-                    'author.email': repo_config['author.email'],
-                    'author.name': repo_config['author.name'],
-                },
-                'timestamp': timestamp(),
-            }
-        ]
-
-        issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-        issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-        issue_diff_file_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-        with open(issue_diff_file_path, 'w') as ofstream:
-            ofstream.write(json.dumps(issue_differences))
-        markLastIssue(issue_sha1)
-        issue.util.issues.indexIssue(issue_sha1, issue_diff_sha1)
+        issue_list = select_issues(ui, ([getLastIssue()] if '--last' in ui else operands[1:]))
+        if not (issue_list or selecting(ui)):
+            print('{0}: no issues to tag'.format(colorise(COLOR_ERROR, 'error')))
+            exit(1)
+
+        repository = get_repository()
+        try:
+            with repository.batched():
+                for issue_sha1 in issue_list:
+                    repository.tag(issue_sha1, [issue_tag], remove = ('--remove' in ui))
+        except issue.exceptions.TagNotFound:
+            print('fatal: tag "{0}" does not exist'.format(issue_tag))
+            print('note: use "issue tag new {0}" to create it'.format(issue_tag))
+            exit(1)
     else:
         print('fatal: unrecognized subcommand: {0}'.format(subcommand))
         exit(1)
 
 def commandParam(ui):
-    issue_sha1 = (getLastIssue() if '--last' in ui else operands[0])
-    try:
-        issue_sha1 = expandIssueUID(issue_sha1)
-    except issue.exceptions.IssueUIDAmbiguous:
-        print('fail: issue uid {0} is ambiguous'.format(repr(issue_sha1)))
+    # Issues come first, then the key and (unless it is removed) the value.
+    n = (1 if '--remove' in ui else 2)
+    if len(operands) < n:
+        print('{0}: missing parameter {1}'.format(colorise(COLOR_ERROR, 'error'), ('key' if not operands else 'value')))
         exit(1)
-
-    issue_parameter_key = operands[int(not ('--last' in ui))]
+    issue_parameter_key = operands[-n]
+    issue_parameter_value = (None if '--remove' in ui else operands[-1])
 
     if not issue_parameter_key:
         print('fatal: aborting due to empty parameter key')
         exit(1)
 
-    repo_config = issue.config.getConfig()
-
-    issue_differences = [
-        {
-            'params': {},
-            'author': {
-                'author.email': repo_config['author.email'],
-                'author.name': repo_config['author.name'],
-            },
-            'timestamp': timestamp(),
-        }
-    ]
-    if '--remove' in ui:
-        issue_differences[0]['action'] = 'parameter-remove'
-        issue_differences[0]['params']['key'] = issue_parameter_key
-    else:
-        issue_differences[0]['action'] = 'parameter-set'
-        issue_differences[0]['params']['key'] = issue_parameter_key
-        issue_differences[0]['params']['value'] = operands[int(not ('--last' in ui))+1]
-
-    issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-    issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-    issue_diff_file_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-    with open(issue_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(issue_differences))
-    markLastIssue(issue_sha1)
-    issue.util.issues.indexIssue(issue_sha1, issue_diff_sha1)
+    issue_list = select_issues(ui, ([getLastIssue()] if '--last' in ui else operands[:-n]))
+    if not (issue_list or selecting(ui)):
+        print('{0}: no issues to set parameter on'.format(colorise(COLOR_ERROR, 'error')))
+        exit(1)
+
+    repository = get_repository()
+    with repository.batched():
+        for issue_sha1 in issue_list:
+            repository.param(
+                issue_sha1,
+                issue_parameter_key,
+                value = issue_parameter_value,
+                remove = ('--remove' in ui),
+            )
 
 def commandShow(ui):
     ui = ui.down()
@@ -1523,7 +973,7 @@ def commandShow(ui):
 
     issue_data = {}
     try:
-        issue_data = issue.util.issues.getIssue(issue_sha1)
+        issue_data = issue.util.issues.getIssue(issue_sha1, comments = (str(ui) == 'show' and '--comments' in ui))
     except issue.exceptions.NotAnIssue as e:
         print('fatal: {0} does not identify a valid object'.format(repr(issue_sha1)))
         exit(1)
@@ -1588,17 +1038,24 @@ def commandShow(ui):
 
         short_hash_chars = shortest_unique_prefix()
 
+        # Related issues are described by their summaries, looked up in one go.
+        related_issues = issue.index.graph.related(issue_sha1)
+        related_summaries = issue.index.summary.get(set(other for other, _ in related_issues))
+        not_summarised = set(other for other, _ in related_issues).difference(related_summaries)
+        if not_summarised:
+            related_summaries.update(issue.index.summary.load(not_summarised)[0])
+
         parent_uid = issue_data.get('parent')
         if parent_uid:
             chained_issues_heading = '---- CHILD OF'
             if colored:
                 chained_issues_heading = (colored.fg('white') + chained_issues_heading + colored.attr('reset'))
             print('\n{}'.format(chained_issues_heading))
-            parent_issue = getIssue(parent_uid)
+            parent_issue = related_summaries.get(parent_uid, {})
             print('    {0} ({1}): {2}'.format(
                 colorise(COLOR_HASH, parent_uid[:short_hash_chars]),
                 parent_issue.get('status'),
-                parent_issue.get('message', '').splitlines()[0]),
+                parent_issue.get('message', '')),
             )
 
         attached_issues = issue_data.get('attached', [])
@@ -1608,14 +1065,14 @@ def commandShow(ui):
                 attached_issues_heading = (colored.fg('white') + attached_issues_heading + colored.attr('reset'))
             print('\n{}'.format(attached_issues_heading))
             for s in sorted(attached_issues):
-                attached_issue = issue.util.issues.getIssue(s)
+                attached_issue = related_summaries.get(s, {})
                 short_hash = s[:short_hash_chars]
                 if colored:
                     short_hash = (colored.fg('yellow') + short_hash + colored.attr('reset'))
                 print('    {0} ({1}): {2}'.format(
                     short_hash,
                     attached_issue.get('status'),
-                    attached_issue.get('message', '').splitlines()[0],
+                    attached_issue.get('message', ''),
                 ))
 
         chained_issues = issue_data.get('chained', [])
@@ -1625,18 +1082,17 @@ def commandShow(ui):
                 chained_issues_heading = (colored.fg('white') + chained_issues_heading + colored.attr('reset'))
             print('\n{}'.format(chained_issues_heading))
             for s in sorted(chained_issues):
-                try:
-                    chained_issue = issue.util.issues.getIssue(s)
-                except issue.exceptions.NotAnIssue:
+                if s not in related_summaries:
                     # Ignore dropped issues.
                     continue
+                chained_issue = related_summaries[s]
                 short_hash = s[:short_hash_chars]
                 if colored:
                     short_hash = (colored.fg('yellow') + short_hash + colored.attr('reset'))
                 print('    {0} ({1}): {2}'.format(
                     short_hash,
                     chained_issue.get('status'),
-                    chained_issue.get('message', '').splitlines()[0],
+                    chained_issue.get('message', ''),
                 ))
 
         if 'closing_git_commit' in issue_data:
@@ -1647,7 +1103,7 @@ def commandShow(ui):
                 closing_git_commit = (colored.fg('yellow') + closing_git_commit + colored.attr('reset'))
             print('\n{}: {}\n'.format(closing_git_commit_heading, closing_git_commit))
 
-        issue_comment_thread = dict((issue_data['comments'][key]['timestamp'], key) for key in issue_data['comments'])
+        issue_comment_thread = dict((issue_data['comments'][key]['timestamp'], key) for key in issue_data.get('comments', {}))
         if issue_comment_thread and '--comments' in ui:
             comment_thread_heading = '---- COMMENT THREAD:'
             comment_thread_heading = colorise('white', comment_thread_heading)
@@ -1794,6 +1250,7 @@ def commandConfig(ui):
 
         with open(config_path, 'w') as ofstream:
             ofstream.write(json.dumps(config_data))
+        issue.config.invalidate()
     elif str(ui) == 'dump':
         print((json.dumps(config_data) if '--verbose' not in ui else json.dumps(config_data, sort_keys=True, indent=2)))
 
@@ -1801,7 +1258,7 @@ def commandRemote(ui):
     ui = ui.down()
     operands = ui.operands()
 
-    remotes = getRemotes()
+    remotes = issue.remote.getRemotes()
 
     if str(ui) == 'ls':
         for k, remote_data in remotes.items():
@@ -1818,7 +1275,7 @@ def commandRemote(ui):
             remotes[remote_name][ui.get('--key')] = ui.get('--value')
         if '--unset' in ui:
             del remotes[remote_name][ui.get('--unset')]
-        saveRemotes(remotes)
+        issue.remote.saveRemotes(remotes)
     elif str(ui) == 'rm':
         remote_name = ui.operands()[0]
         if remote_name in remotes:
@@ -1826,7 +1283,7 @@ def commandRemote(ui):
         else:
             print('fatal: remote does not exist: {0}'.format(remote_name))
             exit(1)
-        saveRemotes(remotes)
+        issue.remote.saveRemotes(remotes)
     elif str(ui) == 'show':
         remote_name = ui.operands()[0]
         if remote_name in remotes:
@@ -1838,7 +1295,7 @@ def commandRemote(ui):
 
 def commandFetch(ui):
     ui = ui.down()
-    remotes = getRemotes()
+    remotes = issue.remote.getRemotes()
     fetch_from_remotes = (ui.operands() or sorted(remotes.keys()))
     if '--status' in ui:
         for remote_name in fetch_from_remotes:
@@ -1848,58 +1305,140 @@ def commandFetch(ui):
             print('fetching status from remote: {0}'.format(remote_name))
             remote_status_path = os.path.join(issue.util.paths.tmp_path(), 'status')
             remote_pack_fetch_command = ('scp', '{0}/status'.format(remotes[remote_name]['url']), remote_status_path)
-            exit_code, output, error = runShell(*remote_pack_fetch_command)
+            exit_code, output, error = issue.remote.runShell(*remote_pack_fetch_command)
             if exit_code:
                 print('  * fail ({0}): {1}'.format(exit_code, error))
                 continue
             with open(remote_status_path) as ifstream:
                 remotes[remote_name]['status'] = ifstream.read().strip()
-        saveRemotes(remotes)
+        issue.remote.saveRemotes(remotes)
     else:
+        fetched_issues = set()
         for remote_name in fetch_from_remotes:
             print('{1} objects from remote: {0}'.format(remote_name, ('probing' if '--probe' in ui else 'fetching')))
-            fetchRemote(remote_name, remotes[remote_name])
+            fetched_issues.update(get_repository().fetch(remote_name, probe = ('--probe' in ui), verbose = ('--verbose' in ui)))
         if '--index' in ui:
-            for issue_sha1 in issue.util.issues.ls():
-                issue.util.issues.indexIssue(issue_sha1)
+            # Only issues that received new differences need to be indexed.
+            if index_issues(ui, fetched_issues):
+                exit(1)
 
 def commandPublish(ui):
     ui = ui.down()
-    local_pack = getPack()
-    remotes = getRemotes()
+    local_pack = issue.remote.getPack()
+    remotes = issue.remote.getRemotes()
     publish_to_remotes = (ui.operands() or sorted([k for k in remotes.keys() if remotes[k].get('status', 'unknow') == 'exchange']))
 
     if '--fetch' in ui:
         for remote_name in publish_to_remotes:
             print('fetching remote "{0}" before publishing'.format(remote_name))
-            fetchRemote(remote_name, remotes[remote_name])
+            get_repository().fetch(remote_name, verbose = ('--verbose' in ui))
 
     if '--pack' in ui:
-        savePack()
+        issue.remote.savePack()
 
     for remote_name in publish_to_remotes:
-        publishToRemote(remote_name, remotes[remote_name], local_pack, republish=('--republish' in ui))
+        get_repository().publish(remote_name, republish = ('--republish' in ui), verbose = ('--verbose' in ui), local_pack = local_pack)
+
+def index_jobs(ui):
+    if '--jobs' in ui:
+        return max(1, ui.get('--jobs'))
+    return int(issue.config.getConfig().get('index.jobs', (os.cpu_count() or 1)))
+
+def index_issues(ui, issue_list, full=False):
+    """Index issues and report the results.
+    Returns number of issues that failed to index.
+    """
+    return report_indexed(ui, issue.util.issues.indexIssues(sorted(issue_list), jobs = index_jobs(ui), full = full))
+
+def report_indexed(ui, results):
+    count_indexed, count_skipped, count_failed = 0, 0, 0
+    for issue_sha1, issue_data, error in results:
+        if error is not None:
+            count_failed += 1
+            print('{}: failed to index issue {}: {}'.format(
+                colorise(COLOR_ERROR, 'error'),
+                colorise(COLOR_HASH, issue_sha1),
+                error,
+            ))
+            continue
+        if issue_data is None:
+            count_skipped += 1
+        else:
+            count_indexed += 1
+        if '--verbose' in ui:
+            print('{} issue: {}'.format(('skipped' if issue_data is None else 'indexed'), issue_sha1))
+    print('indexed {} issue(s), skipped {}, failed {}'.format(count_indexed, count_skipped, count_failed))
+    return count_failed
 
 def commandIndex(ui):
     ui = ui.down()
-    issue_list = ui.operands()
+    issue_list = [expandIssueUID(i) for i in ui.operands()]
     if '--reverse' not in ui and not issue_list:
-        issue_list = issue.util.issues.ls()
+        issue_list = issue.index.uids.rebuild()
     if '--reverse' in ui:
         for i in issue.util.issues.ls():
-            if not os.listdir(os.path.join(issue.util.paths.issues_path(), i[:2], i, 'diff')):
+            if not issue.util.issues.listIssueDifferences(i):
                 issue_list.append(i)
-    for issue_sha1 in issue_list:
-        issue_sha1 = expandIssueUID(issue_sha1)
-        if '--reverse' in ui:
+    failed = 0
+    if '--reverse' in ui:
+        for issue_sha1 in issue_list:
             print('rev-indexing issue: {0}'.format(issue_sha1))
             issue.util.issues.revindexIssue(issue_sha1)
-        else:
-            if '--verbose' in ui:
-                print('indexing issue: {}'.format(issue_sha1))
-            issue.util.issues.indexIssue(issue_sha1)
+    else:
+        failed = index_issues(ui, issue_list, full = ('--full' in ui))
     if '--pack' in ui:
-        savePack()
+        issue.remote.savePack()
+    if failed:
+        exit(1)
+
+def commandImport(ui):
+    ui = ui.down()
+    import_path = issue.util.misc.first_or(ui.operands(), '-')
+    began = time.perf_counter()
+    records = []
+    ifstream = (sys.stdin if import_path == '-' else open(import_path))
+    try:
+        for n, line in enumerate(ifstream, start = 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print('{0}: line {1}: invalid JSON: {2}'.format(colorise(COLOR_ERROR, 'error'), n, e))
+                exit(1)
+            if not isinstance(record, dict) or not record.get('message'):
+                print('{0}: line {1}: issue without a message'.format(colorise(COLOR_ERROR, 'error'), n))
+                exit(1)
+            records.append(record)
+    finally:
+        if ifstream is not sys.stdin:
+            ifstream.close()
+
+    results = get_repository().import_issues(records, jobs = index_jobs(ui))
+    failed = report_indexed(ui, results)
+    elapsed = (time.perf_counter() - began)
+    print('imported {0} issue(s) in {1:.2f} s ({2:.0f} issues/s)'.format(len(records), elapsed, (len(records) / elapsed if elapsed else 0)))
+
+    created_tags = set(issue.objects.tags.ls())
+    missing_tags = set(t for each in records for t in each.get('tags', [])) - created_tags
+    if missing_tags:
+        print('{0}: imported issues use tags that were not created: {1}'.format(colorise(COLOR_NOTE, 'note'), ', '.join(sorted(missing_tags))))
+        print('{0}: use "issue tag new --missing" to create them'.format(colorise(COLOR_NOTE, 'note')))
+    if failed:
+        exit(1)
+
+def commandGc(ui):
+    ui = ui.down()
+    try:
+        pack_name, count = issue.objects.store.gc(repack = ('--repack' in ui))
+    except issue.exceptions.ExchangeRepository:
+        print('{0}: cannot pack objects of an exchange repository'.format(colorise(COLOR_ERROR, 'error')))
+        print('note: remotes fetch objects of an exchange as loose JSON files')
+        exit(1)
+    if pack_name is None:
+        print('nothing to pack')
+        return
+    print('packed {0} object(s) into {1}'.format(count, pack_name))
 
 def commandClone(ui):
     ui = ui.down()
@@ -1910,24 +1449,24 @@ def commandClone(ui):
     except issue.exceptions.RepositoryExists:
         print('fatal: repository exists')
         exit(1)
-    remotes = getRemotes()
+    remotes = issue.remote.getRemotes()
 
     remote_name = (ui.get('--name') if '--name' in ui else 'origin')
     remote_url = operands[0]
 
     remotes[remote_name] = {}
     remotes[remote_name]['url'] = remote_url
-    fetchRemote(remote_name, remotes[remote_name])
+    issue.remote.fetchRemote(remote_name, remotes[remote_name], verbose = ('--verbose' in ui))
 
     remote_status_path = os.path.join(issue.util.paths.tmp_path(), 'status')
     remote_pack_fetch_command = ('scp', '{0}/status'.format(remotes[remote_name]['url']), remote_status_path)
-    exit_code, output, error = runShell(*remote_pack_fetch_command)
+    exit_code, output, error = issue.remote.runShell(*remote_pack_fetch_command)
     if exit_code:
         print('  could not fetch status, use "issue fetch -U" to try again')
     if exit_code == 0:
         with open(remote_status_path) as ifstream:
             remotes[remote_name]['status'] = ifstream.read().strip()
-    saveRemotes(remotes)
+    issue.remote.saveRemotes(remotes)
 
 def commandChain(ui):
     ui = ui.down()
@@ -1943,56 +1482,8 @@ def commandChain(ui):
     for i, link_issue_sha1 in enumerate(link_issue_sha1s):
         link_issue_sha1s[i] = expand_issue_uid_or_exir(link_issue_sha1)
 
-    if str(ui) == 'attach':
-        repo_config = issue.config.getConfig()
-
-        for link_issue_sha1 in link_issue_sha1s:
-            issue_differences = [
-                {
-                    'action': 'chain-attach',
-                    'params': {
-                        'sha1': [link_issue_sha1],
-                    },
-                    'author': {
-                        'author.email': repo_config['author.email'],
-                        'author.name': repo_config['author.name'],
-                    },
-                    'timestamp': timestamp(),
-                }
-            ]
-
-            issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-            issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-            issue_diff_file_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-            with open(issue_diff_file_path, 'w') as ofstream:
-                ofstream.write(json.dumps(issue_differences))
-            markLastIssue(issue_sha1)
-            issue.util.issues.indexIssue(issue_sha1, issue_diff_sha1)
-    elif str(ui) == 'link':
-        repo_config = issue.config.getConfig()
-
-        for link_issue_sha1 in link_issue_sha1s:
-            issue_differences = [
-                {
-                    'action': 'chain-link',
-                    'params': {
-                        'sha1': [link_issue_sha1],
-                    },
-                    'author': {
-                        'author.email': repo_config['author.email'],
-                        'author.name': repo_config['author.name'],
-                    },
-                    'timestamp': timestamp(),
-                }
-            ]
-
-            issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
-            issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-            issue_diff_file_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-            with open(issue_diff_file_path, 'w') as ofstream:
-                ofstream.write(json.dumps(issue_differences))
-            markLastIssue(issue_sha1)
-            issue.util.issues.indexIssue(issue_sha1, issue_diff_sha1)
+    if str(ui) in ('attach', 'link'):
+        get_repository().chain(issue_sha1, link_issue_sha1s, attach = (str(ui) == 'attach'))
     elif str(ui) == 'unlink':
         print(ui)
     else:
@@ -2000,24 +1491,25 @@ def commandChain(ui):
 
 def commandStatistics(ui):
     ui = ui.down()
-    issue_list = listIssuesUsingShortestPossibleUIDs(with_full=True)
-
-    try:
-        issues = [issue.util.issues.getIssue(i[1]) for i in issue_list]
-    except issue.exceptions.NotIndexed:
-        sys.stderr.write('{}: not indexed\n'.format(colorise(COLOR_ERROR, 'error')))
-        sys.stderr.write('{}: run {} to index issues\n'.format(
-            colorise(COLOR_NOTE, 'note'),
-            colorise_repr('white', 'issue index'),
-        ))
-        exit(1)
-
-    open_issues = list(filter(lambda i: i['status'] == 'open', issues))
-    closed_issues = list(filter(lambda i: i['status'] == 'closed', issues))
+    # Aggregates are maintained by the indexing code; they only need to be
+    # rebuilt when they disagree with the UID index (e.g. some issues were
+    # missing from the summary index).
+    counters = issue.index.statistics.counters()
+    if counters['count'] != issue.index.uids.count():
+        _, not_indexed = issue.index.summary.load(issue.index.uids.ls())
+        if not_indexed:
+            sys.stderr.write('{}: not indexed\n'.format(colorise(COLOR_ERROR, 'error')))
+            sys.stderr.write('{}: run {} to index issues\n'.format(
+                colorise(COLOR_NOTE, 'note'),
+                colorise_repr('white', 'issue index'),
+            ))
+            exit(1)
+        issue.index.statistics.rebuild()
+        counters = issue.index.statistics.counters()
 
-    issues_count = len(issues)
-    open_issues_count = len(open_issues)
-    closed_issues_count = len(closed_issues)
+    issues_count = counters['count']
+    open_issues_count = counters['statuses'].get('open', 0)
+    closed_issues_count = counters['statuses'].get('closed', 0)
 
     if not issues_count:
         print('No issues.')
@@ -2050,58 +1542,23 @@ def commandStatistics(ui):
         ))
 
     if True:
-        avg_tags_per_issue = (sum(map(lambda i: len(i.get('tags', [])), issues)) / issues_count)
+        avg_tags_per_issue = (counters['tags'] / issues_count)
         print('avg. tags per issue: {0}'.format(round(avg_tags_per_issue, 1)))
 
     if True:
         if closed_issues_count:
-            open_closed_timestamps = list(map(lambda each: (
-                datetime.datetime.fromtimestamp(each['close.timestamp']),
-                datetime.datetime.fromtimestamp(each['open.timestamp']),
-            ), closed_issues))
-
-            current_datetime = datetime.datetime.now()
-            still_open_timestamps = list(map(lambda each: (
-                current_datetime,
-                datetime.datetime.fromtimestamp(each['open.timestamp']),
-            ), open_issues))
-
-            lifetimes_of_closed = list(map(lambda each: (each[0] - each[1]), open_closed_timestamps))
-            lifetimes_of_still_open = list(map(lambda each: (each[0] - each[1]), still_open_timestamps))
-
-            def sum_or_none_if_empty(seq):
-                if not seq:
-                    return None
-                if len(seq) == 1:
-                    return seq[0]
-                return sum(seq[1:], seq[0])
-
-            def avg_or_none(seq):
-                summed = sum_or_none_if_empty(seq)
-                if summed is None:
-                    return summed
-                return summed / len(seq)
-
-            def median_or_none(seq):
-                if not seq:
-                    return None
-                s = sorted(seq)
-                i = len(s) // 2
-                if len(s) % 2 == 0:
-                    return (s[i - 1] + s[i]) / 2
-                else:
-                    return s[i]
-
-            total_lifetime_of_closed = sum_or_none_if_empty(lifetimes_of_closed)
-            total_lifetime_of_still_open = sum_or_none_if_empty(lifetimes_of_still_open)
-            total_lifetime_of_all = sum_or_none_if_empty(lifetimes_of_closed + lifetimes_of_still_open)
-
-            avg_lifetime_of_closed = avg_or_none(lifetimes_of_closed)
-            med_lifetime_of_closed = median_or_none(lifetimes_of_closed)
-            avg_lifetime_of_still_open = avg_or_none(lifetimes_of_still_open)
-            med_lifetime_of_still_open = median_or_none(lifetimes_of_still_open)
-            avg_lifetime_of_all = avg_or_none(lifetimes_of_closed + lifetimes_of_still_open)
-            med_lifetime_of_all = median_or_none(lifetimes_of_closed + lifetimes_of_still_open)
+            lifetimes = issue.index.statistics.lifetimes()
+
+            total_lifetime_of_closed = lifetimes['closed']['total']
+            total_lifetime_of_still_open = lifetimes['open']['total']
+            total_lifetime_of_all = lifetimes['all']['total']
+
+            avg_lifetime_of_closed = lifetimes['closed']['avg']
+            med_lifetime_of_closed = lifetimes['closed']['med']
+            avg_lifetime_of_still_open = lifetimes['open']['avg']
+            med_lifetime_of_still_open = lifetimes['open']['med']
+            avg_lifetime_of_all = lifetimes['all']['avg']
+            med_lifetime_of_all = lifetimes['all']['med']
 
             if (total_lifetime_of_closed is None) or (total_lifetime_of_still_open is None):
                 perc_total_closed_of_open = None
@@ -2126,7 +1583,7 @@ def commandStatistics(ui):
                 return round(f, precision)
 
             print('lifetime of {} {} issues:'.format(
-                len(closed_issues),
+                closed_issues_count,
                 colorise('green', 'closed'),
             ))
             print('    total: {} ({}% of open, {}% of all)'.format(
@@ -2144,7 +1601,7 @@ def commandStatistics(ui):
             ))
 
             print('lifetime of {} {} issues:'.format(
-                len(open_issues),
+                open_issues_count,
                 colorise('red', 'open'),
             ))
             print('    total: {} ({}% more than closed)'.format(
@@ -2158,7 +1615,7 @@ def commandStatistics(ui):
 
             print('lifetime of {} {} issues:'.format(
                 colorise('cyan', 'all'),
-                len(issues),
+                issues_count,
             ))
             print('    total: {}'.format(total_lifetime_of_all))
             print('    avg:   {}'.format(avg_lifetime_of_all))
@@ -2169,26 +1626,26 @@ def commandStatistics(ui):
 def commandReleaseOpen(ui):
     ui = ui.down()
     release_name = ui.operands()[0]
-    current_next_release = get_next_release_pointer()
+    current_next_release = issue.release.get_next_release_pointer()
     if current_next_release:
         print('error: a release is currently opened: {}'.format(repr(current_next_release)))
         print('note: only one release can be opened at a time')
         print('note: close release {} before opening new one'.format(current_next_release))
         exit(1)
-    if release_name_exists(release_name) and not '--force' in ui:
+    if issue.release.release_name_exists(release_name) and not '--force' in ui:
         print('error: release already exists: {}'.format(repr(release_name)))
         exit(1)
-    release_base_path = get_release_path(release_name)
+    release_base_path = issue.release.get_release_path(release_name)
     os.makedirs(release_base_path, exist_ok=True)
     os.makedirs(os.path.join(release_base_path, 'diff'), exist_ok=True)
 
-    store_release_diff_open(release_name)
-    store_next_release_pointer(release_name)
+    issue.release.store_release_diff_open(release_name)
+    issue.release.store_next_release_pointer(release_name)
 
 def commandReleaseClose(ui):
     ui = ui.down()
     release_name = ui.operands()[0]
-    current_next_release = get_next_release_pointer()
+    current_next_release = issue.release.get_next_release_pointer()
     if current_next_release and release_name == '-':
         release_name = current_next_release
     if release_name != current_next_release:
@@ -2207,11 +1664,11 @@ def commandReleaseClose(ui):
         print('error: aborting due to empty release notes')
         exit(1)
 
-    with open(get_release_notes_path(release_name), 'w') as ofstream:
+    with open(issue.release.get_release_notes_path(release_name), 'w') as ofstream:
         ofstream.write(release_notes)
 
-    store_release_diff_close(release_name)
-    store_next_release_pointer('')
+    issue.release.store_release_diff_close(release_name)
+    issue.release.store_next_release_pointer('')
 
 def commandReleaseLs(ui):
     ui = ui.down()
@@ -2220,14 +1677,14 @@ def commandReleaseLs(ui):
 def commandReleaseNotes(ui):
     ui = ui.down()
     release_name = ui.operands()[0]
-    if not release_name_exists(release_name):
+    if not issue.release.release_name_exists(release_name):
         print('error: release does not exist: {}'.format(repr(release_name)))
         exit(1)
     if '--closed' not in ui and '--opened' not in ui:
         pager = os.getenv('PAGER', 'less')
-        os.system('{} {}'.format(pager, get_release_notes_path(release_name)))
+        os.system('{} {}'.format(pager, issue.release.get_release_notes_path(release_name)))
         return
-    release_diffs = get_release_diffs(release_name)
+    release_diffs = issue.release.get_release_diffs(release_name)
     opened_issues = filter(lambda _: _['action'] == 'open-issue', release_diffs)
     closed_issues = filter(lambda _: _['action'] == 'close-issue', release_diffs)
     if '--opened' in ui:
@@ -2258,24 +1715,40 @@ def commandRelease(ui):
     elif str(ui) == 'notes':
         commandReleaseNotes(ui)
 
+def commandServe(ui):
+    socket_path = issue.util.paths.serve_socket_path()
+    if issue.serve.running(socket_path):
+        print('{0}: already serving this repository on {1}'.format(colorise(COLOR_ERROR, 'error'), socket_path))
+        exit(1)
+    if '--verbose' in ui:
+        print('serving {0} on {1}'.format(os.path.abspath(issue.util.paths.get_repository_path()), socket_path))
+    issue.serve.serve(os.path.abspath(__file__), socket_path)
+
 def commandLog(ui):
     ui = ui.down()
-    events_log = issue.shortlog.read()
-    events_log = issue.shortlog.sort(events_log)
+    filtered = (str(ui) != 'squash' and any((each in ui) for each in ('--issue', '--event', '--since', '--until')))
+    if filtered:
+        events_log = issue.shortlog.query(
+            issue_uid = (expand_issue_uid_or_exir(ui.get('--issue')) if '--issue' in ui else None),
+            events = (set(each[0] for each in ui.get('--event')) if '--event' in ui else None),
+            since = (get_time_point([each[0] for each in ui.get('--since')]).timestamp() if '--since' in ui else None),
+            until = (get_time_point([each[0] for each in ui.get('--until')]).timestamp() if '--until' in ui else None),
+        )
+    elif str(ui) != 'squash':
+        # Only the tail of the log is read when just the head of the (most
+        # recent first) listing is going to be displayed.
+        limit = (ui.get('-H') if ('--head' in ui and '--tail' not in ui) else None)
+        events_log = issue.shortlog.sort(issue.shortlog.read(limit = limit))
 
     if str(ui) == 'squash':
+        events_log, squashed_events_log = issue.shortlog.squash(aggressive = ui.get('--aggressive'))
         initial_size = len(events_log)
         if initial_size < 2:
             print('{}: events_log too short to shorten'.format(colorise(COLOR_WARNING, 'warning')))
             return
-        squashed_events_log = issue.shortlog.squash_events_log(
-            events_log,
-            aggressive = ui.get('--aggressive'),
-        )
         final_size = len(squashed_events_log)
         if final_size < initial_size:
             print('{}: shortened events_log from {} to {} entries'.format(colorise(COLOR_NOTE, 'note'), initial_size, final_size))
-        issue.shortlog.write(squashed_events_log)
         if '--verbose' in ui:
             display_events_log(squashed_events_log)
     else:
@@ -2288,6 +1761,77 @@ def commandLog(ui):
         display_events_log(events_log, head=head, tail=tail)
 
 
+# Commands whose index updates can wait until the end of a batch; any other
+# command sees indexes updated by the commands before it.
+BATCH_DEFERRED_COMMANDS = ('open', 'close', 'comment', 'param', 'chain', 'tag tag')
+
+def run_batch_line(argv):
+    """Run a single command of a batch and return its exit code.
+    """
+    global ui, operands
+    try:
+        line_parser = clap.parser.Parser(command).feed(list(clap.formatter.Formatter(argv).format()))
+        clap.checker.RedChecker(line_parser).check()
+        line_ui = line_parser.parse().ui().finalise().down()
+    except Exception as e:
+        print('invalid command: {0}'.format(e))
+        return 1
+    line_command = str(line_ui)
+    if not line_command or line_command in ('batch', 'serve'):
+        print('command cannot be run in a batch: {0}'.format(repr(line_command)))
+        return 1
+    if line_command == 'tag':
+        line_command = 'tag {0}'.format(line_ui.down())
+    if line_command not in BATCH_DEFERRED_COMMANDS:
+        issue.index.flush()
+    ui, operands = line_ui, line_ui.operands()
+    try:
+        dispatch(line_ui, *COMMANDS)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return (e.code or 0)
+        print(e.code)
+        return 1
+    except Exception as e:
+        print('{0}: {1}'.format(type(e).__name__, e))
+        return 1
+    return 0
+
+def commandBatch(ui):
+    ui = ui.down()
+    batch_path = issue.util.misc.first_or(ui.operands(), '-')
+    # Read upfront: exit() called by a failing command closes standard input.
+    if batch_path == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(batch_path) as ifstream:
+            lines = ifstream.readlines()
+    failed = 0
+    with get_repository().batched():
+        for n, line in enumerate(lines, start = 1):
+            try:
+                argv = shlex.split(line, comments = True)
+            except ValueError as e:
+                argv, output, status = None, 'invalid command: {0}\n'.format(e), 1
+            if argv == []:
+                continue
+            if argv is not None:
+                captured = io.StringIO()
+                with contextlib.redirect_stdout(captured), contextlib.redirect_stderr(captured):
+                    status = run_batch_line(argv)
+                output = captured.getvalue()
+            failed += (1 if status else 0)
+            print(json.dumps({
+                'line': n,
+                'command': line.strip(),
+                'status': status,
+                'output': output,
+            }))
+            if status and '--stop' in ui:
+                break
+    if failed:
+        exit(1)
+
 def dispatch(ui, *commands, overrides = {}, default_command=''):
     """Semi-automatic command dispatcher.
 
@@ -2319,8 +1863,8 @@ def dispatch(ui, *commands, overrides = {}, default_command=''):
         ))
 
 
-dispatch(ui,        # first: pass the UI object to dispatch
-    commandInit,    # second: pass command handling functions
+COMMANDS = (
+    commandInit,
     commandOpen,
     commandClose,
     commandLs,
@@ -2335,9 +1879,17 @@ dispatch(ui,        # first: pass the UI object to dispatch
     commandFetch,
     commandPublish,
     commandIndex,
+    commandGc,
+    commandImport,
     commandClone,
     commandChain,
     commandStatistics,
     commandRelease,
     commandLog,
+    commandBatch,
+    commandServe,
 )
+
+# Files written by a command are synced together when it ends.
+with issue.util.atomic.group():
+    dispatch(ui, *COMMANDS)
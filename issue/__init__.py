@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 
 from . import config
-from . import framework
 from . import exceptions
-from . import shortlog
 from . import util
-from . import repository
-from . import objects
 
 
 __version__ = '0.4.8'
 __commit__ = 'HEAD'
+
+# Remaining submodules are only imported when a command first uses them.
+_submodule = util.misc.lazy_submodules(__name__, (
+    'framework',
+    'shortlog',
+    'repository',
+    'release',
+    'remote',
+    'objects',
+    'index',
+    'serve',
+))
+
+def __getattr__(name):
+    if name == 'Repository':
+        return _submodule('repository').Repository
+    return _submodule(name)
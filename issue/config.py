@@ -2,15 +2,39 @@ import json
 import os
 
 
+# Parsed configuration, kept for the lifetime of the process together with
+# the state of the files it was read from.
+_cache = {}
+
+
+def _state(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def invalidate():
+    """Forget cached configuration; the next getConfig() reads the files again.
+    """
+    _cache.clear()
+
 def getConfig():
-    config_data = {}
     config_path_global = os.path.expanduser('~/.issueconfig.json')
-    config_path_local = './.issue/config.json'
-    if os.path.isfile(config_path_global):
-        with open(config_path_global, 'r') as ifstream:
-            config_data = json.loads(ifstream.read())
-    if os.path.isfile(config_path_local):
-        with open(config_path_local, 'r') as ifstream:
-            for k, v in json.loads(ifstream.read()).items():
-                config_data[k] = v
-    return config_data
+    config_path_local = os.path.abspath('./.issue/config.json')
+    key = (
+        (config_path_global, _state(config_path_global)),
+        (config_path_local, _state(config_path_local)),
+    )
+    if _cache.get('key') != key:
+        config_data = {}
+        if os.path.isfile(config_path_global):
+            with open(config_path_global, 'r') as ifstream:
+                config_data = json.loads(ifstream.read())
+        if os.path.isfile(config_path_local):
+            with open(config_path_local, 'r') as ifstream:
+                for k, v in json.loads(ifstream.read()).items():
+                    config_data[k] = v
+        _cache['key'] = key
+        _cache['data'] = config_data
+    return dict(_cache['data'])
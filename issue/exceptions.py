@@ -27,3 +27,15 @@ class TagExists(IssueException):
 
 class Invalid_time_delta_specification(IssueException):
     pass
+
+class TagNotFound(IssueException):
+    pass
+
+class IssueClosed(IssueException):
+    pass
+
+class UnclosedChainedIssues(IssueException):
+    pass
+
+class ExchangeRepository(IssueException):
+    pass
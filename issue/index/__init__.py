@@ -0,0 +1,75 @@
+import contextlib
+
+import issue
+
+__getattr__ = issue.util.misc.lazy_submodules(__name__, (
+    'summary',
+    'uids',
+    'tags',
+    'trigrams',
+    'times',
+    'graph',
+    'statistics',
+    'journal',
+))
+
+
+# Updates collected by deferred(), or None when indexes are updated at once.
+_pending = None
+
+
+def _update(issues):
+    from . import summary, uids, tags, trigrams, times, graph, statistics
+    # Indexes never refer to issue files which are not in place yet.
+    issue.util.atomic.commit()
+    replaced = summary.update(issues)
+    uids.update(
+        added = [k for k, v in issues.items() if v is not None],
+        removed = [k for k, v in issues.items() if v is None],
+    )
+    tags.update(issues, replaced)
+    trigrams.update(issues, replaced)
+    times.update(issues, replaced)
+    graph.update(issues, replaced)
+    statistics.update(issues, replaced)
+
+def update(issues):
+    """Propagate freshly indexed (or dropped) issues to repository-wide indexes.
+    """
+    if _pending is not None:
+        _pending.update(issues)
+        return
+    _update(issues)
+
+def pending():
+    """Return dict of updates deferred so far (UIDs mapped to issue data, or
+    to None for dropped issues).
+    """
+    return dict(_pending or {})
+
+def flush():
+    """Apply updates deferred so far, and keep deferring later ones.
+    """
+    global _pending
+    if _pending:
+        issues, _pending = _pending, {}
+        _update(issues)
+
+@contextlib.contextmanager
+def deferred():
+    """Defer updates made inside the block, and apply them all at once when
+    it ends.  Indexes read inside the block do not reflect deferred updates
+    until flush() is called.
+    """
+    global _pending
+    if _pending is not None:
+        # Already deferring; the outermost block applies the updates.
+        yield
+        return
+    _pending = {}
+    try:
+        yield
+    finally:
+        issues, _pending = _pending, None
+        if issues:
+            _update(issues)
@@ -0,0 +1,166 @@
+"""Relationship graph index of the repository.
+
+Relationships are stored forward inside indexes of issues ('chained',
+'attached' and 'parent').  This index keeps them in both directions, with
+the status of the issue at the other end, in `index/graph`:
+
+    <uid> SPACE <relation> SPACE <other uid> SPACE <status of other as JSON> NEWLINE
+
+Records are sorted, so all edges of an issue (or only the ones of a single
+relation) are found by bisecting the memory-mapped file.  Status is null when
+the other issue is not indexed (or was dropped).
+
+The journal of the index (see issue.index.journal) maps edges
+(`<uid> SPACE <relation> SPACE <other uid>`) to a list holding the status,
+or to null for removed edges.
+"""
+
+import json
+import os
+
+import issue
+
+
+# Forward relations (as stored in issue indexes) and their reverse.
+RELATIONS = {
+    'chained': 'chained-by',
+    'attached': 'attached-to',
+    'parent': 'child',
+}
+
+_MIRRORS = dict(list(RELATIONS.items()) + [(v, k) for k, v in RELATIONS.items()])
+
+
+def _graph_path():
+    return os.path.join(issue.util.paths.index_path(), 'graph')
+
+def _edges(issue_uid, issue_data):
+    """Yield `(uid, relation, other uid)` edges of an issue in both directions.
+    """
+    for relation, reverse in RELATIONS.items():
+        others = issue_data.get(relation, [])
+        if not isinstance(others, list):
+            others = [others]
+        for other in others:
+            yield (issue_uid, relation, other)
+            yield (other, reverse, issue_uid)
+
+def _record(edge, status):
+    return '{0} {1} {2} {3}\n'.format(*edge, json.dumps(status)).encode('utf-8')
+
+def _parse(record):
+    issue_uid, relation, other, status = record.rstrip(b'\n').decode('utf-8').split(' ', 3)
+    return ((issue_uid, relation, other), json.loads(status))
+
+def _edge_key(edge):
+    return ' '.join(edge)
+
+def _mirror(edge):
+    issue_uid, relation, other = edge
+    return (other, _MIRRORS[relation], issue_uid)
+
+def _statuses(issue_uids):
+    summaries = issue.index.summary.get(issue_uids)
+    return dict((k, (summaries[k].get('status', '') if k in summaries else None)) for k in issue_uids)
+
+def _store(edges):
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    issue.util.atomic.write(_graph_path(), b''.join(sorted(_record(edge, status) for edge, status in edges.items())))
+
+def rebuild():
+    """Rebuild the index from indexes of all issues.
+    """
+    edges = {}
+    for issue_uid in issue.index.uids.ls():
+        try:
+            issue_data = issue.util.issues.getIssue(issue_uid, comments = False)
+        except (issue.exceptions.NotIndexed, issue.exceptions.NotAnIssue):
+            continue
+        edges.update((edge, None) for edge in _edges(issue_uid, issue_data))
+    statuses = _statuses(sorted(set(edge[2] for edge in edges)))
+    _store(dict((edge, statuses[edge[2]]) for edge in edges))
+    issue.index.journal.discard(_graph_path())
+
+def _fold(journal):
+    edges = {}
+    with open(_graph_path(), 'rb') as ifstream:
+        for record in ifstream:
+            edge, status = _parse(record)
+            if _edge_key(edge) not in journal:
+                edges[edge] = status
+    for key, value in journal.items():
+        if value is not None:
+            edges[tuple(key.split(' '))] = value[0]
+    _store(edges)
+
+def _lookup(mapped, journal, prefix):
+    """Return a dict mapping edges starting with `prefix` to their statuses.
+    """
+    edges = {}
+    for record in issue.util.mapped.lines_with_prefix(mapped, prefix.encode('utf-8')):
+        edge, status = _parse(record)
+        if _edge_key(edge) not in journal:
+            edges[edge] = status
+    for key, value in journal.items():
+        if value is not None and key.startswith(prefix):
+            edges[tuple(key.split(' '))] = value[0]
+    return edges
+
+def update(issues, replaced):
+    """Replace edges of `issues` (a dict mapping UIDs to issue data, or to
+    None for dropped issues), and refresh statuses of edges ending at them
+    if their statuses changed, given summaries they `replaced` in the
+    summary index.
+    """
+    if not os.path.isfile(_graph_path()):
+        rebuild()
+        return
+    journal = issue.index.journal.read(_graph_path())
+    changes = {}
+    def change(edge, value):
+        journal[_edge_key(edge)] = changes[_edge_key(edge)] = value
+
+    mapped = issue.util.mapped.open_mapped(_graph_path())
+    try:
+        # Edges are owned by the issue storing the forward relation.
+        for issue_uid, issue_data in issues.items():
+            old_edges = set()
+            for relation in RELATIONS:
+                for edge in _lookup(mapped, journal, '{0} {1} '.format(issue_uid, relation)):
+                    old_edges.update((edge, _mirror(edge)))
+            new_edges = set(() if issue_data is None else _edges(issue_uid, issue_data))
+            for edge in old_edges.difference(new_edges):
+                change(edge, None)
+            added = new_edges.difference(old_edges)
+            statuses = _statuses(sorted(set(edge[2] for edge in added)))
+            for edge in added:
+                change(edge, [statuses[edge[2]]])
+
+        for issue_uid, issue_data in issues.items():
+            status = (None if issue_data is None else issue_data.get('status', ''))
+            old = replaced.get(issue_uid)
+            if old is not None and issue_data is not None and old.get('status', '') == status:
+                continue
+            for edge in _lookup(mapped, journal, '{0} '.format(issue_uid)):
+                change(_mirror(edge), [status])
+    finally:
+        if mapped is not None:
+            mapped.close()
+    if issue.index.journal.append(_graph_path(), changes):
+        issue.index.journal.compact(_graph_path(), _fold)
+
+def related(issue_uid, relation=None):
+    """Return list of `(other uid, status of other)` tuples for edges of an
+    issue, optionally only of a single relation (forward or reverse).
+    """
+    if not os.path.isfile(_graph_path()):
+        rebuild()
+    journal = issue.index.journal.read(_graph_path())
+    mapped = issue.util.mapped.open_mapped(_graph_path())
+    prefix = ('{0} '.format(issue_uid) if relation is None else '{0} {1} '.format(issue_uid, relation))
+    try:
+        edges = _lookup(mapped, journal, prefix)
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return [(edge[2], status) for edge, status in sorted(edges.items())]
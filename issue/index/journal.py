@@ -0,0 +1,89 @@
+"""Journals of changes to repository-wide indexes.
+
+Indexes are sorted files, so changing a single record in place means
+rewriting the whole file.  Instead, changes are appended to the journal of
+an index, `<index>.journal`:
+
+    <key as JSON> TAB <value as JSON> NEWLINE
+
+The value appended last for a key replaces whatever the index holds for that
+key (null removes it); what keys and values are is up to the index.  Readers
+apply the journal on top of the index.  Once the journal outgrows
+1/COMPACTION_RATIO of the index (and COMPACTION_MIN_SIZE), the index is
+rewritten with the journal folded into it and the journal is removed, so
+the cost of a change does not depend on the size of the repository.
+
+Readers read the journal before the index: replaying entries which have
+already been folded into the index changes nothing.
+"""
+
+import json
+import os
+
+import issue
+
+
+COMPACTION_MIN_SIZE = (16 * 1024)
+COMPACTION_RATIO = 16
+
+
+def journal_path(path):
+    return '{0}.journal'.format(path)
+
+def _read(path, limit=None):
+    entries = {}
+    try:
+        with open(journal_path(path), 'rb') as ifstream:
+            contents = ifstream.read(-1 if limit is None else limit)
+    except FileNotFoundError:
+        return entries
+    for line in contents.split(b'\n')[:-1]:
+        # Anything after the last newline is an unfinished append.
+        key, value = line.split(b'\t', 1)
+        entries[json.loads(key)] = json.loads(value)
+    return entries
+
+def read(path):
+    """Return a dict mapping keys to their latest values in the journal of
+    the index at `path`.
+    """
+    return dict(issue.serve.cached('journal', [journal_path(path)], lambda: _read(path)))
+
+def append(path, entries):
+    """Append `entries` (a dict mapping keys to values) to the journal of the
+    index at `path`.  Returns True if the journal should be compacted.
+    """
+    if not entries:
+        return False
+    size = issue.util.atomic.append(journal_path(path), b''.join(
+        '{0}\t{1}\n'.format(json.dumps(k), json.dumps(v)).encode('utf-8') for k, v in entries.items()))
+    try:
+        base_size = os.stat(path).st_size
+    except FileNotFoundError:
+        base_size = 0
+    return size > max(COMPACTION_MIN_SIZE, (base_size // COMPACTION_RATIO))
+
+def compact(path, fold):
+    """Fold the journal into the index at `path`.  `fold` is called with the
+    journal entries and must rewrite the index with them applied.
+    """
+    try:
+        size = os.stat(journal_path(path)).st_size
+    except FileNotFoundError:
+        return
+    fold(_read(path, size))
+    # Entries appended meanwhile are kept, and the folded ones are replayed
+    # harmlessly until the next compaction.
+    try:
+        if os.stat(journal_path(path)).st_size == size:
+            os.unlink(journal_path(path))
+    except FileNotFoundError:
+        pass
+
+def discard(path):
+    """Remove the journal of the index at `path` (e.g. after it was rebuilt).
+    """
+    try:
+        os.unlink(journal_path(path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,347 @@
+"""Running aggregates for `issue statistics`.
+
+What every issue contributes to the aggregates (its status, number of tags,
+lifetime if it is closed, open time if it is open) is kept in
+`index/statistics.uids`, one record per issue, sorted by UID:
+
+    <uid> TAB <contribution as JSON> NEWLINE
+
+Counters of these contributions are kept in `index/statistics` as JSON:
+
+    {"version": 3, "stamps": {"<suffix>": [<inode>, <size>, <mtime in ns>], ...},
+     "count": <issues>, "statuses": {"<status>": <issues>, ...}, "tags": <tags of all issues>,
+     "closed": <sum of lifetimes of closed issues>, "open": <sum of open times of open issues>}
+
+and two sorted arrays of native 64-bit integers serve as order statistics
+for medians:
+
+- `index/statistics.closed` with lifetimes of closed issues,
+- `index/statistics.open` with open times of open issues (their lifetimes
+  depend on the current time, and sort in reverse order of open times).
+
+All times are in microseconds since the UNIX epoch (in UTC), so stored values
+do not depend on the time zone of the process that wrote them, and lifetimes
+are elapsed times between UTC instants.  (`issue statistics` used to subtract
+naive local datetimes, which only differs across changes of UTC offset.)
+
+Updates only append current contributions of issues to the journal (see
+issue.index.journal), keyed by UID.  Counters and arrays describe the
+records of `index/statistics.uids`, and are written with them when the
+journal is compacted; readers subtract the recorded contribution of every
+issue in the journal and add the journaled one.  Counters carry stamps of
+the files they were written with, and are recomputed from the records if
+any of them does not match (e.g. after a crash in the middle of a
+compaction).
+"""
+
+import array
+import bisect
+import contextlib
+import datetime
+import json
+import mmap
+import os
+
+import issue
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo = datetime.timezone.utc)
+
+# Aggregates written before contributions were recorded lack the version, or
+# have an older one, and are rebuilt.
+VERSION = 3
+
+_MICROSECOND = datetime.timedelta(microseconds = 1)
+_TYPECODE = 'q'
+_SUFFIXES = ('.uids', '.closed', '.open')
+
+
+def _statistics_path(suffix=''):
+    return os.path.join(issue.util.paths.index_path(), 'statistics{0}'.format(suffix))
+
+def _since_epoch(timestamp):
+    return (datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc) - EPOCH) // _MICROSECOND
+
+def _contribution(summary):
+    """Return a list `[status, number of tags, lifetime if closed, open time if open]`.
+    """
+    status = summary.get('status', '')
+    lifetime, opened = None, None
+    if status == 'closed':
+        lifetime = _since_epoch(summary.get('close.timestamp', 0)) - _since_epoch(summary.get('open.timestamp', 0))
+    elif status == 'open':
+        opened = _since_epoch(summary.get('open.timestamp', 0))
+    return [status, len(summary.get('tags', [])), lifetime, opened]
+
+def _empty():
+    return {'count': 0, 'statuses': {}, 'tags': 0, 'closed': 0, 'open': 0}
+
+def _count(counters, contribution, sign):
+    status, tags, lifetime, open_time = contribution
+    counters['count'] += sign
+    counters['statuses'][status] = counters['statuses'].get(status, 0) + sign
+    counters['tags'] += (sign * tags)
+    for value, key in ((lifetime, 'closed'), (open_time, 'open')):
+        if value is not None:
+            counters[key] += (sign * value)
+
+def _stamp(stat):
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+def _record(issue_uid, contribution):
+    return '{0}\t{1}\n'.format(issue_uid, json.dumps(contribution)).encode('utf-8')
+
+def _store(contributions):
+    """Write records, arrays and counters of `contributions` (a dict mapping
+    UIDs to contributions), counters last.
+    """
+    counters = _empty()
+    lifetimes, opened = array.array(_TYPECODE), array.array(_TYPECODE)
+    for contribution in contributions.values():
+        _count(counters, contribution, 1)
+        if contribution[2] is not None:
+            lifetimes.append(contribution[2])
+        if contribution[3] is not None:
+            opened.append(contribution[3])
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    counters['stamps'] = {
+        '.uids': _stamp(issue.util.atomic.write(_statistics_path('.uids'),
+            b''.join(_record(k, contributions[k]) for k in sorted(contributions)))),
+        '.closed': _stamp(issue.util.atomic.write(_statistics_path('.closed'), array.array(_TYPECODE, sorted(lifetimes)).tobytes())),
+        '.open': _stamp(issue.util.atomic.write(_statistics_path('.open'), array.array(_TYPECODE, sorted(opened)).tobytes())),
+    }
+    counters['statuses'] = dict((k, v) for k, v in counters['statuses'].items() if v)
+    counters['version'] = VERSION
+    issue.util.atomic.write(_statistics_path(), json.dumps(counters))
+
+def rebuild():
+    """Rebuild aggregates from the summary index.
+    """
+    _store(dict((k, _contribution(v)) for k, v in issue.index.summary.read().items()))
+    issue.index.journal.discard(_statistics_path())
+
+def _recorded():
+    contributions = {}
+    with open(_statistics_path('.uids'), 'rb') as ifstream:
+        for record in ifstream:
+            issue_uid, contribution = record.split(b'\t', 1)
+            contributions[issue_uid.decode('ascii')] = json.loads(contribution)
+    return contributions
+
+def _stored():
+    try:
+        with open(_statistics_path()) as ifstream:
+            stored = json.loads(ifstream.read())
+    except (FileNotFoundError, ValueError):
+        return None
+    return (stored if stored.get('version') == VERSION else None)
+
+def _mapped(suffix):
+    """Return a tuple `(stamp, mapping)` of a file; the mapping is None if
+    the file is empty.  Raises FileNotFoundError if there is no file.
+    """
+    with open(_statistics_path(suffix), 'rb') as ifstream:
+        stat = os.fstat(ifstream.fileno())
+        return (_stamp(stat), (mmap.mmap(ifstream.fileno(), 0, access = mmap.ACCESS_READ) if stat.st_size else None))
+
+def _lookup(mapped, issue_uid):
+    prefix = '{0}\t'.format(issue_uid).encode('ascii')
+    for record in issue.util.mapped.lines_with_prefix(mapped, prefix):
+        return json.loads(record[len(prefix):])
+    return None
+
+@contextlib.contextmanager
+def _snapshot(attempts=3):
+    """Yield a tuple `(counters, removed, added, mapped)`: counters with the
+    journal applied, lists of contributions the journal removes from and adds
+    to the recorded ones, and a dict mapping suffixes of the files counters
+    were written with to their mappings.
+
+    If counters do not match the files (a compaction crashed, or replaced
+    some of the files after they were read), they are recomputed from the
+    records, or rebuilt if there are none.
+    """
+    # The journal is read first: entries folded into the files meanwhile
+    # are replayed harmlessly.
+    journal = issue.index.journal.read(_statistics_path())
+    mapped = {}
+    try:
+        for attempt in range(attempts):
+            stored, stamps = _stored(), {}
+            try:
+                for suffix in _SUFFIXES:
+                    stamps[suffix], mapped[suffix] = _mapped(suffix)
+            except FileNotFoundError:
+                pass
+            if stored is not None and stored['stamps'] == stamps:
+                break
+            for each in mapped.values():
+                if each is not None:
+                    each.close()
+            mapped = {}
+            if os.path.isfile(_statistics_path('.uids')):
+                _store(_recorded())
+            else:
+                rebuild()
+        else:
+            raise RuntimeError('statistics keep changing while they are read')
+
+        counters = dict((k, stored[k]) for k in _empty())
+        counters['statuses'] = dict(stored['statuses'])
+        removed, added = [], []
+        for issue_uid, contribution in journal.items():
+            recorded = _lookup(mapped['.uids'], issue_uid)
+            if recorded == contribution:
+                continue
+            if recorded is not None:
+                _count(counters, recorded, -1)
+                removed.append(recorded)
+            if contribution is not None:
+                _count(counters, contribution, 1)
+                added.append(contribution)
+        counters['statuses'] = dict((k, v) for k, v in counters['statuses'].items() if v)
+        yield (counters, removed, added, mapped)
+    finally:
+        for each in mapped.values():
+            if each is not None:
+                each.close()
+
+def _fold(journal):
+    contributions = _recorded()
+    for issue_uid, contribution in journal.items():
+        contributions.pop(issue_uid, None)
+        if contribution is not None:
+            contributions[issue_uid] = contribution
+    _store(contributions)
+
+def update(issues, replaced):
+    """Update aggregates for `issues` (a dict mapping UIDs to issue data, or
+    to None for dropped issues), given summaries they `replaced` in the
+    summary index.  Only issues whose contribution changed are journaled.
+    """
+    if not os.path.isfile(_statistics_path('.uids')):
+        rebuild()
+        return
+    changes = {}
+    for issue_uid, issue_data in issues.items():
+        before = (None if replaced.get(issue_uid) is None else _contribution(replaced[issue_uid]))
+        after = (None if issue_data is None else _contribution(issue.index.summary.summarise(issue_data)))
+        if before != after:
+            changes[issue_uid] = after
+    if issue.index.journal.append(_statistics_path(), changes):
+        issue.index.journal.compact(_statistics_path(), _fold)
+
+def counters():
+    """Return counters of all issues: their number, numbers of issues with
+    each status, sum of their numbers of tags, and sums of lifetimes of
+    closed issues and open times of open issues.
+    """
+    with _snapshot() as (counters, _, _, _):
+        return counters
+
+def _kth(a, a_length, b, b_length, k):
+    """Return k-th (from 0) smallest value of two sorted sequences, given as
+    functions returning their i-th value.
+    """
+    low, high = max(0, k + 1 - b_length), min(k + 1, a_length)
+    while low < high:
+        i = (low + high) // 2
+        if a(i) < b(k - i):
+            low = i + 1
+        else:
+            high = i
+    candidates = []
+    if low > 0:
+        candidates.append(a(low - 1))
+    if (k - low) >= 0:
+        candidates.append(b(k - low))
+    return max(candidates)
+
+
+class _Values:
+    """Sorted values of an array, with `removed` values taken out and `added`
+    ones put in (both sorted lists).  Indexing bisects instead of copying
+    the array, so it costs O(log(n)^2 * log(journal)).
+    """
+    def __init__(self, values, removed, added):
+        self.values, self.removed, self.added = values, removed, added
+
+    def _kept(self, k):
+        # The first value with more than k kept values not greater than it.
+        low, high = 0, len(self.values)
+        while low < high:
+            i = (low + high) // 2
+            value = self.values[i]
+            if (bisect.bisect_right(self.values, value) - bisect.bisect_right(self.removed, value)) <= k:
+                low = i + 1
+            else:
+                high = i
+        return self.values[low]
+
+    def __len__(self):
+        return len(self.values) - len(self.removed) + len(self.added)
+
+    def __getitem__(self, k):
+        return _kth(self._kept, (len(self.values) - len(self.removed)), self.added.__getitem__, len(self.added), k)
+
+def _median(count, kth):
+    if not count:
+        return None
+    i = count // 2
+    if count % 2 == 0:
+        return (kth(i - 1) * _MICROSECOND + kth(i) * _MICROSECOND) / 2
+    return kth(i) * _MICROSECOND
+
+def lifetimes(now=None):
+    """Return a dict with total, average and median lifetimes (as timedeltas,
+    or None) of 'closed', 'open' and 'all' issues.
+
+    Arrays are memory-mapped, and values changed by the journal are taken
+    into account without copying them: a median of all issues costs
+    O(log(n)^3 * log(journal)) instead of O(n).
+    """
+    now = (((datetime.datetime.now(datetime.timezone.utc) - EPOCH) // _MICROSECOND) if now is None else now)
+    with _snapshot() as (stored, removed, added, mapped):
+        values = {}
+        for key, suffix, i in (('closed', '.closed', 2), ('open', '.open', 3)):
+            values[key] = _Values(
+                (array.array(_TYPECODE) if mapped[suffix] is None else memoryview(mapped[suffix]).cast(_TYPECODE)),
+                sorted(each[i] for each in removed if each[i] is not None),
+                sorted(each[i] for each in added if each[i] is not None),
+            )
+        try:
+            return _report(now, stored, values['closed'], values['open'])
+        finally:
+            for each in values.values():
+                if isinstance(each.values, memoryview):
+                    each.values.release()
+
+def _report(now, stored, closed, opened):
+    def open_lifetime(k):
+        # Lifetimes of open issues in ascending order.
+        return now - opened[len(opened) - 1 - k]
+
+    totals = {
+        'closed': stored['closed'],
+        'open': (len(opened) * now) - stored['open'],
+    }
+    totals['all'] = totals['closed'] + totals['open']
+    counts = {
+        'closed': len(closed),
+        'open': len(opened),
+        'all': len(closed) + len(opened),
+    }
+    kths = {
+        'closed': closed.__getitem__,
+        'open': open_lifetime,
+        'all': lambda k: _kth(closed.__getitem__, len(closed), open_lifetime, len(opened), k),
+    }
+    report = {}
+    for key in ('closed', 'open', 'all'):
+        total = (totals[key] * _MICROSECOND if counts[key] else None)
+        report[key] = {
+            'total': total,
+            'avg': (None if total is None else (total / counts[key])),
+            'med': _median(counts[key], kths[key]),
+        }
+    return report
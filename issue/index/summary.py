@@ -0,0 +1,209 @@
+"""Summary index of the repository.
+
+One record per issue, sorted by UID:
+
+    <uid> TAB <status as JSON> TAB <summary as JSON> NEWLINE
+
+Status is repeated in front of the summary so that filtering by status can
+skip records without copying or decoding them.  Changed summaries are kept
+in the journal of the index (see issue.index.journal), keyed by UID.
+"""
+
+import json
+import os
+
+import issue
+
+
+# Fields copied verbatim from an issue index into its summary.
+# The message is summarised separately (only its first line is kept).
+SUMMARY_FIELDS = (
+    'status',
+    'tags',
+    'milestones',
+    'parameters',
+    'open.author.name',
+    'open.author.email',
+    'open.timestamp',
+    'close.author.name',
+    'close.author.email',
+    'close.timestamp',
+)
+
+
+def summarise(issue_data):
+    summary = {k: issue_data[k] for k in SUMMARY_FIELDS if k in issue_data}
+    if 'message' in issue_data:
+        summary['message'] = issue.util.misc.first_or(issue_data['message'].splitlines(), '')
+        # Lets other indexes tell whether the whole message changed.
+        summary['message.digest'] = issue.util.misc.create_hash(issue_data['message'])[:16]
+    return summary
+
+def _status_token(status):
+    return json.dumps(status).encode('utf-8')
+
+def _record(issue_uid, summary):
+    return '{0}\t{1}\t{2}\n'.format(
+        issue_uid,
+        json.dumps(summary.get('status', '')),
+        json.dumps(summary),
+    ).encode('utf-8')
+
+def _decode(record):
+    return json.loads(record.split(b'\t', 2)[2])
+
+def _scan(mapped, journal, statuses=None):
+    """Yield `(uid, summary)` pairs for all records, with `journal` applied.
+    Summary is None for records whose status is not one of `statuses`.
+    """
+    wanted = (None if statuses is None else set(_status_token(s) for s in statuses))
+    offset = 0
+    while mapped is not None and offset < len(mapped):
+        end = mapped.find(b'\n', offset)
+        uid_end = mapped.find(b'\t', offset, end)
+        status_end = mapped.find(b'\t', (uid_end + 1), end)
+        issue_uid = mapped[offset:uid_end].decode('ascii')
+        offset = end + 1
+        if issue_uid in journal:
+            continue
+        summary = None
+        if wanted is None or mapped[(uid_end + 1):status_end] in wanted:
+            summary = json.loads(mapped[(status_end + 1):end])
+        yield (issue_uid, summary)
+    for issue_uid, summary in journal.items():
+        if summary is None:
+            continue
+        if statuses is not None and summary.get('status', '') not in statuses:
+            summary = None
+        yield (issue_uid, summary)
+
+def _all():
+    """Return a dict mapping UIDs of all issues in the index to summaries.
+    """
+    path = issue.util.paths.summary_index_path()
+    def load():
+        journal = issue.index.journal.read(path)
+        mapped = issue.util.mapped.open_mapped(path)
+        try:
+            return dict(_scan(mapped, journal))
+        finally:
+            if mapped is not None:
+                mapped.close()
+    return issue.serve.cached('summary', [path, issue.index.journal.journal_path(path)], load)
+
+def _read(statuses=None):
+    """Return a tuple `(present, summaries)`: set of UIDs in the index, and
+    a dict mapping UIDs of issues with one of `statuses` to summaries.
+
+    The daemon (see issue.serve) keeps all summaries decoded in memory, and
+    filters them; other processes only decode records with wanted statuses.
+    """
+    if issue.serve.serving:
+        summaries = _all()
+        return (set(summaries), dict((k, v) for k, v in summaries.items()
+            if statuses is None or v.get('status', '') in statuses))
+    present, found = set(), {}
+    journal = issue.index.journal.read(issue.util.paths.summary_index_path())
+    mapped = issue.util.mapped.open_mapped(issue.util.paths.summary_index_path())
+    try:
+        for uid, summary in _scan(mapped, journal, statuses):
+            present.add(uid)
+            if summary is not None:
+                found[uid] = summary
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return (present, found)
+
+def read(statuses=None):
+    """Return a dict mapping UIDs to summaries, optionally only of issues
+    with one of given `statuses` (missing status is the empty string).
+    """
+    return _read(statuses)[1]
+
+def get(issue_uids):
+    """Return a dict mapping given UIDs to summaries, looking each one up
+    directly instead of reading the whole index.
+    UIDs missing from the index are left out.
+    """
+    if issue.serve.serving:
+        summaries = _all()
+        return dict((k, summaries[k]) for k in issue_uids if k in summaries)
+    journal = issue.index.journal.read(issue.util.paths.summary_index_path())
+    mapped = issue.util.mapped.open_mapped(issue.util.paths.summary_index_path())
+    summaries = {}
+    try:
+        for issue_uid in issue_uids:
+            if issue_uid in journal:
+                if journal[issue_uid] is not None:
+                    summaries[issue_uid] = journal[issue_uid]
+                continue
+            prefix = '{0}\t'.format(issue_uid).encode('ascii')
+            for record in issue.util.mapped.lines_with_prefix(mapped, prefix):
+                summaries[issue_uid] = _decode(record)
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return summaries
+
+def _fold(journal):
+    records = {}
+    summary_path = issue.util.paths.summary_index_path()
+    if os.path.isfile(summary_path):
+        with open(summary_path, 'rb') as ifstream:
+            for record in ifstream:
+                records[record.split(b'\t', 1)[0].decode('ascii')] = record
+    for issue_uid, summary in journal.items():
+        records.pop(issue_uid, None)
+        if summary is not None:
+            records[issue_uid] = _record(issue_uid, summary)
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    issue.util.atomic.write(summary_path, b''.join(records[k] for k in sorted(records)))
+
+def update(issues):
+    """Store summaries of `issues` (a dict mapping UIDs to issue data, or
+    to None for dropped issues) and return the entries they replaced.
+    Unchanged summaries are not stored again.
+    """
+    summary_path = issue.util.paths.summary_index_path()
+    replaced = get(issues)
+    changed = {}
+    for issue_uid, issue_data in issues.items():
+        replaced.setdefault(issue_uid, None)
+        summary = (None if issue_data is None else summarise(issue_data))
+        if summary != replaced[issue_uid]:
+            changed[issue_uid] = summary
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    if issue.index.journal.append(summary_path, changed):
+        issue.index.journal.compact(summary_path, _fold)
+    return replaced
+
+def load(issue_uids, statuses=None):
+    """Return a tuple `(summaries, not_indexed)` for given issue UIDs,
+    optionally only for issues with one of given `statuses`.
+
+    Issues missing from the summary index are read from their own index once
+    and added to the summary, so the next invocation does not pay for them.
+    Dropped issues are silently left out.
+    """
+    present, found = _read(statuses)
+    wanted = set(issue_uids)
+    found = dict((k, v) for k, v in found.items() if k in wanted)
+    not_indexed = []
+    missing = {}
+    for issue_uid in issue_uids:
+        if issue_uid in present:
+            continue
+        try:
+            missing[issue_uid] = issue.util.issues.getIssue(issue_uid, comments = False)
+        except issue.exceptions.NotIndexed:
+            not_indexed.append(issue_uid)
+        except issue.exceptions.NotAnIssue:
+            pass
+    if missing:
+        issue.index.update(missing)
+        for issue_uid, issue_data in missing.items():
+            summary = summarise(issue_data)
+            if statuses is None or summary.get('status', '') in statuses:
+                found[issue_uid] = summary
+    return (found, not_indexed)
@@ -0,0 +1,119 @@
+"""Inverted tag index of the repository.
+
+One record per tag assigned to an issue, sorted:
+
+    <tag> TAB <uid> NEWLINE
+
+so that issues of a tag are found by bisecting the memory-mapped file.
+Records reflect the current tags of indexed issues.  Added and removed
+records are kept in the journal of the index (see issue.index.journal),
+mapped to true and null.
+"""
+
+import os
+
+import issue
+
+
+def _tags_path():
+    return os.path.join(issue.util.paths.index_path(), 'tags')
+
+def _key(tag, issue_uid):
+    return '{0}\t{1}'.format(tag, issue_uid)
+
+def _record(tag, issue_uid):
+    return '{0}\n'.format(_key(tag, issue_uid)).encode('utf-8')
+
+def _store(records):
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    issue.util.atomic.write(_tags_path(), b''.join(sorted(set(records))))
+
+def rebuild():
+    """Rebuild the index from summaries of all issues.
+    """
+    summaries, _ = issue.index.summary.load(issue.index.uids.ls())
+    _store([_record(t, issue_uid) for issue_uid, summary in summaries.items() for t in summary.get('tags', [])])
+    issue.index.journal.discard(_tags_path())
+
+def _fold(journal):
+    with open(_tags_path(), 'rb') as ifstream:
+        records = [record for record in ifstream if record.rstrip(b'\n').decode('utf-8') not in journal]
+    records.extend('{0}\n'.format(key).encode('utf-8') for key, value in journal.items() if value)
+    _store(records)
+
+def update(issues, replaced):
+    """Replace tag records of `issues` (a dict mapping UIDs to issue data,
+    or to None for dropped issues), given summaries they `replaced` in the
+    summary index.
+    """
+    if not os.path.isfile(_tags_path()):
+        rebuild()
+        return
+    changes = {}
+    for issue_uid, issue_data in issues.items():
+        old_tags = set((replaced.get(issue_uid) or {}).get('tags', []))
+        new_tags = set((issue_data or {}).get('tags', []))
+        changes.update((_key(t, issue_uid), None) for t in old_tags.difference(new_tags))
+        changes.update((_key(t, issue_uid), True) for t in new_tags.difference(old_tags))
+    if issue.index.journal.append(_tags_path(), changes):
+        issue.index.journal.compact(_tags_path(), _fold)
+
+def _mapped():
+    if not os.path.isfile(_tags_path()):
+        rebuild()
+    return (issue.index.journal.read(_tags_path()), issue.util.mapped.open_mapped(_tags_path()))
+
+def issues_of(*tags):
+    """Return set of UIDs of issues tagged with any of given tags.
+    """
+    journal, mapped = _mapped()
+    issue_uids = set()
+    try:
+        for tag in tags:
+            prefix = '{0}\t'.format(tag)
+            for record in issue.util.mapped.lines_with_prefix(mapped, prefix.encode('utf-8')):
+                if record.decode('utf-8') not in journal:
+                    issue_uids.add(record[len(prefix.encode('utf-8')):].decode('ascii'))
+            issue_uids.update(key[len(prefix):] for key, value in journal.items() if value and key.startswith(prefix))
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return issue_uids
+
+def counts():
+    """Return a dict mapping tags used by issues to numbers of issues tagged with them.
+    """
+    journal, mapped = _mapped()
+    tag_counts = {}
+    try:
+        keys = (record.decode('utf-8') for record in issue.util.mapped.lines(mapped))
+        keys = [key for key in keys if key not in journal] + [key for key, value in journal.items() if value]
+        for key in keys:
+            tag = key.rsplit('\t', 1)[0]
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return tag_counts
+
+def known():
+    """Return set of tags that may be used: the created ones, and the ones
+    already assigned to issues.
+    """
+    return set(counts()).union(issue.objects.tags.ls())
+
+def select(issue_uids, tags):
+    """Filter `issue_uids` by tags.
+
+    Issues with any of the positive tags are selected (all of them, if there
+    are only negative tags), and then issues with any of the negative
+    (`^`-prefixed) tags are removed.
+    """
+    positive = [t for t in tags if t[0] != '^']
+    negative = [t[1:] for t in tags if t[0] == '^']
+    selected = set(issue_uids)
+    if positive:
+        selected.intersection_update(issues_of(*positive))
+    elif not negative:
+        return set()
+    return selected.difference(issues_of(*negative))
@@ -0,0 +1,100 @@
+"""Sorted timestamp indexes of the repository.
+
+Open and close times of issues are kept in `index/times.open` and
+`index/times.close`, one record per issue, sorted:
+
+    <timestamp, zero-padded to fixed width> SPACE <uid> NEWLINE
+
+Issues without a timestamp are recorded at 0, which is what `issue ls`
+assumes for them.  Fixed-width timestamps sort the same as numbers do, so a
+time window is found by bisecting the memory-mapped file.  Changed
+timestamps are kept in the journals of the indexes (see
+issue.index.journal), keyed by UID.
+"""
+
+import os
+
+import issue
+
+
+FIELDS = ('open.timestamp', 'close.timestamp',)
+
+_TIMESTAMP_FORMAT = '{0:020.6f}'
+
+
+def _times_path(field):
+    return os.path.join(issue.util.paths.index_path(), 'times.{0}'.format(field.split('.')[0]))
+
+def _key(timestamp):
+    return _TIMESTAMP_FORMAT.format(max(0.0, timestamp)).encode('ascii')
+
+def _record(issue_uid, timestamp):
+    return _key(timestamp) + ' {0}\n'.format(issue_uid).encode('ascii')
+
+def _store(field, records):
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    issue.util.atomic.write(_times_path(field), b''.join(sorted(records)))
+
+def rebuild():
+    """Rebuild the indexes from summaries of all issues.
+    """
+    summaries, _ = issue.index.summary.load(issue.index.uids.ls())
+    for field in FIELDS:
+        _store(field, [_record(issue_uid, summary.get(field, 0)) for issue_uid, summary in summaries.items()])
+        issue.index.journal.discard(_times_path(field))
+
+def _folder(field):
+    def fold(journal):
+        with open(_times_path(field), 'rb') as ifstream:
+            records = [record for record in ifstream if record.rstrip(b'\n').split(b' ', 1)[1].decode('ascii') not in journal]
+        records.extend(_record(issue_uid, timestamp) for issue_uid, timestamp in journal.items() if timestamp is not None)
+        _store(field, records)
+    return fold
+
+def update(issues, replaced):
+    """Replace records of `issues` (a dict mapping UIDs to issue data, or
+    to None for dropped issues) whose timestamps changed, given summaries
+    they `replaced` in the summary index.
+    """
+    if not all(os.path.isfile(_times_path(field)) for field in FIELDS):
+        rebuild()
+        return
+    for field in FIELDS:
+        changes = {}
+        for issue_uid, issue_data in issues.items():
+            timestamp = (None if issue_data is None else issue_data.get(field, 0))
+            old = replaced.get(issue_uid)
+            if old is None or timestamp is None or old.get(field, 0) != timestamp:
+                changes[issue_uid] = timestamp
+        if issue.index.journal.append(_times_path(field), changes):
+            issue.index.journal.compact(_times_path(field), _folder(field))
+
+def between(field, since=None, until=None):
+    """Return set of UIDs of issues with `field` (one of FIELDS) between
+    `since` and `until` (UNIX timestamps, inclusive; None means unbounded).
+    """
+    if not os.path.isfile(_times_path(field)):
+        rebuild()
+    journal = issue.index.journal.read(_times_path(field))
+    mapped = issue.util.mapped.open_mapped(_times_path(field))
+    since_key = (None if since is None else _key(since))
+    until_key = (None if until is None else _key(until))
+    issue_uids = set(issue_uid for issue_uid, timestamp in journal.items() if timestamp is not None
+        and (since_key is None or _key(timestamp) >= since_key)
+        and (until_key is None or _key(timestamp) <= until_key))
+    if mapped is None:
+        return issue_uids
+    try:
+        offset = (0 if since is None else issue.util.mapped.bisect_lines(mapped, since_key))
+        while offset < len(mapped):
+            end = mapped.find(b'\n', offset)
+            timestamp_key, issue_uid = mapped[offset:end].split(b' ', 1)
+            if until_key is not None and timestamp_key > until_key:
+                break
+            issue_uid = issue_uid.decode('ascii')
+            if issue_uid not in journal:
+                issue_uids.add(issue_uid)
+            offset = end + 1
+    finally:
+        mapped.close()
+    return issue_uids
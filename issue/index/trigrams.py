@@ -0,0 +1,156 @@
+"""Trigram index of issue messages.
+
+One record per trigram of lowercased messages, sorted:
+
+    <trigram as JSON> TAB <uid prefix> SPACE <uid prefix> ... NEWLINE
+
+Postings use UID prefixes of PREFIX_LENGTH characters to keep the index
+small.  The index only narrows keyword searches down to candidate issues:
+a message containing a keyword contains all of its trigrams, but not the
+other way around, and prefixes may collide, so candidates must still be
+checked against the full message.
+
+The journal of the index (see issue.index.journal) maps UID prefixes of
+issues whose messages changed to sorted trigrams of all issues with that
+prefix, which replace postings of the prefix in the index.
+"""
+
+import json
+import os
+
+import issue
+
+
+PREFIX_LENGTH = 12
+
+
+def _trigrams_path():
+    return os.path.join(issue.util.paths.index_path(), 'trigrams')
+
+def trigrams(text):
+    text = text.lower()
+    return set(text[i:(i + 3)] for i in range(len(text) - 2))
+
+def _key(trigram):
+    return '{0}\t'.format(json.dumps(trigram)).encode('ascii')
+
+def _store(postings):
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    records = sorted((_key(t) + ' '.join(sorted(prefixes)).encode('ascii') + b'\n')
+        for t, prefixes in postings.items() if prefixes)
+    issue.util.atomic.write(_trigrams_path(), b''.join(records))
+
+def _add(postings, issue_uid, issue_data):
+    for t in trigrams(issue_data.get('message', '')):
+        postings.setdefault(t, set()).add(issue_uid[:PREFIX_LENGTH])
+
+def _read_postings():
+    postings = {}
+    with open(_trigrams_path(), 'rb') as ifstream:
+        for record in ifstream:
+            key, prefixes = record.rstrip(b'\n').split(b'\t', 1)
+            postings[json.loads(key)] = set(prefixes.decode('ascii').split())
+    return postings
+
+def rebuild():
+    """Rebuild the index from messages of all indexed issues.
+    """
+    postings = {}
+    for issue_uid in issue.index.uids.ls():
+        try:
+            _add(postings, issue_uid, issue.util.issues.getIssue(issue_uid, comments = False))
+        except (issue.exceptions.NotIndexed, issue.exceptions.NotAnIssue):
+            pass
+    _store(postings)
+    issue.index.journal.discard(_trigrams_path())
+
+def _fold(journal):
+    postings = _read_postings()
+    for prefixes in postings.values():
+        prefixes.difference_update(journal)
+    for prefix, prefix_trigrams in journal.items():
+        for t in (prefix_trigrams or []):
+            postings.setdefault(t, set()).add(prefix)
+    _store(postings)
+
+def update(issues, replaced):
+    """Replace postings of `issues` (a dict mapping UIDs to issue data, or
+    to None for dropped issues) whose messages changed, given summaries
+    they `replaced` in the summary index.
+    """
+    if not os.path.isfile(_trigrams_path()):
+        rebuild()
+        return
+    changed = set()
+    for issue_uid, issue_data in issues.items():
+        old_digest = (replaced.get(issue_uid) or {}).get('message.digest')
+        if issue_data is None or old_digest is None or \
+                old_digest != issue.index.summary.summarise(issue_data).get('message.digest'):
+            changed.add(issue_uid[:PREFIX_LENGTH])
+    changes = {}
+    for prefix in changed:
+        # Postings are per prefix, so they include issues sharing the prefix.
+        prefix_trigrams = set()
+        for issue_uid in set(issue.index.uids.match(prefix, limit = None)).union(k for k in issues if k.startswith(prefix)):
+            issue_data = issues.get(issue_uid)
+            if issue_uid not in issues:
+                try:
+                    issue_data = issue.util.issues.getIssue(issue_uid, comments = False)
+                except (issue.exceptions.NotIndexed, issue.exceptions.NotAnIssue):
+                    pass
+            if issue_data is not None:
+                prefix_trigrams.update(trigrams(issue_data.get('message', '')))
+        changes[prefix] = sorted(prefix_trigrams)
+    if issue.index.journal.append(_trigrams_path(), changes):
+        issue.index.journal.compact(_trigrams_path(), _fold)
+
+def _containing(mapped, journal, text):
+    """Return set of prefixes of issues whose messages may contain `text`,
+    or None if the index cannot tell (text shorter than a trigram).
+    """
+    prefixes = None
+    for t in trigrams(text):
+        found = set()
+        for record in issue.util.mapped.lines_with_prefix(mapped, _key(t)):
+            found.update(record[len(_key(t)):].decode('ascii').split())
+        found.difference_update(journal)
+        found.update(prefix for prefix, prefix_trigrams in journal.items() if t in prefix_trigrams)
+        prefixes = (found if prefixes is None else prefixes.intersection(found))
+        if not prefixes:
+            break
+    return prefixes
+
+def candidates(issue_uids, keywords):
+    """Return the subset of `issue_uids` that may match `keywords` in
+    `issue ls` with a positive match threshold.
+
+    An issue can only score if it contains at least one keyword (or the text
+    of a '+keyword'), and it is rejected unless it contains the text of every
+    '=keyword'.  Negative keywords cannot narrow the search.
+    """
+    if not os.path.isfile(_trigrams_path()):
+        rebuild()
+    journal = dict((prefix, set(prefix_trigrams or [])) for prefix, prefix_trigrams in issue.index.journal.read(_trigrams_path()).items())
+    mapped = issue.util.mapped.open_mapped(_trigrams_path())
+    if mapped is None and not journal:
+        return set()
+    try:
+        scoring = set()
+        for kw in keywords:
+            found = _containing(mapped, journal, (kw[1:] if kw[0] == '+' else kw))
+            if found is None:
+                scoring = None
+                break
+            scoring.update(found)
+        for kw in keywords:
+            if kw[0] != '=':
+                continue
+            found = _containing(mapped, journal, kw[1:])
+            if found is not None:
+                scoring = (found if scoring is None else scoring.intersection(found))
+    finally:
+        if mapped is not None:
+            mapped.close()
+    if scoring is None:
+        return set(issue_uids)
+    return set(issue_uid for issue_uid in issue_uids if issue_uid[:PREFIX_LENGTH] in scoring)
@@ -0,0 +1,283 @@
+"""Sorted index of issue UIDs.
+
+UIDs are kept in `index/uids`, one per line and sorted, so that a prefix is
+resolved by bisecting the memory-mapped file instead of listing all issue
+directories.  Added and removed UIDs are kept in the journal of the index
+(see issue.index.journal), mapped to true and null.
+
+Length of the shortest unique prefix is one more than the longest common
+prefix of two neighbouring UIDs.  Lengths of common prefixes of neighbours
+in `index/uids` are kept as a histogram in `index/uids.lcp`:
+
+    {"stamp": [<inode>, <size>, <mtime in ns>], "count": <number of UIDs>,
+     "lcp": {"<length>": <number of neighbour pairs>, ...}}
+
+It is written with the index (when it is rebuilt or compacted), not on
+updates: readers adjust it for each UID in the journal, so the count and the
+shortest unique prefix are derived from the journaled set of UIDs, which
+concurrent updates cannot get wrong.  A histogram whose stamp does not match
+the index (e.g. after a crash between writing the two files) is recomputed
+from the index.
+"""
+
+import bisect
+import heapq
+import json
+import mmap
+import os
+
+import issue
+
+
+def _uids_path():
+    return os.path.join(issue.util.paths.index_path(), 'uids')
+
+def _lcp_path():
+    return os.path.join(issue.util.paths.index_path(), 'uids.lcp')
+
+def _common_prefix_length(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+def _histogram(uids):
+    histogram = {}
+    for a, b in zip(uids, uids[1:]):
+        n = _common_prefix_length(a, b)
+        histogram[n] = histogram.get(n, 0) + 1
+    return histogram
+
+def _stamp(stat):
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+def _store_lcp(stamp, uids):
+    issue.util.atomic.write(_lcp_path(), json.dumps({
+        'stamp': stamp,
+        'count': len(uids),
+        'lcp': dict((str(k), v) for k, v in _histogram(uids).items()),
+    }))
+
+def _store(uids):
+    os.makedirs(issue.util.paths.index_path(), exist_ok = True)
+    _store_lcp(_stamp(issue.util.atomic.write(_uids_path(), ''.join('{0}\n'.format(each) for each in uids))), uids)
+
+def rebuild(uids=None):
+    """Rebuild the index from a list of UIDs (by default, from issue directories).
+    Returns the sorted list of UIDs.
+    """
+    uids = sorted(set(issue.util.issues.ls() if uids is None else uids))
+    _store(uids)
+    issue.index.journal.discard(_uids_path())
+    return uids
+
+def _open():
+    """Return a tuple `(stamp, mapping)` of the index file; the mapping is
+    None if the file is empty.  Raises FileNotFoundError if there is no index.
+    """
+    with open(_uids_path(), 'rb') as ifstream:
+        stat = os.fstat(ifstream.fileno())
+        return (_stamp(stat), (mmap.mmap(ifstream.fileno(), 0, access = mmap.ACCESS_READ) if stat.st_size else None))
+
+def _load_lcp(stamp, mapped):
+    """Return a tuple `(count, histogram)` describing UIDs in the mapped
+    index file, recomputing it if the stored one does not match the stamp.
+    """
+    try:
+        with open(_lcp_path()) as ifstream:
+            stored = json.loads(ifstream.read())
+        if stored['stamp'] == stamp:
+            return (stored['count'], dict((int(k), v) for k, v in stored['lcp'].items()))
+    except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+    uids = ([] if mapped is None else mapped[:].decode('ascii').split())
+    _store_lcp(stamp, uids)
+    return (len(uids), _histogram(uids))
+
+def _files():
+    return [_uids_path(), issue.index.journal.journal_path(_uids_path())]
+
+def _added(journal):
+    return sorted(k for k, v in journal.items() if v)
+
+def _merged(base_lines, journal):
+    """Merge sorted UIDs (as bytes) from the index with the journal.
+    """
+    added = _added(journal)
+    kept = (each for each in (line.decode('ascii') for line in base_lines) if each not in journal)
+    return heapq.merge(kept, added)
+
+def ls():
+    """Return sorted list of UIDs of all issues.
+    """
+    if not os.path.isfile(_uids_path()):
+        return rebuild()
+    def load():
+        journal = issue.index.journal.read(_uids_path())
+        with open(_uids_path(), 'rb') as ifstream:
+            return list(_merged(ifstream.read().split(), journal))
+    return list(issue.serve.cached('uids', _files(), load))
+
+def match(prefix, limit=2):
+    """Return sorted list of at most `limit` (or all, if `limit` is None)
+    UIDs starting with `prefix`.
+    """
+    journal = issue.index.journal.read(_uids_path())
+    mapped = issue.util.mapped.open_mapped(_uids_path())
+    if mapped is None:
+        return [uid for uid in rebuild() if uid.startswith(prefix)][:limit]
+    matched = []
+    try:
+        lines = issue.util.mapped.lines_with_prefix(mapped, prefix.encode('ascii'))
+        for each in _merged(lines, dict((k, v) for k, v in journal.items() if k.startswith(prefix))):
+            matched.append(each)
+            if len(matched) == limit:
+                break
+    finally:
+        mapped.close()
+    return matched
+
+def _in_index(mapped, issue_uid):
+    if mapped is None:
+        return False
+    key = issue_uid.encode('ascii')
+    offset = issue.util.mapped.bisect_lines(mapped, key)
+    return mapped[offset:(offset + len(key) + 1)] == (key + b'\n')
+
+def present(issue_uids):
+    """Return the subset of `issue_uids` that are in the index, looking each
+    one up directly.
+    """
+    journal = issue.index.journal.read(_uids_path())
+    mapped = issue.util.mapped.open_mapped(_uids_path())
+    if mapped is None and not journal:
+        return set(rebuild()).intersection(issue_uids)
+    found = set()
+    try:
+        for issue_uid in issue_uids:
+            if (journal[issue_uid] if issue_uid in journal else _in_index(mapped, issue_uid)):
+                found.add(issue_uid)
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return found
+
+def _neighbours(mapped, journal, added, issue_uid):
+    """Return UIDs just before and just after `issue_uid` (None at the ends)
+    among UIDs in the index with `journal` applied, not counting `issue_uid`.
+    `added` is the sorted list of UIDs the journal adds.
+    """
+    before, after = None, None
+    if mapped is not None:
+        key = issue_uid.encode('ascii')
+        offset = issue.util.mapped.bisect_lines(mapped, key)
+        # Forwards from the first line not lesser than the UID...
+        forward = offset
+        while forward < len(mapped):
+            end = mapped.find(b'\n', forward)
+            line = mapped[forward:end].decode('ascii')
+            forward = end + 1
+            if line != issue_uid and line not in journal:
+                after = line
+                break
+        # ...and backwards from the line before it.
+        backward = offset - 1
+        while backward > 0:
+            begin = mapped.rfind(b'\n', 0, backward) + 1
+            line = mapped[begin:backward].decode('ascii')
+            backward = begin - 1
+            if line not in journal:
+                before = line
+                break
+    i = bisect.bisect_left(added, issue_uid)
+    if i > 0 and (before is None or added[i - 1] > before):
+        before = added[i - 1]
+    j = bisect.bisect_right(added, issue_uid)
+    if j < len(added) and (after is None or added[j] < after):
+        after = added[j]
+    return (before, after)
+
+def _load():
+    """Return a tuple `(count, histogram)` describing UIDs in the index with
+    its journal applied.  Each UID the journal changes is inserted into (or
+    removed from) the histogram of the index file, in the order of UIDs.
+    """
+    # The journal is read first: entries folded into the index meanwhile are
+    # applied harmlessly, as the index already holds them.
+    journal = issue.index.journal.read(_uids_path())
+    try:
+        stamp, mapped = _open()
+    except FileNotFoundError:
+        rebuild()
+        stamp, mapped = _open()
+
+    def adjust(a, b, delta):
+        n = _common_prefix_length(a, b)
+        histogram[n] = histogram.get(n, 0) + delta
+
+    applied = {}
+    added = []
+    try:
+        n, histogram = _load_lcp(stamp, mapped)
+        for uid in sorted(journal):
+            inserted = bool(journal[uid])
+            if _in_index(mapped, uid) != inserted:
+                before, after = _neighbours(mapped, applied, added, uid)
+                sign = (1 if inserted else -1)
+                if before is not None and after is not None:
+                    adjust(before, after, -sign)
+                if before is not None:
+                    adjust(before, uid, sign)
+                if after is not None:
+                    adjust(uid, after, sign)
+                n += sign
+            applied[uid] = journal[uid]
+            if inserted:
+                added.append(uid)
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return (n, histogram)
+
+def _loaded():
+    return issue.serve.cached('uids.lcp', _files(), _load)
+
+def count():
+    """Return number of issues in the index.
+    """
+    return _loaded()[0]
+
+def shortest_unique_prefix():
+    """Return length of the shortest prefix that identifies every issue.
+    """
+    n, histogram = _loaded()
+    if n < 2:
+        return n
+    return max(k for k, v in histogram.items() if v) + 1
+
+def _fold(journal):
+    with open(_uids_path(), 'rb') as ifstream:
+        uids = list(_merged(ifstream.read().split(), journal))
+    _store(uids)
+
+def update(added=(), removed=()):
+    """Insert `added` UIDs into the index and remove `removed` ones from it.
+    """
+    if not os.path.isfile(_uids_path()):
+        rebuild()
+        return
+    journal = issue.index.journal.read(_uids_path())
+    changes = {}
+    mapped = issue.util.mapped.open_mapped(_uids_path())
+    try:
+        for uid, inserted in ([(each, False) for each in set(removed)] + [(each, True) for each in set(added)]):
+            is_present = (journal[uid] if uid in journal else _in_index(mapped, uid))
+            if bool(is_present) != inserted:
+                changes[uid] = (True if inserted else None)
+    finally:
+        if mapped is not None:
+            mapped.close()
+    if issue.index.journal.append(_uids_path(), changes):
+        issue.index.journal.compact(_uids_path(), _fold)
@@ -1 +1,7 @@
-from . import tags
+import issue
+
+__getattr__ = issue.util.misc.lazy_submodules(__name__, (
+    'encoding',
+    'store',
+    'tags',
+))
@@ -0,0 +1,137 @@
+"""On-disk encoding of difference lists.
+
+Differences are stored as JSON.  Earlier versions could also write them in a
+binary form ("objects.encoding" set to "binary"), which repositories may still
+hold, in loose ".bin" files or in packs:
+
+    magic       4 bytes     b'ISD\\x01'
+    count       u32         number of records
+    records     count * 12  fixed-width records: action code (u8), flags (u8),
+                            author index (u16), timestamp (f64, or i64 if
+                            the timestamp was an integer)
+    length      u32         length of the payload
+    payload     length      JSON object: {"authors": [[email, name], ...], "rest": [{...}, ...]}
+
+Such diffs are still decoded (readers detect the encoding by the magic, not by
+the file name), and "issue gc --repack" rewrites them as JSON.  The binary
+form is no longer written: it saved space, but decoding it was slower than
+decoding JSON.
+"""
+
+import json
+import struct
+
+import issue
+
+
+# Suffixes of loose diff files, in the order they are looked for.
+SUFFIXES = ('.json', '.bin',)
+
+MAGIC = b'ISD\x01'
+
+# Actions by their codes in binary records.
+ACTIONS = (
+    'open',
+    'close',
+    'set-message',
+    'push-tags',
+    'remove-tags',
+    'push-labels',
+    'remove-labels',
+    'parameter-set',
+    'parameter-remove',
+    'push-milestones',
+    'set-status',
+    'set-project-tag',
+    'set-project-name',
+    'chain-attach',
+    'chain-link',
+    'chain-unlink',
+    'set-parent',
+    'tag-open',
+    'tag-set-project-name',
+    'open-issue',
+    'close-issue',
+)
+ACTION_LITERAL = 0xff
+
+AUTHOR_NONE = 0xffff
+AUTHOR_KEYS = ('author.email', 'author.name',)
+
+FLAG_TIMESTAMP = 0x01
+FLAG_TIMESTAMP_INTEGER = 0x02
+
+_COUNT = struct.Struct('>I')
+_RECORD = struct.Struct('>BBH8s')
+_FLOAT = struct.Struct('>d')
+_INTEGER = struct.Struct('>q')
+
+
+def _decode_binary(contents):
+    count, = _COUNT.unpack_from(contents, len(MAGIC))
+    records_begin = len(MAGIC) + _COUNT.size
+    records_end = records_begin + (count * _RECORD.size)
+    payload_length, = _COUNT.unpack_from(contents, records_end)
+    payload = contents[(records_end + _COUNT.size):]
+    if len(payload) != payload_length:
+        raise ValueError('truncated payload: expected {} bytes, got {}'.format(payload_length, len(payload)))
+    payload = json.loads(payload)
+    records = list(_RECORD.iter_unpack(contents[records_begin:records_end]))
+    if len(records) != len(payload['rest']):
+        raise ValueError('{} record(s) but {} payload object(s)'.format(len(records), len(payload['rest'])))
+
+    authors = [dict(zip(AUTHOR_KEYS, each)) for each in payload['authors']]
+    differences = []
+    for (code, flags, author_index, timestamp), d in zip(records, payload['rest']):
+        d = dict(d)
+        if code != ACTION_LITERAL:
+            d['action'] = ACTIONS[code]
+        if author_index != AUTHOR_NONE:
+            d['author'] = dict(authors[author_index])
+        if flags & FLAG_TIMESTAMP:
+            d['timestamp'] = (_INTEGER if (flags & FLAG_TIMESTAMP_INTEGER) else _FLOAT).unpack(timestamp)[0]
+        differences.append(d)
+    return differences
+
+def decode_binary(contents):
+    """Decode differences in the binary encoding.
+    Raises ValueError for malformed contents, whatever is wrong with them.
+    """
+    try:
+        return _decode_binary(contents)
+    except ValueError:
+        raise
+    except (struct.error, LookupError, TypeError, AttributeError) as e:
+        raise ValueError('malformed binary diff: {}: {}'.format(type(e).__name__, e))
+
+def encode(differences):
+    return json.dumps(differences).encode('utf-8')
+
+def decode(contents):
+    """Decode a list of differences stored in any of the supported encodings.
+    Raises ValueError for malformed contents.
+    """
+    if contents[:len(MAGIC)] == MAGIC:
+        return decode_binary(contents)
+    return json.loads(contents)
+
+def as_json(contents):
+    """Return contents of a diff object encoded as JSON.
+    Raises ValueError for malformed contents.
+    """
+    if contents[:len(MAGIC)] == MAGIC:
+        return encode(decode_binary(contents))
+    return contents
+
+def write(path, differences, deferred=False):
+    """Write differences to `path` with the ".json" suffix appended (see
+    issue.util.atomic.write() for `deferred`).  Returns path of the written
+    file.
+    """
+    path = '{0}.json'.format(path)
+    issue.util.atomic.write(path, encode(differences), deferred = deferred)
+    return path
+
+def read(path):
+    with open(path, 'rb') as ifstream:
+        return decode(ifstream.read())
@@ -0,0 +1,212 @@
+"""Storage of issue objects (diffs and comments).
+
+Objects are either loose (one file per object, e.g. `objects/issues/XX/<uid>/diff/<id>.json`),
+or rolled into append-only packs by `issue gc`.  A pack is a pair of files in `objects/packs/`:
+
+- `<name>.pack` containing raw contents of objects, concatenated,
+- `<name>.idx` with one `<issue-uid> <kind> <object-id> <offset> <length>` line per object,
+  sorted, so that objects of a single issue are stored next to each other,
+
+Readers should go through this module and never assume an object is stored loose.
+"""
+
+import os
+
+import issue
+
+
+KIND_DIFF = 'diff'
+KIND_COMMENT = 'comments'
+KINDS = (KIND_DIFF, KIND_COMMENT,)
+
+PACK_SUFFIX = '.pack'
+INDEX_SUFFIX = '.idx'
+
+_mapped_packs = {}
+
+
+def _loose_dir(issue_uid, kind):
+    if kind == KIND_DIFF:
+        return issue.util.paths.diffs_path_of(issue_uid)
+    return issue.util.paths.comments_path_of(issue_uid)
+
+def _loose_files(issue_uid, kind):
+    loose_dir = _loose_dir(issue_uid, kind)
+    if not os.path.isdir(loose_dir):
+        return {}
+    return dict((p.split('.')[0], os.path.join(loose_dir, p)) for p in issue.util.atomic.listdir(loose_dir))
+
+def _ls_loose(issue_uid, kind):
+    return list(_loose_files(issue_uid, kind))
+
+def _read_loose(issue_uid, kind, object_id):
+    loose_path = os.path.join(_loose_dir(issue_uid, kind), object_id)
+    for suffix in issue.objects.encoding.SUFFIXES:
+        try:
+            with open(issue.util.atomic.resolve(loose_path + suffix), 'rb') as ifstream:
+                return ifstream.read()
+        except FileNotFoundError:
+            pass
+    raise FileNotFoundError(loose_path)
+
+def ls_packs():
+    packs_path = issue.util.paths.packs_path()
+    if not os.path.isdir(packs_path):
+        return []
+    return sorted(p[:-len(INDEX_SUFFIX)] for p in os.listdir(packs_path) if p.endswith(INDEX_SUFFIX))
+
+def _pack_file_path(pack_name, suffix):
+    return os.path.join(issue.util.paths.packs_path(), '{0}{1}'.format(pack_name, suffix))
+
+def _mapped(pack_name):
+    if pack_name not in _mapped_packs:
+        _mapped_packs[pack_name] = (
+            issue.util.mapped.open_mapped(_pack_file_path(pack_name, INDEX_SUFFIX)),
+            issue.util.mapped.open_mapped(_pack_file_path(pack_name, PACK_SUFFIX)),
+        )
+    return _mapped_packs[pack_name]
+
+def _parse_index_line(line):
+    issue_uid, kind, object_id, offset, length = line.decode('ascii').split()
+    return (issue_uid, kind, object_id, int(offset), int(length))
+
+def _packed(issue_uid, kind):
+    """Return a dict mapping IDs of packed objects of an issue to their
+    locations, i.e. `(pack_name, offset, length)` tuples.
+    Later packs take precedence over earlier ones.
+    """
+    packed = {}
+    prefix = '{0} {1} '.format(issue_uid, kind).encode('ascii')
+    for pack_name in ls_packs():
+        mapped_index, _ = _mapped(pack_name)
+        for line in issue.util.mapped.lines_with_prefix(mapped_index, prefix):
+            _, _, object_id, offset, length = _parse_index_line(line)
+            packed[object_id] = (pack_name, offset, length)
+    return packed
+
+def _all_packed():
+    for pack_name in ls_packs():
+        mapped_index, _ = _mapped(pack_name)
+        for line in issue.util.mapped.lines(mapped_index):
+            yield (pack_name,) + _parse_index_line(line)
+
+def invalidate():
+    for each in _mapped_packs.values():
+        for mapped in each:
+            if mapped is not None:
+                mapped.close()
+    _mapped_packs.clear()
+
+def ls(issue_uid, kind):
+    return sorted(set(_ls_loose(issue_uid, kind)).union(_packed(issue_uid, kind)))
+
+def read(issue_uid, kind, *object_ids):
+    """Return raw contents (bytes) of objects, in the order of `object_ids`.
+
+    Packs are memory-mapped and only the bytes of requested objects are
+    copied out of them.  Raises FileNotFoundError for unknown objects.
+    """
+    contents = []
+    packed = (_packed(issue_uid, kind) if object_ids else {})
+    for object_id in object_ids:
+        if object_id in packed:
+            pack_name, offset, length = packed[object_id]
+            _, mapped_pack = _mapped(pack_name)
+            contents.append(mapped_pack[offset:(offset + length)])
+            continue
+        contents.append(_read_loose(issue_uid, kind, object_id))
+    return contents
+
+def write_diff(issue_uid, diff_uid, differences):
+    """Write a loose diff object.  It is renamed into place when the group
+    commits (see issue.util.atomic).
+    """
+    return issue.objects.encoding.write(os.path.join(_loose_dir(issue_uid, KIND_DIFF), diff_uid), differences, deferred = True)
+
+def transfer_path(issue_uid, kind, object_id):
+    """Return path of a loose JSON file holding the object, for tools that
+    need one (e.g. scp).  Packed and binary-encoded objects are extracted to
+    the tmp/ directory as JSON, which is the only encoding sent to remotes.
+    """
+    loose_path = issue.util.atomic.resolve(os.path.join(_loose_dir(issue_uid, kind), '{0}.json'.format(object_id)))
+    if os.path.isfile(loose_path):
+        return loose_path
+    contents = read(issue_uid, kind, object_id)[0]
+    if kind == KIND_DIFF:
+        contents = issue.objects.encoding.as_json(contents)
+    extracted_path = os.path.join(issue.util.paths.tmp_path(), '{0}.json'.format(object_id))
+    issue.util.atomic.write(extracted_path, contents)
+    return extracted_path
+
+def _write_pack(objects):
+    pack_name = 'pack-{0}'.format(issue.util.misc.create_hash(
+        ''.join('{0}{1}{2}'.format(*each[:3]) for each in objects))[:40])
+    os.makedirs(issue.util.paths.packs_path(), exist_ok = True)
+
+    index_lines = []
+    offset = 0
+    for issue_uid, kind, object_id, contents in objects:
+        index_lines.append('{0} {1} {2} {3} {4}\n'.format(issue_uid, kind, object_id, offset, len(contents)))
+        offset += len(contents)
+
+    # The index is written last: a pack without an index is invisible.
+    issue.util.atomic.write(_pack_file_path(pack_name, PACK_SUFFIX), b''.join(each[3] for each in objects))
+    issue.util.atomic.write(_pack_file_path(pack_name, INDEX_SUFFIX), ''.join(index_lines))
+    return pack_name
+
+def gc(repack=False):
+    """Roll loose objects into a new pack.
+
+    With `repack`, objects from existing packs are rolled into the new pack too
+    (leaving out objects of dropped issues) and the old packs are removed.
+    Diffs rolled into the new pack are stored as JSON, so binary diffs
+    written by earlier versions are converted.
+    Returns a tuple `(pack_name, number_of_objects)`; pack name is None when
+    there was nothing to pack.
+
+    Raises ExchangeRepository in an exchange repository, as remotes fetch
+    its objects as loose JSON files.
+    """
+    if issue.repository.status() == 'exchange':
+        raise issue.exceptions.ExchangeRepository(issue.util.paths.get_repository_path())
+    # Objects written earlier in the group are packed from their places.
+    issue.util.atomic.commit()
+    existing_issues = set(issue.util.issues.ls())
+    objects = []
+    loose_paths = []
+    for issue_uid in sorted(existing_issues):
+        for kind in KINDS:
+            for object_id, loose_path in sorted(_loose_files(issue_uid, kind).items()):
+                with open(loose_path, 'rb') as ifstream:
+                    objects.append((issue_uid, kind, object_id, ifstream.read()))
+                loose_paths.append(loose_path)
+
+    old_packs = []
+    if repack:
+        old_packs = ls_packs()
+        seen = set(each[:3] for each in objects)
+        for pack_name, issue_uid, kind, object_id, offset, length in _all_packed():
+            if issue_uid not in existing_issues or (issue_uid, kind, object_id) in seen:
+                continue
+            seen.add((issue_uid, kind, object_id))
+            _, mapped_pack = _mapped(pack_name)
+            objects.append((issue_uid, kind, object_id, mapped_pack[offset:(offset + length)]))
+
+    objects = [(issue_uid, kind, object_id, (issue.objects.encoding.as_json(contents) if kind == KIND_DIFF else contents))
+        for issue_uid, kind, object_id, contents in objects]
+
+    invalidate()
+    pack_name = None
+    if objects:
+        objects.sort(key = lambda each: each[:3])
+        pack_name = _write_pack(objects)
+        # Objects must not be removed before the pack holding them is durable.
+        issue.util.atomic.commit()
+    for each in loose_paths:
+        os.unlink(each)
+    for each in old_packs:
+        if each == pack_name:
+            continue
+        os.unlink(_pack_file_path(each, INDEX_SUFFIX))
+        os.unlink(_pack_file_path(each, PACK_SUFFIX))
+    return (pack_name, len(objects))
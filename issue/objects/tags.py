@@ -1,4 +1,3 @@
-import json
 import os
 import random
 import shutil
@@ -10,35 +9,23 @@ def ls():
     return os.listdir(issue.util.paths.tags_path())
 
 def gather():
-    available_tags = []
-    tag_to_issue_map = {}
-    for issue_sha1 in sorted(issue.util.issues.ls()):
-        issue_differences = issue.util.issues.getIssueDifferences(
-            issue_sha1,
-            *issue.util.issues.listIssueDifferences(issue_sha1),
-        )
-        for diff in issue_differences[::-1]:
-            if diff['action'] == 'push-tags':
-                available_tags.extend(diff['params']['tags'])
-                for t in diff['params']['tags']:
-                    if t not in tag_to_issue_map:
-                        tag_to_issue_map[t] = []
-                    tag_to_issue_map[t].append(issue_sha1)
-    for t in ls():
-        available_tags.append(t)
-        if t not in tag_to_issue_map:
-            tag_to_issue_map[t] = []
-    return (available_tags, tag_to_issue_map)
+    """Return a tuple `(available_tags, tag_to_issue_map)`, answered from the
+    inverted tag index.
+    """
+    tag_to_issue_map = dict((t, []) for t in issue.index.tags.known())
+    for t in tag_to_issue_map:
+        tag_to_issue_map[t] = sorted(issue.index.tags.issues_of(t))
+    return (sorted(tag_to_issue_map), tag_to_issue_map)
 
 def make(tag_name: str, force: bool = False):
     tag_path = os.path.join(issue.util.paths.tags_path(), tag_name)
     if os.path.isdir(tag_path) and force:
+        issue.util.atomic.discard(tag_path)
         shutil.rmtree(tag_path)
     if os.path.isdir(tag_path):
         raise issue.exceptions.TagExists(tag_name)
 
-    os.mkdir(tag_path)
-    os.mkdir(os.path.join(tag_path, 'diff'))
+    issue.util.atomic.makedirs(os.path.join(tag_path, 'diff'))
 
     repo_config = issue.config.getConfig()
 
@@ -76,8 +63,6 @@ def make(tag_name: str, force: bool = False):
         random.random(),
     )
     tag_diff_sha1 = issue.util.misc.create_hash(tag_diff_sha1)
-    tag_diff_file_path = os.path.join(tag_path, 'diff', '{0}.json'.format(tag_diff_sha1))
-    with open(tag_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(tag_differences))
+    issue.objects.encoding.write(os.path.join(tag_path, 'diff', tag_diff_sha1), tag_differences)
 
     return tag_name
@@ -0,0 +1,72 @@
+import os
+import random
+
+import issue
+
+
+def get_release_path(release_name):
+    return os.path.join(issue.util.paths.releases_path(), 'r', release_name)
+
+def release_name_exists(release_name):
+    return os.path.isdir(get_release_path(release_name))
+
+def get_release_notes_path(release_name):
+    return os.path.join(get_release_path(release_name), 'notes')
+
+def store_next_release_pointer(release_name):
+    issue.util.atomic.write(os.path.join(issue.util.paths.releases_path(), 'next'), release_name)
+
+def get_next_release_pointer():
+    next_relese_pointer_path = os.path.join(issue.util.paths.releases_path(), 'next')
+    if not os.path.isfile(next_relese_pointer_path):
+        return ''
+    with open(next_relese_pointer_path) as ifstream:
+        return ifstream.read().strip()
+
+def _store_release_diff_simple_named_action(release_name, action_name):
+    repo_config = issue.config.getConfig()
+    release_differences = [
+        {
+            'action': action_name,
+            'author': {
+                'author.email': repo_config['author.email'],
+                'author.name': repo_config['author.name'],
+            },
+            'timestamp': issue.util.misc.timestamp(),
+        },
+    ]
+    release_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], issue.util.misc.timestamp(), random.random())
+    release_diff_sha1 = issue.util.misc.create_hash(release_diff_sha1)
+    issue.objects.encoding.write(os.path.join(get_release_path(release_name), 'diff', release_diff_sha1), release_differences)
+
+def store_release_diff_open(release_name):
+    _store_release_diff_simple_named_action(release_name, 'open')
+
+def store_release_diff_close(release_name):
+    _store_release_diff_simple_named_action(release_name, 'close')
+
+def store_release_diff(release_name, action, params=None):
+    repo_config = issue.config.getConfig()
+    release_differences = [
+        {
+            'action': action,
+            'author': {
+                'author.email': repo_config['author.email'],
+                'author.name': repo_config['author.name'],
+            },
+            'timestamp': issue.util.misc.timestamp(),
+        },
+    ]
+    if params is not None:
+        release_differences[0]['params'] = params
+    release_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], issue.util.misc.timestamp(), random.random())
+    release_diff_sha1 = issue.util.misc.create_hash(release_diff_sha1)
+    issue.objects.encoding.write(os.path.join(get_release_path(release_name), 'diff', release_diff_sha1), release_differences)
+
+def get_release_diffs(release_name):
+    release_diff_path = os.path.join(get_release_path(release_name), 'diff')
+    release_diff_files = os.listdir(release_diff_path)
+    release_diffs = []
+    for p in release_diff_files:
+        release_diffs.extend(issue.objects.encoding.read(os.path.join(release_diff_path, p)))
+    return release_diffs
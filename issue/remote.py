@@ -0,0 +1,286 @@
+import json
+import os
+import subprocess
+
+import issue
+
+
+def getRemotes():
+    remotes = {}
+    remotes_path = os.path.join(issue.util.paths.get_repository_path(), 'remotes.json')
+    if os.path.isfile(remotes_path):
+        with open(remotes_path) as ifstream:
+            remotes = json.loads(ifstream.read())
+    return remotes
+
+def saveRemotes(remotes):
+    remotes_path = os.path.join(issue.util.paths.get_repository_path(), 'remotes.json')
+    issue.util.atomic.write(remotes_path, json.dumps(remotes))
+
+def getPack():
+    pack_data = {
+        'issues': [],
+        'comments': {},
+        'diffs': {},
+    }
+
+    pack_issue_list = issue.util.issues.ls()
+    pack_data['issues'] = pack_issue_list
+
+    pack_comments = {}
+    for p in pack_issue_list:
+        pack_comments[p] = issue.objects.store.ls(p, issue.objects.store.KIND_COMMENT)
+    pack_data['comments'] = pack_comments
+
+    pack_diffs = {}
+    for p in pack_issue_list:
+        pack_diffs[p] = issue.objects.store.ls(p, issue.objects.store.KIND_DIFF)
+    pack_data['diffs'] = pack_diffs
+
+    return pack_data
+
+def savePack(pack_data=None):
+    if pack_data is None:
+        pack_data = getPack()
+    issue.util.atomic.write(issue.util.paths.pack_path(), json.dumps(pack_data))
+
+def runShell(*command):
+    p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, error = p.communicate()
+    output = output.decode('utf-8').strip()
+    error = error.decode('utf-8').strip()
+    exit_code = p.wait()
+    return (exit_code, output, error)
+
+def fetchRemote(remote_name, remote_data=None, local_pack=None, probe=False, verbose=False):
+    """Fetch objects from a remote (only report what would be fetched if
+    `probe` is true).
+
+    Returns set of UIDs of issues which received new differences.
+    """
+    if remote_data is None:
+        remote_data = getRemotes()[remote_name]
+    if local_pack is None:
+        local_pack = getPack()
+    remote_pack_fetch_command = ('scp', '{0}/pack.json'.format(remote_data['url']),
+            issue.util.paths.remote_pack_path())
+    exit_code, output, error = runShell(*remote_pack_fetch_command)
+
+    if exit_code:
+        print('  * fail ({0}): {1}'.format(exit_code, error))
+        return set()
+
+    remote_pack = {}
+    with open(issue.util.paths.remote_pack_path()) as ifstream:
+        remote_pack = json.loads(ifstream.read())
+
+    new_issues = set(remote_pack['issues']) - set(local_pack['issues'])
+    # print(new_issues)
+
+    new_comments = {}
+    for k, v in remote_pack['comments'].items():
+        if k in local_pack['comments']:
+            new_comments[k] = set(remote_pack['comments'][k]) - set(local_pack['comments'][k])
+        else:
+            new_comments[k] = remote_pack['comments'][k]
+    # print(new_comments)
+
+    new_diffs = {}
+    for k, v in remote_pack.get('diffs', {}).items():
+        if k in local_pack['diffs']:
+            new_diffs[k] = set(remote_pack['diffs'][k]) - set(local_pack['diffs'][k])
+        else:
+            new_diffs[k] = remote_pack['diffs'][k]
+    # print(new_diffs)
+
+    print('  * issues:   {0} object(s)'.format(len(new_issues)))
+    print('  * comments: {0} object(s)'.format(sum([len(new_comments[k]) for k in new_comments])))
+    print('  * diffs:    {0} object(s)'.format(sum([len(new_diffs[k]) for k in new_diffs])))
+
+    if probe:
+        return set()
+
+    for issue_sha1 in new_issues:
+        issue_group_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2])
+        if not os.path.isdir(issue_group_path):
+            os.mkdir(issue_group_path)
+        # make directories for issue-specific objects
+        os.mkdir(os.path.join(issue_group_path, issue_sha1))
+        os.mkdir(os.path.join(issue_group_path, issue_sha1, 'comments'))
+        os.mkdir(os.path.join(issue_group_path, issue_sha1, 'diff'))
+    issue.index.uids.update(added = new_issues)
+
+    for issue_sha1 in new_comments:
+        if not new_comments[issue_sha1]:
+            continue
+
+        for cmt_sha1 in new_comments[issue_sha1]:
+            exit_code, output, error = runShell(
+                'scp',
+                '{0}/objects/issues/{1}/{2}/comments/{3}.json'.format(
+                    remote_data['url'],
+                    issue_sha1[:2],
+                    issue_sha1,
+                    cmt_sha1,
+                ),
+                os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'comments', '{0}.json'.format(cmt_sha1))
+            )
+
+            if exit_code:
+                print('  * fail ({0}): comment {1}.{2}: {3}'.format(exit_code, issue_sha1, cmt_sha1, error))
+                continue
+
+    for issue_sha1 in new_diffs:
+        if not new_diffs[issue_sha1]:
+            continue
+
+        if verbose:
+            print(' -> fetching issue: {0}'.format(issue_sha1))
+
+        total_diffs = len(new_diffs[issue_sha1])
+        for i, cmt_sha1 in enumerate(new_diffs[issue_sha1]):
+            if verbose:
+                print('    + diff: {0}: {1}/{2}'.format(cmt_sha1, (i+1), total_diffs))
+            exit_code, output, error = runShell(
+                'scp',
+                '{0}/objects/issues/{1}/{2}/diff/{3}.json'.format(
+                    remote_data['url'],
+                    issue_sha1[:2],
+                    issue_sha1,
+                    cmt_sha1,
+                ),
+                os.path.join(issue.util.paths.issues_path(), issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(cmt_sha1))
+            )
+
+            if exit_code:
+                print('  * fail ({0}): diff {1}.{2}: {3}'.format(exit_code, issue_sha1, cmt_sha1, error))
+                continue
+
+    return set(k for k, v in new_diffs.items() if v)
+
+def publishToRemote(remote_name, remote_data=None, local_pack=None, republish=False, verbose=False):
+    if remote_data is None:
+        remote_data = getRemotes()[remote_name]
+    if local_pack is None:
+        local_pack = getPack()
+
+    remote_status = remote_data.get('status', 'unknown')
+    if remote_status != 'exchange':
+        print('cannot publish to "{0}": invalid remote status: {1}'.format(remote_name, remote_status))
+        if verbose:
+            if remote_status == 'endpoint':
+                print('note: create a shared exchange from which "{0}" endpoint can fetch objects'.format(remote_name))
+            elif remote_status == 'unknown':
+                print('note: run "issue fetch --status {0}" to obtain status of this node'.format(remote_name))
+            else:
+                print('note: broken status, run "issue fetch --status {0}" to fix it'.format(remote_name))
+        return 1
+    print('publishing objects to remote: {0}'.format(remote_name))
+
+    remote_pack = {'issues': [], 'comments': {}}
+
+    if not republish:
+        remote_pack_fetch_command = ('scp', '{0}/pack.json'.format(remote_data['url']), issue.util.paths.remote_pack_path())
+        exit_code, output, error = runShell(*remote_pack_fetch_command)
+
+        if exit_code == 0:
+            with open(issue.util.paths.remote_pack_path()) as ifstream:
+                remote_pack = json.loads(ifstream.read())
+
+    new_issues = set(local_pack['issues']) - set(remote_pack['issues'])
+    # print(new_issues)
+
+    new_comments = {}
+    for k, v in local_pack['comments'].items():
+        if k in remote_pack.get('comments', []):
+            new_comments[k] = set(local_pack['comments'][k]) - set(remote_pack.get('comments', {}).get(k, []))
+        else:
+            new_comments[k] = local_pack['comments'][k]
+    # print(new_comments)
+
+    new_diffs = {}
+    for k, v in local_pack['diffs'].items():
+        if k in remote_pack.get('diffs', {}):
+            new_diffs[k] = set(local_pack['diffs'][k]) - set(remote_pack.get('diffs', {}).get(k, []))
+        else:
+            new_diffs[k] = local_pack['diffs'][k]
+    # print(new_diffs)
+
+    print('  * publishing issues:   {0} object(s)'.format(len(new_issues)))
+    print('  * publishing comments: {0} object(s)'.format(sum([len(new_comments[k]) for k in new_comments])))
+    print('  * publishing diffs:    {0} object(s)'.format(sum([len(new_diffs[k]) for k in new_diffs])))
+
+    for issue_sha1 in new_issues:
+        print(' -> publishing issue: {0}'.format(issue_sha1))
+        issue_group_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2])
+
+        required_directories = [
+            os.path.join('objects', 'issues', issue_sha1[:2]),
+            os.path.join('objects', 'issues', issue_sha1[:2], issue_sha1),
+            os.path.join('objects', 'issues', issue_sha1[:2], issue_sha1, 'comments'),
+            os.path.join('objects', 'issues', issue_sha1[:2], issue_sha1, 'diff'),
+        ]
+
+        remote_repository_host, remote_repository_path = remote_data['url'].split(':')
+        required_directories = [os.path.join(remote_repository_path, rd) for rd in required_directories]
+        remote_mkdir_command = 'mkdir -p {0}'.format(' '.join(required_directories))
+
+        exit_code, output, error = runShell(
+            'ssh',
+            remote_repository_host,
+            remote_mkdir_command,
+        )
+
+        if exit_code:
+            print('  * fail ({0}): cannot create required directories: {1}'.format(exit_code, error))
+            continue
+
+    for issue_sha1 in new_comments:
+        if not new_comments[issue_sha1]:
+            continue
+
+        for cmt_sha1 in new_comments[issue_sha1]:
+            exit_code, output, error = runShell(
+                'scp',
+                issue.objects.store.transfer_path(issue_sha1, issue.objects.store.KIND_COMMENT, cmt_sha1),
+                '{0}/objects/issues/{1}/{2}/comments/{3}.json'.format(
+                    remote_data['url'],
+                    issue_sha1[:2],
+                    issue_sha1,
+                    cmt_sha1,
+                )
+            )
+
+            if exit_code:
+                print('  * fail ({0}): comment {1}.{2}: {3}'.format(exit_code, issue_sha1, cmt_sha1, error))
+                continue
+
+    for issue_sha1 in new_diffs:
+        if not new_diffs[issue_sha1]:
+            continue
+
+        total_diffs = len(new_diffs[issue_sha1])
+        for i, diff_sha1 in enumerate(new_diffs[issue_sha1]):
+            if verbose:
+                print('    + diff: {0}: {1}/{2}'.format(diff_sha1, (i+1), total_diffs))
+            exit_code, output, error = runShell(
+                'scp',
+                issue.objects.store.transfer_path(issue_sha1, issue.objects.store.KIND_DIFF, diff_sha1),
+                '{0}/objects/issues/{1}/{2}/diff/{3}.json'.format(
+                    remote_data['url'],
+                    issue_sha1[:2],
+                    issue_sha1,
+                    diff_sha1,
+                )
+            )
+
+            if exit_code:
+                print('  * fail ({0}): diff {1}.{2}: {3}'.format(exit_code, issue_sha1, diff_sha1, error))
+                continue
+
+    remote_pack_publish_command = ('scp', os.path.join(issue.util.paths.pack_path()), '{0}/pack.json'.format(remote_data['url']))
+    exit_code, output, error = runShell(*remote_pack_publish_command)
+
+    if exit_code:
+        print('  * fail ({0}): failed to send pack: {1}'.format(exit_code, error))
+        return 1
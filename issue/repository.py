@@ -1,5 +1,9 @@
+import contextlib
+import datetime
+import json
 import shutil
 import os
+import random
 
 import issue
 
@@ -20,11 +24,486 @@ def init(where: str, status: str, force: bool = False, up: bool = False):
     make_dir_if_not_exists(issue.util.paths.tmp_path())
     make_dir_if_not_exists(issue.util.paths.objects_path())
     make_dir_if_not_exists(issue.util.paths.issues_path())
+    make_dir_if_not_exists(issue.util.paths.packs_path())
     make_dir_if_not_exists(issue.util.paths.tags_path())
     make_dir_if_not_exists(issue.util.paths.releases_path())
     make_dir_if_not_exists(issue.util.paths.get_logs_path())
+    make_dir_if_not_exists(issue.util.paths.index_path())
 
-    with open(issue.util.paths.status_path(), 'w') as ofstream:
-        ofstream.write(status)
+    issue.util.atomic.write(issue.util.paths.status_path(), status)
 
     return os.path.abspath(repository_path)
+
+def status():
+    """Return status of the repository ("endpoint" or "exchange").
+    """
+    try:
+        with open(issue.util.paths.status_path()) as ifstream:
+            return ifstream.read().strip()
+    except FileNotFoundError:
+        return 'endpoint'
+
+
+def keyword_score(message, keywords):
+    """Return score of a message matched against `issue ls` keywords:
+
+    - 'kw' scores one if the message contains it,
+    - '-kw' subtracts one if the message contains it,
+    - '+kw' scores one if the message contains it, and subtracts one if not,
+    - '^kw' rejects the message (score 0) if it contains it,
+    - '=kw' rejects the message if it does not contain it.
+    """
+    message = message.lower()
+    found = 0
+    for kw in keywords:
+        if kw[0] == '-' and kw[1:] in message:
+            found -= 1
+            continue
+        if kw[0] == '^' and kw[1:] in message:
+            found = 0
+            break
+        if kw[0] == '+':
+            found += (1 if kw[1:] in message else -1)
+            continue
+        if kw[0] == '=' and kw[1:] not in message:
+            found = 0
+            break
+        if kw in message:
+            found += 1
+    return found
+
+
+class Repository:
+    """Issue repository.
+
+    Indexed issues and expanded UID prefixes are cached for the lifetime of
+    the object, so a script working on many issues loads each of them once.
+    Changes made through the object keep the caches up to date; changes made
+    by other processes are not seen until invalidate() is called.
+
+    All paths of the `issue` package point to the repository of the object
+    whose method was called last.
+    """
+    def __init__(self, where: str = None):
+        """Open repository in `where` (a directory containing `.issue`), or
+        the one of the current working directory.
+        """
+        path = os.path.abspath(issue.util.paths.get_repository_path(where = where))
+        if not os.path.isdir(path):
+            raise issue.exceptions.RepositoryNotFound(path)
+        self.path = path
+        self._issues = {}
+        self._uids = {}
+        self._batched = 0
+        self._pending_last = None
+
+    def _use(self):
+        issue.util.paths.set_repository_path(self.path)
+
+    def invalidate(self, issue_uid: str = None):
+        """Forget cached data of an issue (or of all issues).
+        """
+        if issue_uid is None:
+            self._issues.clear()
+            self._uids.clear()
+        else:
+            self._issues.pop(issue_uid, None)
+
+    @contextlib.contextmanager
+    def batched(self):
+        """Defer updates of repository-wide indexes, the shortlog and the last
+        issue marker made inside the block to its end, and sync all files
+        written inside it together (see issue.util.atomic).  Methods of the
+        object take deferred index updates into account.
+
+        If the block raises, whatever was done in it before the exception is
+        still applied and synced (each step even if an earlier one fails),
+        and the exception is propagated; nothing is rolled back.
+        """
+        self._use()
+        self._batched += 1
+        with issue.util.atomic.group():
+            try:
+                with issue.index.deferred(), issue.shortlog.batched():
+                    yield
+            finally:
+                self._batched -= 1
+                if not self._batched and self._pending_last is not None:
+                    last_issue_uid, self._pending_last = self._pending_last, None
+                    self.mark_last(last_issue_uid)
+
+    def last(self):
+        """Return UID of the issue last worked on (or an empty string).
+        """
+        if self._pending_last is not None:
+            return self._pending_last
+        self._use()
+        last_issue_path = issue.util.atomic.resolve(issue.util.paths.last_issue_path())
+        if not os.path.isfile(last_issue_path):
+            return ''
+        with open(last_issue_path) as ifstream:
+            return ifstream.read()
+
+    def mark_last(self, issue_uid: str):
+        if self._batched:
+            self._pending_last = issue_uid
+            return
+        self._use()
+        issue.util.atomic.write(issue.util.paths.last_issue_path(), issue_uid, deferred = True)
+
+    def expand(self, issue_uid_part: str):
+        """Return full UID of an issue given a unique prefix of it ('-' means
+        the last issue).
+        """
+        if issue_uid_part == '-':
+            return self.last()
+        if issue_uid_part not in self._uids:
+            self._use()
+            matched = issue.index.uids.match(issue_uid_part)
+            pending = issue.index.pending()
+            if pending:
+                matched = sorted(set(k for k in matched if k not in pending).union(
+                    k for k, v in pending.items() if v is not None and k.startswith(issue_uid_part)))
+            if len(matched) == 0:
+                raise issue.exceptions.IssueUIDNotMatched(issue_uid_part)
+            if len(matched) > 1:
+                raise issue.exceptions.IssueUIDAmbiguous(issue_uid_part)
+            self._uids[issue_uid_part] = matched[0]
+        return self._uids[issue_uid_part]
+
+    def get(self, issue_uid: str):
+        """Return indexed data of an issue (without comments).  The returned
+        dictionary is shared by all callers and must not be modified.
+        """
+        if issue_uid not in self._issues:
+            self._use()
+            self._issues[issue_uid] = issue.util.issues.getIssue(issue_uid, comments = False)
+        return self._issues[issue_uid]
+
+    def ls(self):
+        """Return sorted list of UIDs of all issues.
+        """
+        self._use()
+        return issue.index.uids.ls()
+
+    def query(self, statuses=None, tags=(), since=None, until=None, field='open.timestamp', keywords=(), threshold=1):
+        """Return a tuple `(summaries, not indexed UIDs)` of issues matching
+        all given criteria, where `summaries` maps UIDs to summary index records.
+
+        - `statuses`: set of accepted statuses (None accepts all),
+        - `tags`: tags as accepted by issue.index.tags.select(),
+        - `since`, `until`: datetimes bounding `field` ('open.timestamp' or
+          'close.timestamp'),
+        - `keywords`: lowercased keywords, see keyword_score(); issues scoring
+          less than `threshold` are left out.
+        """
+        self._use()
+        summaries, not_indexed = issue.index.summary.load(issue.index.uids.ls(), statuses = statuses)
+        if tags:
+            summaries = dict((k, summaries[k]) for k in issue.index.tags.select(summaries, tags))
+        if since is not None or until is not None:
+            # The window is widened by a second so that rounding cannot leave out
+            # issues on its edges; exact checks are done below.
+            window = issue.index.times.between(
+                field,
+                since = (None if since is None else (since.timestamp() - 1)),
+                until = (None if until is None else (until.timestamp() + 1)),
+            )
+            summaries = dict((k, v) for k, v in summaries.items() if k in window
+                and (since is None or since <= datetime.datetime.fromtimestamp(v.get(field, 0)))
+                and (until is None or until >= datetime.datetime.fromtimestamp(v.get(field, 0))))
+        if keywords:
+            if threshold > 0:
+                # Only candidates from the trigram index are loaded and scored.
+                summaries = dict((k, summaries[k]) for k in issue.index.trigrams.candidates(summaries, keywords))
+            # The summary only carries the first line of the message, but keywords
+            # are matched against the whole message.
+            summaries = dict((k, v) for k, v in summaries.items()
+                if keyword_score(self.get(k).get('message', ''), keywords) >= threshold)
+        return (summaries, not_indexed)
+
+    def _author(self):
+        repo_config = issue.config.getConfig()
+        return {
+            'author.email': repo_config['author.email'],
+            'author.name': repo_config['author.name'],
+        }
+
+    def _difference(self, action, params=None, timestamp=None, author=None):
+        difference = {
+            'action': action,
+            'author': (self._author() if author is None else author),
+            'timestamp': (issue.util.misc.timestamp() if timestamp is None else timestamp),
+        }
+        if params is not None:
+            difference['params'] = params
+        return difference
+
+    def _write(self, issue_uid, issue_differences):
+        """Write differences of an issue and return UID of the written diff.
+        """
+        author = self._author()
+        issue_diff_uid = '{0}{1}{2}{3}'.format(author['author.email'], author['author.name'], issue.util.misc.timestamp(), random.random())
+        issue_diff_uid = issue.util.misc.create_hash(issue_diff_uid)
+        issue.util.issues.writeIssueDifferences(issue_uid, issue_diff_uid, issue_differences)
+        self._issues.pop(issue_uid, None)
+        return issue_diff_uid
+
+    def record(self, issue_uid: str, issue_differences: list):
+        """Write and index differences of an issue, and mark it as the last
+        issue.  Returns UID of the written diff.
+        """
+        self._use()
+        issue_diff_uid = self._write(issue_uid, issue_differences)
+        self.mark_last(issue_uid)
+        issue.util.issues.indexIssue(issue_uid, issue_diff_uid)
+        return issue_diff_uid
+
+    def _check_tags(self, tags):
+        known_tags = (issue.index.tags.known() if tags else set())
+        for t in tags:
+            if t not in known_tags:
+                raise issue.exceptions.TagNotFound(t)
+
+    def open(self, message: str, tags=(), milestones=(), params=(), parent: str = None, chain_to=()):
+        """Open an issue and return its UID.
+
+        `params` is a sequence of `(key, value)` pairs.  The new issue is
+        chained to issues in `chain_to`, and to its parent.
+        """
+        self._use()
+        tags, milestones = list(tags), list(milestones)
+        self._check_tags(tags)
+        if parent is not None:
+            parent = self.expand(parent)
+        chain_to = [self.expand(each) for each in chain_to]
+
+        issue_uid = '{0}{1}{2}{3}{4}'.format(message, tags, milestones, parent, random.random())
+        issue_uid = issue.util.misc.create_hash(issue_uid)
+
+        # make directories for issue-specific objects
+        issue.util.atomic.makedirs(issue.util.paths.comments_path_of(issue_uid))
+        issue.util.atomic.makedirs(issue.util.paths.diffs_path_of(issue_uid))
+
+        issue_differences = [
+            self._difference('open'),
+            self._difference('set-message', {'text': message}),
+            self._difference('push-tags', {'tags': tags}),
+            self._difference('push-milestones', {'milestones': milestones}),
+        ]
+        repo_config = issue.config.getConfig()
+        if 'project.tag' in repo_config:
+            issue_differences.append(self._difference('push-tags', {'tags': [repo_config['project.tag']]}))
+            issue_differences.append(self._difference('set-project-tag', {'tag': repo_config['project.tag']}))
+        if 'project.name' in repo_config:
+            issue_differences.append(self._difference('set-project-name', {'name': repo_config['project.name']}))
+        for k, v in params:
+            issue_differences.append(self._difference('parameter-set', {'key': k, 'value': v}))
+        self._write(issue_uid, issue_differences)
+
+        next_release_pointer = issue.release.get_next_release_pointer()
+        if next_release_pointer:
+            issue.release.store_release_diff(next_release_pointer, 'open-issue', {
+                'id': issue_uid,
+                'message': message.splitlines()[0],
+            })
+
+        if parent is not None:
+            self._write(issue_uid, [self._difference('set-parent', {'uid': parent})])
+
+        issue.util.issues.indexIssue(issue_uid)
+        # Prefixes of the new UID may have become ambiguous.
+        self._uids = dict((k, v) for k, v in self._uids.items() if not issue_uid.startswith(k))
+        self.mark_last(issue_uid)
+
+        issue.shortlog.append_event_open(issue_uid, message)
+        issue.shortlog.append_event_tagged(issue_uid, tags)
+
+        chained_to = chain_to + ([parent] if parent is not None else [])
+        for link_issue_uid in chained_to:
+            link_issue_diff_uid = self._write(link_issue_uid, [self._difference('chain-link', {'sha1': [issue_uid]})])
+            issue.util.issues.indexIssue(link_issue_uid, link_issue_diff_uid)
+        if chained_to:
+            issue.shortlog.append_event_chained_to(issue_uid, chained_to)
+        return issue_uid
+
+    def import_issues(self, records, jobs: int = 1):
+        """Create issues from dictionaries (e.g. decoded from JSON Lines):
+
+            {"message": "...", "tags": [...], "milestones": [...], "params": {"key": "value", ...},
+             "author": {"name": "...", "email": "..."}, "timestamp": <opened, UNIX timestamp>,
+             "closed": <closed, UNIX timestamp, or true to close it now>,
+             "comments": [{"message": "...", "author": {...}, "timestamp": <UNIX timestamp>}, ...]}
+
+        Only "message" is required; author defaults to the configured one and
+        timestamps to the current time.  All objects are written first, and
+        issues are indexed (by `jobs` worker processes) and logged once at the
+        end.  Returns the list of `(issue uid, issue data, error)` tuples
+        describing the indexing, as issue.util.issues.indexIssues() does.
+        """
+        self._use()
+        default_author = self._author()
+        def author_of(record):
+            author = record.get('author')
+            if not author:
+                return default_author
+            return {
+                'author.email': author.get('email', default_author['author.email']),
+                'author.name': author.get('name', default_author['author.name']),
+            }
+
+        imported = []
+        for record in records:
+            message = record.get('message')
+            if not message:
+                raise ValueError('issue record without a message')
+            tags, milestones = list(record.get('tags', [])), list(record.get('milestones', []))
+            author = author_of(record)
+            opened = record.get('timestamp', issue.util.misc.timestamp())
+
+            issue_uid = issue.util.misc.create_hash('{0}{1}{2}{3}{4}'.format(message, tags, milestones, None, random.random()))
+            issue.util.atomic.makedirs(issue.util.paths.comments_path_of(issue_uid))
+            issue.util.atomic.makedirs(issue.util.paths.diffs_path_of(issue_uid))
+
+            issue_differences = [
+                self._difference('open', timestamp = opened, author = author),
+                self._difference('set-message', {'text': message}, opened, author),
+                self._difference('push-tags', {'tags': tags}, opened, author),
+                self._difference('push-milestones', {'milestones': milestones}, opened, author),
+            ]
+            for k, v in sorted(record.get('params', {}).items()):
+                issue_differences.append(self._difference('parameter-set', {'key': k, 'value': v}, opened, author))
+            closed = record.get('closed')
+            if closed:
+                issue_differences.append(self._difference('close', {}, (None if closed is True else closed), author))
+            self._write(issue_uid, issue_differences)
+
+            for each in record.get('comments', []):
+                self._write_comment(issue_uid, each['message'], author_of(each), each.get('timestamp', opened))
+            imported.append((issue_uid, message))
+
+        results = issue.util.issues.indexIssues([issue_uid for issue_uid, _ in imported], jobs = jobs)
+        with issue.shortlog.batched():
+            for issue_uid, message in imported:
+                issue.shortlog.append_event_open(issue_uid, message)
+        self._uids.clear()
+        return results
+
+    def close(self, issue_uid: str, timestamp: float = None, closing_git_commit: str = None):
+        """Close an issue, optionally at a given time (UNIX timestamp) and by
+        a Git commit.
+
+        Raises IssueClosed if the issue is already closed, and
+        UnclosedChainedIssues (with list of their UIDs) if any of issues
+        chained to it are not closed.
+        """
+        self._use()
+        issue_data = self.get(issue_uid)
+        if issue_data['status'] == 'closed':
+            raise issue.exceptions.IssueClosed(issue_uid)
+
+        # Links made inside a batch are in the issue, but not yet in the graph index.
+        chained = dict(issue.index.graph.related(issue_uid, 'chained'))
+        for c in issue_data.get('chained', []):
+            chained.setdefault(c, None)
+        unclosed_chained_issues = []
+        pending = issue.index.pending()
+        for c, status in sorted(chained.items()):
+            if c in pending:
+                status = (pending[c] or {}).get('status')
+            if status is None:
+                # Not in the summary index (yet), or dropped.
+                try:
+                    status = issue.util.issues.getIssue(c, index=True, comments=False)['status']
+                except issue.exceptions.NotAnIssue:
+                    continue
+            if status != 'closed':
+                unclosed_chained_issues.append(c)
+        if unclosed_chained_issues:
+            raise issue.exceptions.UnclosedChainedIssues(unclosed_chained_issues)
+
+        params = {}
+        if closing_git_commit is not None:
+            params['closing_git_commit'] = closing_git_commit
+        self.record(issue_uid, [self._difference('close', params, timestamp)])
+        issue.shortlog.append_event_close(issue_uid)
+
+        next_release_pointer = issue.release.get_next_release_pointer()
+        if next_release_pointer:
+            issue.release.store_release_diff(next_release_pointer, 'close-issue', {
+                'id': issue_uid,
+            })
+
+    def _write_comment(self, issue_uid, message, author, timestamp):
+        issue_comment_uid = issue.util.misc.create_hash('{0}{1}{2}'.format(issue_uid, timestamp, message))
+        issue_comment_data = {
+            'author.name': author['author.name'],
+            'author.email': author['author.email'],
+            'message': message,
+            'timestamp': timestamp,
+        }
+        issue.util.atomic.makedirs(issue.util.paths.comments_path_of(issue_uid))
+        issue.util.atomic.write(os.path.join(issue.util.paths.comments_path_of(issue_uid), '{0}.json'.format(issue_comment_uid)), json.dumps(issue_comment_data), deferred = True)
+        return issue_comment_uid
+
+    def comment(self, issue_uid: str, message: str):
+        """Comment on an issue and return UID of the comment.
+        """
+        self._use()
+        issue_comment_uid = self._write_comment(issue_uid, message, self._author(), issue.util.misc.timestamp())
+        self.mark_last(issue_uid)
+        return issue_comment_uid
+
+    def tag(self, issue_uid: str, tags, remove: bool = False):
+        """Add tags to an issue (or remove them from it).  Tags must exist.
+        """
+        self._use()
+        tags = list(tags)
+        self._check_tags(tags)
+        self.record(issue_uid, [self._difference(('remove-tags' if remove else 'push-tags'), {'tags': tags})])
+
+    def param(self, issue_uid: str, key: str, value: str = None, remove: bool = False):
+        """Set a parameter of an issue (or remove it).
+        """
+        self._use()
+        if remove:
+            self.record(issue_uid, [self._difference('parameter-remove', {'key': key})])
+        else:
+            self.record(issue_uid, [self._difference('parameter-set', {'key': key, 'value': value})])
+
+    def chain(self, issue_uid: str, others, attach: bool = False):
+        """Chain issues to an issue, so that it cannot be closed before they
+        are (or only attach them to it).
+        """
+        self._use()
+        for other in others:
+            self.record(issue_uid, [self._difference(('chain-attach' if attach else 'chain-link'), {'sha1': [other]})])
+
+    def drop(self, issue_uid: str):
+        """Remove an issue from the repository.
+        """
+        self._use()
+        issue.util.issues.dropIssue(issue_uid)
+        self.invalidate(issue_uid)
+        self._uids = dict((k, v) for k, v in self._uids.items() if v != issue_uid)
+
+    def fetch(self, remote_name: str, probe: bool = False, verbose: bool = False):
+        """Fetch objects from a remote.  Returns set of UIDs of issues which
+        received new differences (they are not indexed).
+        """
+        self._use()
+        fetched = issue.remote.fetchRemote(remote_name, issue.remote.getRemotes()[remote_name], probe = probe, verbose = verbose)
+        self._uids.clear()
+        for issue_uid in fetched:
+            self._issues.pop(issue_uid, None)
+        return fetched
+
+    def publish(self, remote_name: str, republish: bool = False, verbose: bool = False, local_pack=None):
+        """Publish objects to a remote.  Returns 1 if the remote cannot be
+        published to.
+        """
+        self._use()
+        # Only objects in place are published.
+        issue.util.atomic.commit()
+        return issue.remote.publishToRemote(remote_name, issue.remote.getRemotes()[remote_name],
+            local_pack = local_pack, republish = republish, verbose = verbose)
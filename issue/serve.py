@@ -0,0 +1,310 @@
+"""Daemon answering querying commands of a repository (`issue serve`).
+
+The daemon compiles `issue.py` once, imports every module the commands use
+and keeps results remembered by them (e.g. the UI model) in memory.  A client
+connects to its Unix socket and passes its standard streams, arguments,
+working directory and environment; the daemon forks, and the child runs the
+command against the passed streams and replies with its exit code.
+
+Indexes are read through cached(): the daemon keeps what it loaded from
+them (decoded summaries, lists of UIDs, journals) in memory, together with
+the inode, size and modification time of every file in `.issue/index` the
+loaded data came from.  Before forking a child for a request the daemon
+refreshes whatever changed since it was loaded, so children inherit the
+indexes loaded and only check that their files are unchanged; a child that
+finds (or makes) them changed loads them again, as a cold process would.
+The daemon stops when its repository is removed.
+
+Only commands that never change issues and never start an editor are
+forwarded (SERVED_COMMANDS, invoked by their full names), except for their
+invocations that rewrite the repository (UNSERVED); everything else runs
+directly.  Served commands are not strictly read-only: `show` records the
+shown issue in the shortlog and as the last one, and any of them may update
+stale indexes.  Children write these exactly as a cold process would,
+through issue.util.atomic inside the group issue.py opens around the
+command.
+"""
+
+import json
+import os
+import signal
+import sys
+
+import issue
+
+
+SERVED_COMMANDS = ('ls', 'show', 'log', 'statistics',)
+
+# Arguments (or their shortened forms) which make a served command rewrite
+# the repository.
+UNSERVED = {
+    'log': ('squash',),
+    'show': ('--index',),
+}
+
+# Seconds between checks whether the repository still exists.
+POLL_INTERVAL = 1.0
+
+_MAX_REQUEST_SIZE = (1 << 20)
+
+
+# True in the daemon and in its children.
+serving = False
+
+_remembered = {}
+
+# Maps keys of cached() data to tuples `(stamps of its files, data)`.
+_cache = {}
+
+# Functions to call when a command run by a child of the daemon ends, or None
+# if not running as one.
+_exit_functions = None
+
+
+def remember(key, value):
+    """Keep `value` for later requests if running as the daemon.
+    """
+    if serving:
+        _remembered[key] = value
+
+def recall(key):
+    return _remembered.get(key)
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def cached(key, paths, load):
+    """Return what `load()` returns, given that it reads files at `paths`.
+
+    If running as the daemon, the result is kept in memory until any of the
+    files is changed, replaced or removed.  Callers must not modify it.
+    """
+    if not serving:
+        return load()
+    paths = tuple(os.path.abspath(each) for each in paths)
+    # Files are stamped before they are read, so a change made while they
+    # are being read makes the result stale instead of being missed.
+    stamps = tuple(_stamp(each) for each in paths)
+    entry = _cache.get((key, paths))
+    if entry is not None and entry[0] == stamps:
+        return entry[1]
+    value = load()
+    _cache[(key, paths)] = (stamps, value)
+    return value
+
+def _refresh():
+    """Load indexes the served commands read, so that children inherit them
+    loaded.  Indexes which are not there yet are left for the children.
+    """
+    if not os.path.isfile(os.path.join(issue.util.paths.index_path(), 'uids')):
+        return
+    try:
+        issue.index.uids.ls()
+        issue.index.uids.count()
+        issue.index.summary.read()
+    except Exception:
+        # Children run into the same problem, and report it.
+        _cache.clear()
+
+def at_exit(function):
+    """Register `function` to be called when the command ends.  Children of
+    the daemon leave by os._exit(), which skips atexit, so they call the
+    functions themselves.
+    """
+    if _exit_functions is None:
+        import atexit
+        atexit.register(function)
+        return
+    _exit_functions.append(function)
+
+def _served(args):
+    # Shortened command names are not resolved here (that needs the UI
+    # model), so they always run directly.
+    if not args or args[0] not in SERVED_COMMANDS:
+        return False
+    for each in args[1:]:
+        if each == '--':
+            # Only operands follow.
+            break
+        if each and any(unserved.startswith(each) for unserved in UNSERVED.get(args[0], ())):
+            return False
+    return True
+
+def forward(args):
+    """Run a command by the daemon of the current repository.
+
+    Returns exit code of the command, or None if it must be run directly
+    (not a served command, or no daemon is running).
+    """
+    if serving or not _served(args):
+        return None
+    path = issue.util.paths.serve_socket_path()
+    if not os.path.exists(path):
+        return None
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(path)
+        except OSError:
+            # Stale socket of a daemon that is gone.
+            return None
+        socket.send_fds(connection, [b'\0'], [0, 1, 2])
+        connection.sendall(json.dumps({
+            'args': args,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+        }).encode('utf-8'))
+        connection.shutdown(socket.SHUT_WR)
+        reply = b''
+        while True:
+            received = connection.recv(64)
+            if not received:
+                break
+            reply += received
+    finally:
+        connection.close()
+    # An empty reply means that the child died without reporting.
+    return (int(reply) if reply else 1)
+
+def running(path):
+    """Return True if a daemon is listening on socket at `path`.
+    """
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+def _run(code, script, args):
+    """Run compiled `issue.py` as if it was invoked with `args`, and return
+    its exit code.
+    """
+    sys.argv = [script] + args
+    try:
+        exec(code, {'__name__': '__main__', '__file__': script, '__builtins__': __builtins__})
+        status = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = (e.code or 0)
+        else:
+            sys.stderr.write('{0}\n'.format(e.code))
+            status = 1
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    return status
+
+def _warm_up(code, script):
+    for package, names in (
+            (issue, ('shortlog', 'repository', 'objects', 'index')),
+            (issue.objects, ('encoding', 'store', 'tags')),
+            (issue.index, ('summary', 'uids', 'tags', 'trigrams', 'times', 'graph', 'statistics')),
+            (issue.util, ('issues',))):
+        for name in names:
+            getattr(package, name)
+    # A harmless command imports whatever issue.py imports at startup, and
+    # remembers the UI model.
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as sys.stdout:
+        _run(code, script, ['--version'])
+    sys.stdout = stdout
+    _refresh()
+
+def _handle(connection, code, script):
+    global _exit_functions
+    import socket
+    status = 1
+    _exit_functions = []
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        _, fds, _, _ = socket.recv_fds(connection, 1, 3)
+        request = b''
+        while len(request) <= _MAX_REQUEST_SIZE:
+            received = connection.recv(65536)
+            if not received:
+                break
+            request += received
+        request = json.loads(request.decode('utf-8'))
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, 'r', closefd = False)
+        sys.stdout = open(1, 'w', buffering = (1 if os.isatty(1) else -1), closefd = False)
+        sys.stderr = open(2, 'w', buffering = 1, closefd = False)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        status = _run(code, script, request['args'])
+        for function in reversed(_exit_functions):
+            function()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            connection.sendall(str(status).encode('ascii'))
+        finally:
+            os._exit(0)
+
+def serve(script, path):
+    """Answer requests on socket at `path` by running `script` (the issue.py
+    being executed) until interrupted, or until the repository is removed.
+    """
+    global serving
+    import socket
+    serving = True
+    repository_path = os.path.abspath(issue.util.paths.get_repository_path())
+    with open(script) as ifstream:
+        code = compile(ifstream.read(), script, 'exec')
+    _warm_up(code, script)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # The socket must never be reachable by other users, not even
+        # between its creation and a chmod().
+        umask = os.umask(0o077)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            listener.bind(path)
+        finally:
+            os.umask(umask)
+        listener.listen(16)
+        listener.settimeout(POLL_INTERVAL)
+
+        def terminate(signum, frame):
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, terminate)
+        # Children are never waited for.
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+        while os.path.isdir(repository_path):
+            try:
+                connection, _ = listener.accept()
+            except socket.timeout:
+                continue
+            _refresh()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                listener.close()
+                connection.settimeout(None)
+                _handle(connection, code, script)
+            connection.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.unlink(path)
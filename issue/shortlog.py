@@ -1,3 +1,4 @@
+import contextlib
 import datetime
 import json
 import os
@@ -8,6 +9,15 @@ import issue
 
 EVENTS_LOG_SIZE_DEFAULT = 80
 
+# The log is compacted to its configured size once the file grows over
+# this many bytes per event it is supposed to keep.
+COMPACTION_BYTES_PER_EVENT = 1024
+
+TAIL_BLOCK_SIZE = 8192
+
+# Events collected by batched(), or None when events are appended at once.
+_pending = None
+
 EVENT_TYPE_SHOW = 'show'
 EVENT_TYPE_SLUG = 'slug'
 EVENT_TYPE_COMMENT = 'comment'
@@ -28,40 +38,218 @@ EVENTS_LOG_EVENT_WEIGHTS = {
 }
 
 
-def read() -> typing.List:
+def _events_log_size() -> int:
+    return issue.config.getConfig().get('events_log_size', EVENTS_LOG_SIZE_DEFAULT)
+
+@contextlib.contextmanager
+def _locked(exclusive: bool, wait: bool = True) -> typing.Iterator[bool]:
+    """Lock the shortlog for the block: shared locks are taken to append to
+    it, and exclusive ones to replace it, so that events appended while the
+    log is being rewritten are not lost.  Yields False if the lock is not
+    free and `wait` is false.
+    """
+    import fcntl
+    lock_path = '{0}.lock'.format(issue.util.paths.get_shortlog_path())
+    fd = os.open(lock_path, (os.O_RDWR | os.O_CREAT), 0o644)
+    try:
+        try:
+            fcntl.flock(fd, ((fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if wait else fcntl.LOCK_NB)))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+def _encode(event: typing.Dict) -> bytes:
+    return '{}\n'.format(json.dumps(event)).encode('utf-8')
+
+def _migrate() -> None:
+    """Convert the shortlog from the JSON-array format it used to be stored in.
+    """
+    legacy_path = issue.util.paths.get_legacy_shortlog_path()
+    if not os.path.isfile(legacy_path):
+        return
+    with _locked(exclusive = True):
+        events_log = []
+        try:
+            with open(legacy_path) as ifstream:
+                events_log = json.loads(ifstream.read())
+        except FileNotFoundError:
+            # Migrated by another process meanwhile.
+            return
+        except json.decoder.JSONDecodeError:
+            pass
+        _write(events_log + _read_lines(None))
+        os.unlink(legacy_path)
+
+def _reversed_lines() -> typing.Iterator[bytes]:
+    """Yield lines of the shortlog, most recently appended first, reading
+    the file backwards in blocks.
+    """
     events_log_path = issue.util.paths.get_shortlog_path()
+    if not os.path.isfile(events_log_path):
+        return
+    with open(events_log_path, 'rb') as ifstream:
+        position = ifstream.seek(0, os.SEEK_END)
+        remainder = b''
+        while position > 0:
+            step = min(TAIL_BLOCK_SIZE, position)
+            position -= step
+            ifstream.seek(position)
+            lines = (ifstream.read(step) + remainder).split(b'\n')
+            # The first line may continue in the preceding block.
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                if line:
+                    yield line
+        if remainder:
+            yield remainder
+
+def _decode(line: bytes) -> typing.Optional[typing.Dict]:
+    try:
+        return json.loads(line)
+    except json.decoder.JSONDecodeError:
+        # A torn write; the event is lost, but the rest of the log is fine.
+        return None
+
+def _read_lines(count: typing.Optional[int]) -> typing.List:
+    """Decode last `count` events (or all events, if `count` is None) of the shortlog.
+    Only the tail of the file that contains them is read.
+    """
     events_log = []
-    if os.path.isfile(events_log_path):
-        with open(events_log_path) as ifstream:
-            try:
-                events_log = json.loads(ifstream.read())
-            except json.decoder.JSONDecodeError:
-                print('{}: failed to decode shortlog'.format(colorise(COLOR_ERROR, 'error')))
+    for line in _reversed_lines():
+        if count is not None and len(events_log) >= count:
+            break
+        event = _decode(line)
+        if event is not None:
+            events_log.append(event)
+    events_log.reverse()
     return events_log
 
 
+def read(limit: typing.Optional[int] = None) -> typing.List:
+    """Return up to `limit` (by default, "events_log_size") most recently
+    appended events, in the order they were appended.
+    """
+    _migrate()
+    events_log_size = _events_log_size()
+    return _read_lines(events_log_size if limit is None else min(limit, events_log_size))
+
+
+def _write(events_log: typing.List) -> None:
+    events_log = sorted(events_log, key = lambda each: each['timestamp'])
+    issue.util.atomic.write(issue.util.paths.get_shortlog_path(), b''.join(_encode(each) for each in events_log[-_events_log_size():]))
+
 def write(events_log: typing.List) -> None:
-    events_log_size = issue.config.getConfig().get('events_log_size', EVENTS_LOG_SIZE_DEFAULT)
-    dumped = json.dumps(events_log[-events_log_size:])
-    with open(issue.util.paths.get_shortlog_path(), 'w') as ofstream:
-        ofstream.write(dumped)
+    """Replace the shortlog with the "events_log_size" most recent events of `events_log`.
+    Events are stored oldest first, so that the most recent ones can be read
+    from the tail of the file.
+    """
+    with _locked(exclusive = True):
+        _write(events_log)
+
+def squash(aggressive: int = 0) -> typing.Tuple[typing.List, typing.List]:
+    """Squash the retained part of the shortlog (see squash_events_log()),
+    with no events appended between reading and rewriting it.
+    Returns a tuple `(events, squashed events)`, most recent first; the log is
+    not rewritten if it has fewer than two events.
+    """
+    _migrate()
+    with _locked(exclusive = True):
+        events_log = sort(_read_lines(_events_log_size()))
+        if len(events_log) < 2:
+            return (events_log, events_log)
+        squashed_events_log = squash_events_log(events_log, aggressive = aggressive)
+        _write(squashed_events_log)
+    return (events_log, squashed_events_log)
+
+
+def query(issue_uid: typing.Optional[str] = None, events: typing.Optional[typing.Collection] = None,
+        since: typing.Optional[float] = None, until: typing.Optional[float] = None) -> typing.List:
+    """Return events of the retained part of the shortlog (last "events_log_size"
+    events), most recent first, optionally only of a single issue, of
+    given types, and from a time window (UNIX timestamps, inclusive).
+
+    The log is read backwards, from the most recent events.  Lines of other
+    issues are skipped without being decoded.
+    """
+    _migrate()
+    issue_marker = (None if issue_uid is None else '"issue_uid": {}'.format(json.dumps(issue_uid)).encode('utf-8'))
+    events_log_size = _events_log_size()
+    matched = []
+    for n, line in enumerate(_reversed_lines()):
+        if n >= events_log_size:
+            break
+        if issue_marker is not None and issue_marker not in line:
+            continue
+        event = _decode(line)
+        if event is None:
+            continue
+        # Events are appended in the order they happen, which concurrent
+        # invocations (or a changed clock) do not keep in time order.
+        if since is not None and event['timestamp'] < since:
+            continue
+        if until is not None and event['timestamp'] > until:
+            continue
+        if issue_uid is not None and event['issue_uid'] != issue_uid:
+            continue
+        if events is not None and event['event'] not in events:
+            continue
+        matched.append(event)
+    return matched
 
 
 def timestamp(dt=None):
     return (dt or datetime.datetime.now()).timestamp()
 
+def _append(events: typing.List) -> None:
+    _migrate()
+    with _locked(exclusive = False):
+        size = issue.util.atomic.append(issue.util.paths.get_shortlog_path(), b''.join(_encode(each) for each in events))
+    if size > (_events_log_size() * COMPACTION_BYTES_PER_EVENT):
+        # If the lock is taken, the log is being compacted already, or
+        # someone is appending and a later append compacts it.
+        with _locked(exclusive = True, wait = False) as acquired:
+            if acquired:
+                _write(_read_lines(_events_log_size()))
+
 def append_event(issue_uid: str, event_type: str, parameters: typing.Dict = {}) -> None:
-    events_log = issue.shortlog.read()
+    """Append an event to the shortlog with a single O_APPEND write, so that
+    concurrent invocations do not lose events.
+
+    The log is truncated to "events_log_size" events lazily: by "issue log
+    squash", or here once it grows over its compaction threshold (if no other
+    invocation holds the lock of the log at that moment).
+    """
     content = {
         'issue_uid': issue_uid,
         'timestamp': timestamp(),
         'event': event_type,
         'parameters': parameters,
     }
-    if events_log and (events_log[-1].get('event') == content.get('event') and events_log[-1].get('issue_uid') == 'issue_uid'):
+    if _pending is not None:
+        _pending.append(content)
         return
-    events_log.append(content)
-    issue.shortlog.write(events_log)
+    _append([content])
+
+@contextlib.contextmanager
+def batched():
+    """Collect events appended inside the block, and append them all with a
+    single write when it ends.
+    """
+    global _pending
+    if _pending is not None:
+        # Already inside a batch; the outermost one writes.
+        yield
+        return
+    _pending = []
+    try:
+        yield
+    finally:
+        events, _pending = _pending, None
+        if events:
+            _append(events)
 
 
 def append_event_open(issue_uid: str, message: str) -> None:
@@ -92,6 +280,14 @@ def append_event_slug(issue_uid: str, slug: str) -> None:
 
 
 def sort(events_log):
+    """Return events most recent first.
+    The log is stored in time order, so usually this only reverses it.
+    """
+    timestamps = [each['timestamp'] for each in events_log]
+    if all((a < b) for a, b in zip(timestamps, timestamps[1:])):
+        return events_log[::-1]
+    if all((a >= b) for a, b in zip(timestamps, timestamps[1:])):
+        return list(events_log)
     return sorted(events_log, key = lambda each: each['timestamp'], reverse = True)
 
 
@@ -127,14 +323,6 @@ def squash_events_log_aggressive_1(events_log):
         squashed_events_log.append(event)
     return squashed_events_log
 
-def rfind_if(seq, pred):
-    index = len(seq)-1
-    while index > -1:
-        if pred(seq[index]):
-            break
-        index -= 1
-    return index
-
 def squash_events_log_aggressive_2(events_log):
     """Aggressive-squash-2 assumes that basic squashing, and
     aggressive-squashing-1 have already been performed.
@@ -142,10 +330,12 @@ def squash_events_log_aggressive_2(events_log):
     if len(events_log) < 2:
         return events_log
     squashed_events_log = [events_log[0]]
+    # Indexes of events of each issue in the squashed log, in ascending order,
+    # so that finding the last event of an issue does not scan the log.
+    indexes_of_events_for_issue = {events_log[0]['issue_uid']: [0]}
     for event in events_log[1:]:
         this_event_action = EVENTS_LOG_EVENT_WEIGHTS.get(event['event'])
-        index_of_last_event_for_the_same_issue = rfind_if(squashed_events_log, lambda e: e['issue_uid'] ==
-                event['issue_uid'])
+        index_of_last_event_for_the_same_issue = (indexes_of_events_for_issue.get(event['issue_uid']) or [-1])[-1]
         if index_of_last_event_for_the_same_issue > -1:
             last_event_action = EVENTS_LOG_EVENT_WEIGHTS.get(squashed_events_log[index_of_last_event_for_the_same_issue]['event'])
 
@@ -158,11 +348,13 @@ def squash_events_log_aggressive_2(events_log):
                 last_event_action, this_event_action = 0, 0
 
             if last_event_action > this_event_action:
-                squashed_events_log.pop()
+                popped = squashed_events_log.pop()
+                indexes_of_events_for_issue[popped['issue_uid']].pop()
             elif last_event_action < this_event_action:
                 continue
             else:
                 pass
+        indexes_of_events_for_issue.setdefault(event['issue_uid'], []).append(len(squashed_events_log))
         squashed_events_log.append(event)
     return squashed_events_log
 
@@ -1,3 +1,8 @@
-from . import paths
-from . import issues
 from . import misc
+from . import paths
+from . import mapped
+
+__getattr__ = misc.lazy_submodules(__name__, (
+    'issues',
+    'atomic',
+))
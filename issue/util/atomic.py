@@ -0,0 +1,286 @@
+"""Atomic writes of repository files, and their durability.
+
+Files are written to the `tmp/` directory of the repository and renamed into
+place, so readers (and a writer that crashed) see either the old or the new
+contents of a file, never a half-written one.
+
+When written data is synced to disk is set by "objects.fsync" configuration:
+
+- "none": never, it is left to the operating system,
+- "batch" (the default): files written inside a group (a command, or a
+  Repository.batched() block) are committed together when the group ends:
+  deferred writes (see below) are synced all at once and only then renamed
+  into place, other files are synced before they are renamed, and then
+  directories (i.e. the renames) and appended files are synced,
+- "always": every file is synced before it is renamed into place, and its
+  directory right after.
+
+Contents are always synced before the rename, as otherwise a crash could
+leave the new, zero-length or truncated, file in place of the old one.
+
+Writes of objects of issues, which a command may write many of, are
+deferred (`deferred=True`): inside a group with the "batch" policy they stay
+in `tmp/` until the group commits, so that all of them are synced together
+instead of one at a time.  Readers of such files find them by resolve() and
+listdir(), which take pending writes of the current group into account.
+Other files (indexes, rewritten next to their journals, and the shortlog,
+rewritten under its lock) are renamed into place as soon as they are
+written, as other processes coordinate on them.
+
+Temporary files are named after the process writing them; the outermost
+group removes the ones left behind by processes that are gone (i.e. that
+crashed before renaming them).
+
+Groups are per-process: worker processes (e.g. the ones indexing issues
+in parallel) are outside of the group of their parent, and sync what they
+write as if no group was open.  Pending writes are committed before such
+workers are started, so they can read them.
+"""
+
+import contextlib
+import itertools
+import os
+
+import issue
+
+
+FSYNC_NONE = 'none'
+FSYNC_BATCH = 'batch'
+FSYNC_ALWAYS = 'always'
+
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_BATCH, FSYNC_ALWAYS,)
+FSYNC_DEFAULT = FSYNC_BATCH
+
+
+# Paths to sync when the current group ends, deferred writes (mapping paths
+# to their temporary files, in the order they were written), and the process
+# that opened it (worker processes forked inside a group must not register in
+# its copy, as their paths would never be synced).
+_group = None
+
+_tmp_names = itertools.count()
+
+
+def policy():
+    """Return the configured fsync policy.
+    """
+    if _grouped() and _group['policy'] is not None:
+        return _group['policy']
+    configured = issue.config.getConfig().get('objects.fsync', FSYNC_DEFAULT)
+    if configured not in FSYNC_POLICIES:
+        configured = FSYNC_DEFAULT
+    if _grouped():
+        _group['policy'] = configured
+    return configured
+
+def _grouped():
+    return (_group is not None and _group['pid'] == os.getpid())
+
+def _sync(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        # Removed (or replaced by a directory rename) since it was written.
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _written(files=(), directories=()):
+    mode = policy()
+    if mode == FSYNC_NONE:
+        return
+    if mode == FSYNC_BATCH and _grouped():
+        _group['files'].update(files)
+        _group['directories'].update(directories)
+        return
+    for each in files:
+        _sync(each)
+    for each in directories:
+        _sync(each)
+
+def _deferring():
+    return (_grouped() and policy() == FSYNC_BATCH)
+
+def _tmp_file():
+    tmp_path = issue.util.paths.tmp_path()
+    name = os.path.join(tmp_path, '{0}.{1}.tmp'.format(os.getpid(), next(_tmp_names)))
+    try:
+        return (os.open(name, (os.O_WRONLY | os.O_CREAT | os.O_EXCL), 0o666), name)
+    except FileNotFoundError:
+        # Repositories created before tmp/ was used.
+        os.makedirs(tmp_path, exist_ok = True)
+        return (os.open(name, (os.O_WRONLY | os.O_CREAT | os.O_EXCL), 0o666), name)
+
+def write(path, data, deferred=False):
+    """Replace contents of file at `path` with `data` (bytes, or str which is
+    encoded as UTF-8).  Returns status of the written file (see os.stat()),
+    which is not the one of the file at `path` if it was replaced meanwhile.
+
+    A `deferred` write is only renamed into place when the group commits (if
+    there is one, and the policy is "batch"); until then resolve() returns
+    path of the written data.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    mode = policy()
+    deferred = (deferred and _deferring())
+    fd, tmp_name = _tmp_file()
+    try:
+        with os.fdopen(fd, 'wb') as ofstream:
+            ofstream.write(data)
+            ofstream.flush()
+            if mode != FSYNC_NONE and not deferred:
+                os.fsync(ofstream.fileno())
+            stat = os.fstat(ofstream.fileno())
+        if deferred:
+            replaced = _group['pending'].pop(path, None)
+            _group['pending'][path] = tmp_name
+            if replaced is not None:
+                os.unlink(replaced)
+            return stat
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    _written(directories = [(os.path.dirname(path) or '.')])
+    return stat
+
+def resolve(path):
+    """Return path of the file holding current contents of file at `path`:
+    its temporary file if it was written by a deferred write that is not
+    committed yet, or `path` itself.
+    """
+    if _grouped():
+        return _group['pending'].get(path, path)
+    return path
+
+def listdir(path):
+    """Return names of files in directory at `path`, including the ones
+    written there by pending deferred writes.
+    """
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        names = []
+    if _grouped() and _group['pending']:
+        names = sorted(set(names).union(os.path.basename(each)
+            for each in _group['pending'] if os.path.dirname(each) == path))
+    return names
+
+def discard(path):
+    """Forget pending deferred writes of the file at `path`, or of files below
+    it if it is a directory (e.g. one being removed).
+    """
+    if not _grouped():
+        return
+    prefix = os.path.join(path, '')
+    for each in [k for k in _group['pending'] if k == path or k.startswith(prefix)]:
+        os.unlink(_group['pending'].pop(each))
+
+def append(path, data):
+    """Append `data` (bytes) to file at `path` with a single O_APPEND write,
+    creating the file if needed.  Returns size of the file after the write.
+    """
+    fd = os.open(path, (os.O_WRONLY | os.O_APPEND | os.O_CREAT), 0o644)
+    try:
+        os.write(fd, data)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    _written(files = [path], directories = [(os.path.dirname(path) or '.')])
+    return size
+
+def makedirs(path):
+    """Create directory at `path` (and its missing parents), and sync the
+    new directory entries as if they were written files.
+    """
+    created = []
+    head = path
+    while head and not os.path.isdir(head):
+        created.append(head)
+        head = os.path.dirname(head)
+    os.makedirs(path, exist_ok = True)
+    _written(directories = [(os.path.dirname(each) or '.') for each in created])
+
+def commit():
+    """Sync files written so far in the current group, and rename deferred
+    writes into place.
+    """
+    if not _grouped():
+        return
+    pending, files, directories = _group['pending'], _group['files'], _group['directories']
+    _group['pending'], _group['files'], _group['directories'] = {}, set(), set()
+    # Contents first: all the deferred ones together, before any of them is
+    # renamed into place...
+    if _group['policy'] != FSYNC_NONE:
+        for tmp_name in pending.values():
+            _sync(tmp_name)
+    for path, tmp_name in pending.items():
+        try:
+            os.replace(tmp_name, path)
+        except FileNotFoundError:
+            # Its directory was removed (e.g. the issue was dropped).
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            continue
+        directories.add(os.path.dirname(path) or '.')
+    if _group['policy'] == FSYNC_NONE:
+        return
+    # ...then directory entries pointing to them.
+    for each in sorted(files):
+        _sync(each)
+    for each in sorted(directories):
+        _sync(each)
+
+def _remove_orphans():
+    """Remove temporary files of processes that are gone.
+    """
+    try:
+        tmp_path = issue.util.paths.tmp_path()
+        names = os.listdir(tmp_path)
+    except (issue.exceptions.RepositoryNotFound, FileNotFoundError, NotADirectoryError):
+        return
+    for name in names:
+        pid = name.split('.', 1)[0]
+        if not (name.endswith('.tmp') and pid.isdigit()) or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            # Alive, but owned by someone else.
+            continue
+        try:
+            os.unlink(os.path.join(tmp_path, name))
+        except FileNotFoundError:
+            pass
+
+@contextlib.contextmanager
+def group():
+    """Sync files written inside the block together when it ends (with the
+    "batch" policy).  Nested groups are synced by the outermost one.
+    """
+    global _group
+    if _grouped():
+        yield
+        return
+    _remove_orphans()
+    outer, _group = _group, {
+        'pid': os.getpid(),
+        'policy': None,
+        'pending': {},
+        'files': set(),
+        'directories': set(),
+    }
+    try:
+        yield
+    finally:
+        try:
+            commit()
+        finally:
+            _group = outer
@@ -5,8 +5,6 @@ import re
 import shutil
 import sys
 
-import unidecode
-
 import issue
 
 
@@ -20,31 +18,40 @@ def ls():
                     if not p.endswith('.json')])
     return list_of_issues
 
-def getIssue(issue_sha1, index=False):
+def getIssueComments(issue_sha1):
+    issue_comments = {}
+    comment_ids = issue.objects.store.ls(issue_sha1, issue.objects.store.KIND_COMMENT)
+    comments = issue.objects.store.read(issue_sha1, issue.objects.store.KIND_COMMENT, *comment_ids)
+    for cmt, contents in zip(comment_ids, comments):
+        try:
+            issue_comments[cmt] = json.loads(contents)
+        except json.decoder.JSONDecodeError as e:
+            print('error: diff (comment) {}.{} corrupted: {}'.format(issue_sha1, cmt, e))
+    return issue_comments
+
+def getIssue(issue_sha1, index=False, comments=True):
+    """Load indexed data of an issue.
+
+    Comments are only read when `comments` is true; otherwise the returned data
+    has no 'comments' key and the cost of loading does not depend on the
+    length of the comment thread.
+    """
     if index:
         indexIssue(issue_sha1)
     issue_group = issue_sha1[:2]
     issue_file_path = os.path.join(issue.util.paths.issues_path(), issue_group, '{0}.json'.format(issue_sha1))
     issue_data = {}
     try:
-        with open(issue_file_path, 'r') as ifstream:
+        with open(issue.util.atomic.resolve(issue_file_path), 'r') as ifstream:
             issue_data = json.loads(ifstream.read())
-
-        issue_comments_dir = issue.util.paths.comments_path_of(issue_sha1)
-        issue_data['comments'] = {}
-        if os.path.isdir(issue_comments_dir):
-            for cmt in os.listdir(issue_comments_dir):
-                with open(os.path.join(issue_comments_dir, cmt)) as ifstream:
-                    try:
-                        issue_data['comments'][cmt.split('.')[0]] = json.loads(ifstream.read())
-                    except json.decoder.JSONDecodeError as e:
-                        print('error: diff (comment) {}.{} corrupted: {}'.format(issue_sha1, cmt.split('.', 1)[0], e))
     except FileNotFoundError as e:
         # if os.path.isdir(os.path.join(ISSUES_PATH, issue_group, issue_sha1)):
         if os.path.isdir(os.path.join(issue.util.paths.issues_path(), issue_group, issue_sha1)):
             raise issue.exceptions.NotIndexed(issue_file_path)
         else:
             raise issue.exceptions.NotAnIssue(issue_file_path)
+    if comments:
+        issue_data['comments'] = getIssueComments(issue_sha1)
     return issue_data
 
 def saveIssue(issue_sha1, issue_data):
@@ -52,26 +59,33 @@ def saveIssue(issue_sha1, issue_data):
     issue_file_path = os.path.join(ISSUES_PATH, issue_group, '{0}.json'.format(issue_sha1))
     if 'comments' in issue_data:
         del issue_data['comments']
-    with open(issue_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(issue_data))
+    issue.util.atomic.write(issue_file_path, json.dumps(issue_data), deferred = True)
 
 def listIssueDifferences(issue_sha1):
-    issue_group = issue_sha1[:2]
-    issue_diffs_path = issue.util.paths.diffs_path_of(issue_sha1)
-    return [k.split('.')[0] for k in os.listdir(issue_diffs_path)]
+    return issue.objects.store.ls(issue_sha1, issue.objects.store.KIND_DIFF)
+
+def _decodeIssueDifferences(issue_sha1, *diffs):
+    """Return a dict mapping given diffs to their differences, leaving out
+    (with a warning) the ones that cannot be decoded.
+    """
+    decoded = {}
+    contents = issue.objects.store.read(issue_sha1, issue.objects.store.KIND_DIFF, *diffs)
+    for d, diff_contents in zip(diffs, contents):
+        try:
+            decoded[d] = issue.objects.encoding.decode(diff_contents)
+        except ValueError:
+            sys.stderr.write('warning: problem with issue {} diff {}\n'.format(issue_sha1, d))
+    return decoded
 
 def getIssueDifferences(issue_sha1, *diffs):
     issue_differences = []
-    issue_diff_path = issue.util.paths.diffs_path_of(issue_sha1)
-    for d in diffs:
-        issue_diff_file_path = os.path.join(issue_diff_path, '{0}.json'.format(d))
-        with open(issue_diff_file_path) as ifstream:
-            try:
-                issue_differences.extend(json.loads(ifstream.read()))
-            except json.decoder.JSONDecodeError:
-                sys.stderr.write('warning: problem with issue {} diff {}\n'.format(issue_sha1, d))
+    for differences in _decodeIssueDifferences(issue_sha1, *diffs).values():
+        issue_differences.extend(differences)
     return issue_differences
 
+def writeIssueDifferences(issue_sha1, issue_diff_sha1, issue_differences):
+    return issue.objects.store.write_diff(issue_sha1, issue_diff_sha1, issue_differences)
+
 def sortIssueDifferences(issue_differences):
     issue_differences_sorted = []
     issue_differences_order = {}
@@ -84,17 +98,54 @@ def sortIssueDifferences(issue_differences):
         issue_differences_sorted.extend([issue_differences[i] for i in issue_differences_order[ts]])
     return issue_differences_sorted
 
-def indexIssue(issue_sha1, *diffs):
+def indexIssue(issue_sha1, *diffs, update_indexes=True, full=False):
+    """Fold differences of an issue into its index.
+
+    The index remembers which differences it has already folded (and which
+    failed to decode), the timestamp of the newest of them, and tags with
+    their repetitions, so only unseen differences are applied and give the
+    same result as replaying the whole history.  Whole history is replayed
+    (and differences that failed to decode are retried) when `full` is true,
+    when the index predates this bookkeeping, or when an unseen difference
+    is older than the newest folded one.
+
+    Returns indexed data of the issue, or None if the index was up to date.
+    """
     issue_data = {}
     issue_file_path = issue.util.paths.indexed_path_of(issue_sha1)
-    if os.path.isfile(issue_file_path) and diffs:
-        with open(issue_file_path) as ifstream:
+    if os.path.isfile(issue.util.atomic.resolve(issue_file_path)) and not full:
+        with open(issue.util.atomic.resolve(issue_file_path)) as ifstream:
             issue_data = json.loads(ifstream.read())
+    if 'index.diffs' not in issue_data or 'index.tags' not in issue_data:
+        issue_data = {}
 
-    issue_differences = (diffs or listIssueDifferences(issue_sha1))
-    issue_differences = getIssueDifferences(issue_sha1, *issue_differences)
+    folded_diffs = set(issue_data.get('index.diffs', []))
+    failed_diffs = set(issue_data.get('index.failed', []))
+    unseen_diffs = ((issue_data and diffs) or listIssueDifferences(issue_sha1))
+    unseen_diffs = [d for d in unseen_diffs if d not in folded_diffs and d not in failed_diffs]
+    if issue_data and not unseen_diffs:
+        return None
+
+    decoded = _decodeIssueDifferences(issue_sha1, *unseen_diffs)
+    issue_differences = [d for differences in decoded.values() for d in differences]
+    if issue_data and any(d['timestamp'] < issue_data['index.timestamp'] for d in issue_differences):
+        # An out-of-order difference (e.g. a fetched one) cannot be folded on
+        # top of newer state.
+        issue_data = {}
+        folded_diffs, failed_diffs = set(), set()
+        unseen_diffs = listIssueDifferences(issue_sha1)
+        decoded = _decodeIssueDifferences(issue_sha1, *unseen_diffs)
+        issue_differences = [d for differences in decoded.values() for d in differences]
 
     issue_differences_sorted = sortIssueDifferences(issue_differences)
+    # Diffs that failed to decode are not folded, and are not decoded (nor
+    # warned about) again until the whole history is replayed.
+    issue_data['index.diffs'] = sorted(folded_diffs.union(decoded))
+    issue_data['index.failed'] = sorted(failed_diffs.union(d for d in unseen_diffs if d not in decoded))
+    # Tags are folded with their repetitions, and deduplicated below.
+    issue_data['tags'] = list(issue_data.get('index.tags', []))
+    issue_data['index.timestamp'] = max(
+        [issue_data.get('index.timestamp', 0)] + [d['timestamp'] for d in issue_differences])
 
     issue_work_started = {}
     issue_work_in_progress_time_deltas = []
@@ -160,9 +211,12 @@ def indexIssue(issue_sha1, *diffs):
                 continue
             for s in d['params']['sha1']:
                 issue_data['chained'].remove(s)
+        elif diff_action == 'set-parent':
+            issue_data['parent'] = d['params']['uid']
 
     # remove duplicated tags
-    issue_data['tags'] = list(set(issue_data.get('tags', [])))
+    issue_data['index.tags'] = issue_data['tags']
+    issue_data['tags'] = list(dict.fromkeys(issue_data['tags']))
 
     issue_total_time_spent = None
     if issue_work_in_progress_time_deltas:
@@ -179,8 +233,46 @@ def indexIssue(issue_sha1, *diffs):
     if issue_total_time_spent is not None:
         issue_data['total_time_spent'] = str(issue_total_time_spent).rsplit('.', 1)[0]
 
-    with open(issue_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(issue_data))
+    issue.util.atomic.write(issue_file_path, json.dumps(issue_data), deferred = True)
+
+    if update_indexes:
+        issue.index.update({issue_sha1: issue_data})
+    return issue_data
+
+def _indexIssueWorker(task):
+    issue_sha1, full = task
+    try:
+        return (issue_sha1, indexIssue(issue_sha1, update_indexes=False, full=full), None)
+    except Exception as e:
+        return (issue_sha1, None, '{}: {}'.format(type(e).__name__, e))
+
+def indexIssues(issue_list, jobs=1, full=False):
+    """Index issues from `issue_list` using `jobs` worker processes.
+
+    Returns a list of `(issue_sha1, issue_data, error)` tuples, in the order of
+    `issue_list`.  `issue_data` is None for issues that were already up to date
+    or failed to index (in which case `error` describes the failure).
+    Repository-wide indexes are updated once, after all issues are indexed.
+    Workers are forked; where processes cannot be forked, issues are indexed
+    in the calling process.
+    """
+    import multiprocessing
+    tasks = [(i, full) for i in issue_list]
+    if jobs > 1 and len(tasks) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        import concurrent.futures
+        # Workers are outside of the group, and read what it wrote so far.
+        issue.util.atomic.commit()
+        # Workers are forked whatever the default start method is: spawned
+        # ones would import the main module, i.e. run the issue.py script.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')) as executor:
+            results = list(executor.map(_indexIssueWorker, tasks,
+                chunksize=max(1, len(tasks) // (jobs * 4))))
+    else:
+        results = [_indexIssueWorker(t) for t in tasks]
+    indexed = dict((i, data) for i, data, error in results if data is not None)
+    if indexed:
+        issue.index.update(indexed)
+    return results
 
 def revindexIssue(issue_sha1, *diffs):
     issue_data = {}
@@ -253,15 +345,21 @@ def revindexIssue(issue_sha1, *diffs):
 
     issue_diff_sha1 = '{0}{1}{2}{3}'.format(repo_config['author.email'], repo_config['author.name'], timestamp(), random.random())
     issue_diff_sha1 = issue.util.misc.create_hash(issue_diff_sha1)
-    issue_diff_file_path = os.path.join(ISSUES_PATH, issue_sha1[:2], issue_sha1, 'diff', '{0}.json'.format(issue_diff_sha1))
-    with open(issue_diff_file_path, 'w') as ofstream:
-        ofstream.write(json.dumps(issue_differences))
+    writeIssueDifferences(issue_sha1, issue_diff_sha1, issue_differences)
 
 def dropIssue(issue_sha1):
     issue_group_path = os.path.join(issue.util.paths.issues_path(), issue_sha1[:2])
     issue_file_path = os.path.join(issue_group_path, '{0}.json'.format(issue_sha1))
-    os.unlink(issue_file_path)
+    issue.util.atomic.discard(issue_file_path)
+    issue.util.atomic.discard(os.path.join(issue_group_path, issue_sha1))
+    try:
+        os.unlink(issue_file_path)
+    except FileNotFoundError:
+        # Written and dropped by the same group.
+        pass
     shutil.rmtree(os.path.join(issue_group_path, issue_sha1))
+    issue.index.update({issue_sha1: None})
 
 def sluggify(issue_message):
+    import unidecode
     return '-'.join(re.compile('[^ a-zA-Z0-9_]').sub(' ', unidecode.unidecode(issue_message).lower()).split())
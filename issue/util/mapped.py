@@ -0,0 +1,66 @@
+"""Read-only memory-mapped access to sorted, line-oriented files.
+
+Large repository files (pack indexes, the summary index) are kept as sorted
+lines so that a lookup can bisect to the few lines it needs, and only those
+are copied out of the mapping and decoded.
+"""
+
+import mmap
+import os
+
+
+def open_mapped(path):
+    """Map a file into memory, read-only.
+    Returns None for empty or nonexistent files (they cannot be mapped).
+    """
+    try:
+        with open(path, 'rb') as ifstream:
+            if os.fstat(ifstream.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(ifstream.fileno(), 0, access = mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+def bisect_lines(mapped, key):
+    """Return offset of the first line not lesser than `key` (bytes).
+    """
+    low, high = 0, len(mapped)
+    while low < high:
+        middle = (low + high) // 2
+        begin = max(low, mapped.rfind(b'\n', 0, middle) + 1)
+        end = mapped.find(b'\n', begin)
+        if end == -1:
+            end = len(mapped)
+        if mapped[begin:end] < key:
+            low = end + 1
+        else:
+            high = begin
+    return low
+
+def lines_with_prefix(mapped, prefix):
+    """Yield lines (without the trailing newline) starting with `prefix`.
+    """
+    if mapped is None:
+        return
+    offset = bisect_lines(mapped, prefix)
+    while offset < len(mapped):
+        end = mapped.find(b'\n', offset)
+        if end == -1:
+            end = len(mapped)
+        if mapped[offset:(offset + len(prefix))] != prefix:
+            break
+        yield mapped[offset:end]
+        offset = end + 1
+
+def lines(mapped):
+    """Yield all lines (without the trailing newline).
+    """
+    if mapped is None:
+        return
+    offset = 0
+    while offset < len(mapped):
+        end = mapped.find(b'\n', offset)
+        if end == -1:
+            end = len(mapped)
+        yield mapped[offset:end]
+        offset = end + 1
@@ -1,5 +1,6 @@
 import hashlib
 import datetime
+import importlib
 
 
 def first(seq):
@@ -16,3 +17,45 @@ def timestamp(dt: datetime.datetime = None):
 
 def create_hash(s: str) -> str:
     return hashlib.sha3_384(s.encode('utf-8')).hexdigest()
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first use.
+
+    For optional modules (`optional=True`) a failed import is remembered, and
+    the stand-in is false in boolean context, like the None it replaces.
+    """
+    def __init__(self, name: str, optional: bool = False):
+        self._name = name
+        self._optional = optional
+        self._module = None
+        self._missing = False
+
+    def _load(self):
+        if self._module is None and not self._missing:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError:
+                if not self._optional:
+                    raise
+                self._missing = True
+        return self._module
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __getattr__(self, name):
+        module = self._load()
+        if module is None:
+            raise AttributeError('optional module {} is not available'.format(self._name))
+        return getattr(module, name)
+
+def lazy_submodules(package_name: str, names):
+    """Return a module-level `__getattr__` importing given submodules of a
+    package on first access.
+    """
+    def __getattr__(name):
+        if name in names:
+            return importlib.import_module('{}.{}'.format(package_name, name))
+        raise AttributeError('module {} has no attribute {}'.format(package_name, name))
+    return __getattr__
@@ -30,6 +30,11 @@ def get_repository_path(where: str = None, safe: bool = False) -> str:
     return _ISSUE_REPOSITORY_PATH
 
 
+def set_repository_path(path: str):
+    global _ISSUE_REPOSITORY_PATH
+    _ISSUE_REPOSITORY_PATH = path
+
+
 def objects_path() -> str:
     return os.path.join(get_repository_path(), 'objects')
 
@@ -55,6 +60,10 @@ def get_logs_path() -> str:
 
 
 def get_shortlog_path() -> str:
+    return os.path.join(get_logs_path(), 'events_log.jsonl')
+
+
+def get_legacy_shortlog_path() -> str:
     return os.path.join(get_logs_path(), 'events_log.json')
 
 
@@ -66,6 +75,10 @@ def tmp_path() -> str:
     return os.path.join(get_repository_path(), 'tmp')
 
 
+def packs_path() -> str:
+    return os.path.join(objects_path(), 'packs')
+
+
 def tags_path() -> str:
     return os.path.join(objects_path(), 'tags')
 
@@ -84,3 +97,22 @@ def remote_pack_path() -> str:
 
 def status_path() -> str:
     return os.path.join(get_repository_path(), 'status')
+
+
+def index_path() -> str:
+    return os.path.join(get_repository_path(), 'index')
+
+
+def summary_index_path() -> str:
+    return os.path.join(index_path(), 'summary')
+
+
+def serve_socket_path() -> str:
+    # Socket paths are limited to ~100 bytes, so the socket lives in a
+    # runtime directory, named after the repository it serves.
+    repository_path = os.path.abspath(get_repository_path(safe = True))
+    return os.path.join(
+        os.environ.get('XDG_RUNTIME_DIR', os.path.expanduser('~/.cache')),
+        'issue',
+        'serve-{0}.sock'.format(issue.util.misc.create_hash(repository_path)[:16]),
+    )
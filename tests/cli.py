@@ -0,0 +1,56 @@
+"""Running issue.py against scratch repositories, for tests of commands.
+
+The script needs clap, and its UI description installed in the home
+directory (as `make install` does); tests of CommandTestCase are skipped
+where clap is not available.
+"""
+
+import glob
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+
+from tests import scratch
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'issue.py')
+
+
+@unittest.skipIf(importlib.util.find_spec('clap') is None, 'clap is not installed')
+class CommandTestCase(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        share_path = os.path.join(self.directory, '.local', 'share', 'issue')
+        os.makedirs(share_path)
+        shutil.copy(os.path.join(ROOT, 'ui.json'), share_path)
+        for each in glob.glob(os.path.join(ROOT, 'share', '*_message')):
+            shutil.copy(each, share_path)
+        os.environ.pop('XDG_CACHE_HOME', None)
+        os.environ.pop('XDG_RUNTIME_DIR', None)
+
+    def issue(self, *args, input=None):
+        """Run issue.py with `args` in the repository.  Returns a tuple
+        `(exit code, standard output, standard error)`.
+        """
+        environ = dict(os.environ)
+        environ['PYTHONPATH'] = os.pathsep.join([ROOT] + ([environ['PYTHONPATH']] if environ.get('PYTHONPATH') else []))
+        completed = subprocess.run(
+            [sys.executable, SCRIPT] + list(args),
+            input = (None if input is None else input.encode('utf-8')),
+            stdout = subprocess.PIPE,
+            stderr = subprocess.PIPE,
+            cwd = self.directory,
+            env = environ,
+        )
+        return (completed.returncode, completed.stdout.decode('utf-8'), completed.stderr.decode('utf-8'))
+
+    def assertSucceeds(self, *args, input=None):
+        """Run issue.py like issue() does, and return its standard output.
+        """
+        status, output, error = self.issue(*args, input = input)
+        self.assertEqual(0, status, (output + error))
+        return output
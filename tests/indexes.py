@@ -0,0 +1,114 @@
+"""Repositories with random histories, for tests of repository-wide indexes.
+
+IndexTestCase opens issues and changes them at random through the
+repository, and checks that indexes updated incrementally (with or without
+compacted journals) read the same as indexes rebuilt from scratch.  Tests of
+an index subclass it and define snapshot().
+"""
+
+import os
+import random
+import time
+import unittest.mock
+
+import issue
+
+from tests import scratch
+
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'crash', 'parser', 'network', 'slow', 'memory', 'leak')
+TAGS = ('bug', 'feature', 'ui', 'core')
+
+# Times of issues are spread over this many seconds before the base time.
+SPREAD = (10 ** 7)
+BASE_TIME = 1.6e9
+
+
+class IndexTestCase(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        # Lifetimes used to be computed from local times; in UTC they are the
+        # same as the ones computed from UTC instants.
+        tz = os.environ.get('TZ')
+        def restore_tz():
+            if tz is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = tz
+            time.tzset()
+        self.addCleanup(restore_tz)
+        os.environ['TZ'] = 'UTC'
+        time.tzset()
+        for tag in TAGS:
+            issue.objects.tags.make(tag)
+
+    def message(self, rng):
+        return ' '.join(rng.sample(WORDS, 3))
+
+    def populate(self, seed, issues=60, changes=150):
+        """Open issues and change them at random, through the repository.
+        Returns UIDs of the issues which were not dropped.
+        """
+        rng = random.Random(seed)
+        r = self.repository
+        uids = []
+        for i in range(issues):
+            with unittest.mock.patch('issue.util.misc.timestamp', return_value = (BASE_TIME - rng.randint(0, SPREAD) + rng.random())):
+                uids.append(r.open('{0} {1}'.format(self.message(rng), i), tags = rng.sample(TAGS, rng.randint(0, 2))))
+        for n in range(changes):
+            issue_uid = rng.choice(uids)
+            choice = rng.random()
+            if choice < 0.2:
+                try:
+                    r.close(issue_uid, timestamp = (BASE_TIME + n + rng.random()))
+                except (issue.exceptions.IssueClosed, issue.exceptions.UnclosedChainedIssues):
+                    pass
+            elif choice < 0.3:
+                r.record(issue_uid, [r._difference('set-status', {'status': rng.choice(['open', 'wip'])})])
+            elif choice < 0.4:
+                r.tag(issue_uid, [rng.choice(TAGS)])
+            elif choice < 0.45 and r.get(issue_uid).get('tags'):
+                r.tag(issue_uid, [rng.choice(sorted(r.get(issue_uid)['tags']))], remove = True)
+            elif choice < 0.55:
+                r.record(issue_uid, [r._difference('set-message', {'text': self.message(rng)})])
+            elif choice < 0.65:
+                r.param(issue_uid, 'key', str(n))
+            elif choice < 0.8:
+                r.chain(issue_uid, [rng.choice(uids)], attach = (rng.random() < 0.3))
+            elif choice < 0.85 and len(uids) > 10:
+                r.drop(issue_uid)
+                uids.remove(issue_uid)
+            elif choice < 0.9:
+                with r.batched():
+                    for _ in range(3):
+                        uids.append(r.open(self.message(rng)))
+            else:
+                uids.append(r.open(self.message(rng)))
+        return uids
+
+    def snapshot(self, uids):
+        """Return a dict with whatever the tested index answers about `uids`.
+        """
+        raise NotImplementedError()
+
+    def rebuilt_snapshot(self, uids):
+        index_path = issue.util.paths.index_path()
+        for each in os.listdir(index_path):
+            os.unlink(os.path.join(index_path, each))
+        issue.util.issues.indexIssues(issue.util.issues.ls(), full = True)
+        return self.snapshot(uids)
+
+    def assertSnapshotsEqual(self, incremental, rebuilt):
+        self.assertEqual(set(incremental), set(rebuilt))
+        for key in incremental:
+            with self.subTest(index = key):
+                self.assertEqual(incremental[key], rebuilt[key])
+
+    def test_incremental_updates_match_rebuild(self):
+        uids = self.populate(seed = 1)
+        self.assertSnapshotsEqual(self.snapshot(uids), self.rebuilt_snapshot(uids))
+
+    def test_compacted_journals_match_rebuild(self):
+        with unittest.mock.patch('issue.index.journal.COMPACTION_MIN_SIZE', 512):
+            uids = self.populate(seed = 2)
+        self.assertSnapshotsEqual(self.snapshot(uids), self.rebuilt_snapshot(uids))
@@ -0,0 +1,55 @@
+"""Scratch repositories for tests.
+
+Every test of ScratchRepositoryTestCase runs in a fresh repository created in
+a temporary directory, which is also the home directory (so that the global
+configuration is the one written here) and the working directory.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import issue
+
+
+CONFIG = {
+    'author.email': 'tester@example.com',
+    'author.name': 'Tester',
+}
+
+
+class ScratchRepositoryTestCase(unittest.TestCase):
+    status = 'endpoint'
+
+    def setUp(self):
+        self.directory = os.path.realpath(tempfile.mkdtemp(prefix = 'issue-test-'))
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        environ, cwd = dict(os.environ), os.getcwd()
+        def restore():
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+            issue.objects.store.invalidate()
+            issue.util.paths.set_repository_path(None)
+            issue.config.invalidate()
+        self.addCleanup(restore)
+
+        os.environ['HOME'] = self.directory
+        with open(os.path.join(self.directory, '.issueconfig.json'), 'w') as ofstream:
+            ofstream.write(json.dumps(CONFIG))
+        os.chdir(self.directory)
+        issue.util.paths.set_repository_path(os.path.join(self.directory, issue.util.paths.ISSUE_HIDDEN_DIRECTORY))
+        issue.repository.init(where = self.directory, status = self.status)
+        issue.config.invalidate()
+        issue.objects.store.invalidate()
+        self.repository = issue.Repository(where = self.directory)
+
+    def configure(self, **config):
+        """Write local configuration of the repository.
+        """
+        with open(os.path.join(issue.util.paths.get_repository_path(), 'config.json'), 'w') as ofstream:
+            ofstream.write(json.dumps(config))
+        issue.config.invalidate()
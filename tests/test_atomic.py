@@ -0,0 +1,209 @@
+import os
+import subprocess
+import sys
+import unittest.mock
+
+import issue
+
+from tests import scratch
+
+
+class AtomicTestCase(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(issue.util.paths.get_repository_path(), 'atomic')
+        os.makedirs(self.path)
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def read(self, path):
+        with open(path, 'rb') as ifstream:
+            return ifstream.read()
+
+    def tmp_files(self):
+        return sorted(each for each in os.listdir(issue.util.paths.tmp_path()) if each.endswith('.tmp'))
+
+    def recorded(self):
+        """Patch fsync and rename, and return list to which `('fsync', path)`
+        and `('replace', destination)` tuples are appended as they are called.
+        """
+        calls = []
+        fsync, replace = os.fsync, os.replace
+        def recording_fsync(fd):
+            calls.append(('fsync', os.readlink('/proc/self/fd/{0}'.format(fd))))
+            return fsync(fd)
+        def recording_replace(source, destination):
+            calls.append(('replace', destination))
+            return replace(source, destination)
+        for name, function in (('fsync', recording_fsync), ('replace', recording_replace)):
+            patcher = unittest.mock.patch('os.{0}'.format(name), function)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return calls
+
+
+class DeferredWriteTests(AtomicTestCase):
+    def test_deferred_writes_are_renamed_when_the_group_commits(self):
+        issue.util.atomic.write(self.file('a'), 'old')
+        with issue.util.atomic.group():
+            issue.util.atomic.write(self.file('a'), 'new', deferred = True)
+            issue.util.atomic.write(self.file('b'), 'created', deferred = True)
+            self.assertEqual(b'old', self.read(self.file('a')))
+            self.assertFalse(os.path.exists(self.file('b')))
+            self.assertEqual(b'new', self.read(issue.util.atomic.resolve(self.file('a'))))
+            self.assertEqual(b'created', self.read(issue.util.atomic.resolve(self.file('b'))))
+            self.assertEqual(['a', 'b'], issue.util.atomic.listdir(self.path))
+        self.assertEqual(b'new', self.read(self.file('a')))
+        self.assertEqual(b'created', self.read(self.file('b')))
+        self.assertEqual(self.file('a'), issue.util.atomic.resolve(self.file('a')))
+        self.assertEqual([], self.tmp_files())
+
+    def test_rewritten_file_keeps_latest_contents(self):
+        with issue.util.atomic.group():
+            for n in range(3):
+                issue.util.atomic.write(self.file('a'), str(n), deferred = True)
+            self.assertEqual(1, len(self.tmp_files()))
+        self.assertEqual(b'2', self.read(self.file('a')))
+        self.assertEqual([], self.tmp_files())
+
+    def test_written_files_are_returned_stat(self):
+        with issue.util.atomic.group():
+            stat = issue.util.atomic.write(self.file('a'), 'contents', deferred = True)
+        self.assertEqual((stat.st_ino, stat.st_size), (os.stat(self.file('a')).st_ino, len(b'contents')))
+
+    def test_discarded_writes_are_not_renamed(self):
+        os.makedirs(self.file('dropped'))
+        with issue.util.atomic.group():
+            issue.util.atomic.write(os.path.join(self.file('dropped'), 'a'), 'lost', deferred = True)
+            issue.util.atomic.write(self.file('kept'), 'kept', deferred = True)
+            issue.util.atomic.discard(self.file('dropped'))
+            self.assertEqual([], issue.util.atomic.listdir(self.file('dropped')))
+        self.assertEqual([], os.listdir(self.file('dropped')))
+        self.assertEqual(b'kept', self.read(self.file('kept')))
+        self.assertEqual([], self.tmp_files())
+
+    def test_writes_into_removed_directories_are_dropped(self):
+        os.makedirs(self.file('removed'))
+        with issue.util.atomic.group():
+            issue.util.atomic.write(os.path.join(self.file('removed'), 'a'), 'lost', deferred = True)
+            os.rmdir(self.file('removed'))
+        self.assertFalse(os.path.exists(self.file('removed')))
+        self.assertEqual([], self.tmp_files())
+
+    def test_writes_are_committed_when_the_group_raises(self):
+        with self.assertRaises(RuntimeError):
+            with issue.util.atomic.group():
+                issue.util.atomic.write(self.file('a'), 'written', deferred = True)
+                raise RuntimeError('interrupted')
+        self.assertEqual(b'written', self.read(self.file('a')))
+
+    def test_crashed_group_leaves_old_contents(self):
+        issue.util.atomic.write(self.file('a'), 'old')
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with issue.util.atomic.group():
+                    issue.util.atomic.write(self.file('a'), 'new', deferred = True)
+                    os._exit(0)
+            finally:
+                os._exit(1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, status)
+        self.assertEqual(b'old', self.read(self.file('a')))
+        self.assertEqual([str(pid)], [each.split('.')[0] for each in self.tmp_files()])
+        # The next group cleans up after the crashed one.
+        with issue.util.atomic.group():
+            pass
+        self.assertEqual([], self.tmp_files())
+
+    def test_issues_written_in_a_batch_are_readable_before_commit(self):
+        with self.repository.batched():
+            issue_uid = self.repository.open('Deferred issue')
+            self.repository.comment(issue_uid, 'Deferred comment')
+            self.assertFalse(os.path.exists(issue.util.paths.indexed_path_of(issue_uid)))
+            self.assertEqual('Deferred issue', self.repository.get(issue_uid)['message'])
+            self.assertEqual(['Deferred comment'], [c['message'] for c in issue.util.issues.getIssueComments(issue_uid).values()])
+            self.assertEqual(issue_uid, self.repository.last())
+        self.assertTrue(os.path.isfile(issue.util.paths.indexed_path_of(issue_uid)))
+        self.assertEqual([], self.tmp_files())
+        reopened = issue.Repository(where = self.directory)
+        self.assertEqual('Deferred issue', reopened.get(issue_uid)['message'])
+        self.assertEqual(issue_uid, reopened.last())
+
+    def test_issue_opened_and_dropped_in_a_batch_leaves_nothing(self):
+        with self.repository.batched():
+            issue_uid = self.repository.open('Short-lived issue')
+            self.repository.drop(issue_uid)
+        self.assertEqual([], self.repository.ls())
+        self.assertFalse(os.path.exists(issue.util.paths.indexed_path_of(issue_uid)))
+        self.assertEqual([], self.tmp_files())
+
+
+class FsyncPolicyTests(AtomicTestCase):
+    def write_files(self, deferred):
+        issue.util.atomic.write(self.file('a'), 'a', deferred = deferred)
+        issue.util.atomic.write(self.file('b'), 'b', deferred = deferred)
+
+    def test_none_never_syncs(self):
+        self.configure(**{'objects.fsync': 'none'})
+        calls = self.recorded()
+        with issue.util.atomic.group():
+            self.write_files(deferred = True)
+            # Nothing to sync them together for, so they are in place at once.
+            self.assertTrue(os.path.isfile(self.file('b')))
+        self.assertEqual([], [c for c in calls if c[0] == 'fsync'])
+
+    def test_always_syncs_every_file_and_its_directory(self):
+        self.configure(**{'objects.fsync': 'always'})
+        calls = self.recorded()
+        with issue.util.atomic.group():
+            self.write_files(deferred = True)
+            self.assertTrue(os.path.isfile(self.file('b')))
+        self.assertEqual(['fsync', 'replace', 'fsync'] * 2, [c[0] for c in calls])
+        self.assertEqual([self.file('a'), self.path, self.file('b'), self.path], [c[1] for c in calls if not c[1].endswith('.tmp')])
+
+    def test_batch_outside_of_a_group_syncs_like_always(self):
+        calls = self.recorded()
+        self.write_files(deferred = True)
+        self.assertEqual(['fsync', 'replace', 'fsync'] * 2, [c[0] for c in calls])
+
+    def test_batch_syncs_deferred_files_together_before_renaming_them(self):
+        calls = self.recorded()
+        with issue.util.atomic.group():
+            self.write_files(deferred = True)
+            self.assertEqual([], calls)
+        self.assertEqual(['fsync', 'fsync', 'replace', 'replace', 'fsync'], [c[0] for c in calls])
+        self.assertTrue(all(c[1].endswith('.tmp') for c in calls[:2]))
+        self.assertEqual([self.file('a'), self.file('b'), self.path], [c[1] for c in calls[2:]])
+
+    def test_batch_syncs_directories_of_other_files_once(self):
+        calls = self.recorded()
+        with issue.util.atomic.group():
+            self.write_files(deferred = False)
+            self.assertEqual(['fsync', 'replace'] * 2, [c[0] for c in calls])
+        self.assertEqual([('fsync', self.path)], calls[4:])
+
+
+class OrphanTests(AtomicTestCase):
+    def test_files_of_gone_processes_are_removed(self):
+        gone = subprocess.Popen([sys.executable, '-c', ''])
+        gone.wait()
+        tmp_path = issue.util.paths.tmp_path()
+        names = ['{0}.0.tmp'.format(gone.pid), '{0}.0.tmp'.format(os.getpid()), '{0}.0.tmp'.format(os.getppid()), 'extracted.json']
+        for each in names:
+            with open(os.path.join(tmp_path, each), 'w') as ofstream:
+                ofstream.write('orphan?')
+        with issue.util.atomic.group():
+            self.assertEqual(sorted(names[1:]), sorted(os.listdir(tmp_path)))
+
+    def test_nested_groups_do_not_look_for_orphans(self):
+        with issue.util.atomic.group():
+            with unittest.mock.patch('issue.util.atomic._remove_orphans') as remove_orphans:
+                with issue.util.atomic.group():
+                    pass
+        remove_orphans.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
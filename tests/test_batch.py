@@ -0,0 +1,62 @@
+import json
+import unittest
+
+import issue
+
+from tests import cli
+
+
+class BatchCommandTests(cli.CommandTestCase):
+    def batch(self, lines, *args):
+        """Run a batch of `lines` from standard input.  Returns a tuple
+        `(exit code, list of reports of commands)`.
+        """
+        status, output, error = self.issue('batch', *args, input = ''.join('{0}\n'.format(each) for each in lines))
+        return (status, [json.loads(each) for each in output.splitlines()])
+
+    def test_commands_run_in_order(self):
+        status, reports = self.batch([
+            '# Comments and blank lines are skipped.',
+            'tag new bug',
+            'open "First issue"',
+            '',
+            'open "Second issue"',
+            'tag tag bug -',
+            'param - priority 1',
+            'ls --tag bug',
+        ])
+        self.assertEqual(0, status)
+        self.assertEqual([2, 3, 5, 6, 7, 8], [r['line'] for r in reports])
+        self.assertEqual([0] * 6, [r['status'] for r in reports])
+        self.assertIn('Second issue', reports[-1]['output'])
+        self.assertNotIn('First issue', reports[-1]['output'])
+
+        summaries = self.repository.query()[0]
+        self.assertEqual({'First issue', 'Second issue'}, set(v['message'] for v in summaries.values()))
+        second = [k for k, v in summaries.items() if v['message'] == 'Second issue'][0]
+        self.assertEqual(['bug'], summaries[second]['tags'])
+        self.assertEqual({'priority': '1'}, summaries[second]['parameters'])
+        self.assertEqual(second, issue.Repository(where = self.directory).last())
+        self.assertEqual(2, len(issue.shortlog.query(events = ['open'])))
+
+    def test_failures_are_reported(self):
+        status, reports = self.batch([
+            'open "Kept issue"',
+            'close 0123456789abcdef',
+            'batch',
+            'open "unterminated',
+            'ls',
+        ])
+        self.assertEqual(1, status)
+        self.assertEqual([0, 1, 1, 1, 0], [r['status'] for r in reports])
+        self.assertIn('Kept issue', reports[-1]['output'])
+
+    def test_stop_at_first_failure(self):
+        status, reports = self.batch(['open "Kept issue"', 'close 0123456789abcdef', 'open "Not opened"'], '--stop')
+        self.assertEqual(1, status)
+        self.assertEqual([1, 2], [r['line'] for r in reports])
+        self.assertEqual(['Kept issue'], [v['message'] for v in self.repository.query()[0].values()])
+
+
+if __name__ == '__main__':
+    unittest.main()
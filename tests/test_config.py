@@ -0,0 +1,57 @@
+import builtins
+import json
+import os
+import unittest.mock
+
+import issue
+
+from tests import scratch
+
+
+class ConfigTests(scratch.ScratchRepositoryTestCase):
+    def opened_paths(self, function):
+        """Return paths of files opened by a call of `function`.
+        """
+        opened = []
+        real_open = builtins.open
+        def recording_open(path, *args, **kwargs):
+            opened.append(os.path.abspath(path))
+            return real_open(path, *args, **kwargs)
+        with unittest.mock.patch('builtins.open', recording_open):
+            function()
+        return opened
+
+    def test_unchanged_files_are_not_read_again(self):
+        self.configure(**{'project.name': 'cached'})
+        self.assertEqual('cached', issue.config.getConfig()['project.name'])
+        self.assertEqual([], self.opened_paths(issue.config.getConfig))
+
+    def test_changed_files_are_read_again(self):
+        self.configure(**{'project.name': 'old'})
+        self.assertEqual('old', issue.config.getConfig()['project.name'])
+        with open(os.path.join(issue.util.paths.get_repository_path(), 'config.json'), 'w') as ofstream:
+            ofstream.write(json.dumps({'project.name': 'newer'}))
+        self.assertEqual('newer', issue.config.getConfig()['project.name'])
+        self.assertEqual('Tester', issue.config.getConfig()['author.name'])
+
+    def test_invalidate_forgets_cached_configuration(self):
+        config_path = os.path.join(issue.util.paths.get_repository_path(), 'config.json')
+        self.configure(**{'project.name': 'one'})
+        issue.config.getConfig()
+        stat = os.stat(config_path)
+        # Same size and modification time, as a write within the same
+        # timestamp tick could leave them.
+        with open(config_path, 'w') as ofstream:
+            ofstream.write(json.dumps({'project.name': 'two'}))
+        os.utime(config_path, ns = (stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual('one', issue.config.getConfig()['project.name'])
+        issue.config.invalidate()
+        self.assertEqual('two', issue.config.getConfig()['project.name'])
+
+    def test_callers_cannot_change_cached_configuration(self):
+        issue.config.getConfig()['author.name'] = 'Someone else'
+        self.assertEqual('Tester', issue.config.getConfig()['author.name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import random
+import unittest
+
+import issue
+
+from tests import scratch
+
+
+AUTHOR = {'author.email': 'tester@example.com', 'author.name': 'Tester'}
+
+DIFFERENCES = [
+    {'action': 'open', 'author': AUTHOR, 'timestamp': 1600000000.123456},
+    {'action': 'set-message', 'params': {'text': 'Zażółć gęślą jaźń\n\nbody'}, 'author': AUTHOR, 'timestamp': 1600000000.123456},
+    {'action': 'push-tags', 'params': {'tags': ['bug', 'ui']}, 'author': AUTHOR, 'timestamp': 1600000001},
+    {'action': 'close', 'params': {}, 'author': {'author.email': 'other@example.com', 'author.name': 'Other'}, 'timestamp': 1600000002.5},
+    # Whatever does not fit into a record must survive too.
+    {'action': 'not-an-action', 'author': {'author.name': 'Nameless'}, 'timestamp': '1600000003'},
+    {'action': 'set-status', 'params': {'status': 'wip'}, 'timestamp': True},
+    {'action': 'set-parent', 'params': {'uid': 'f' * 128}, 'author': AUTHOR, 'timestamp': (1 << 70)},
+    {'author': AUTHOR},
+]
+
+
+# Written by the binary encoding of earlier versions.
+LEGACY_BINARY = b'ISD\x01\x00\x00\x00\x02\x00\x01\x00\x00A\xd7\xd7\x84\x00 \x00\x00\x02\x03\x00\x00\x00\x00\x00\x00_^\x10\x01\x00\x00\x00V{"authors":[["tester@example.com","Tester"]],"rest":[{},{"params":{"text":"legacy"}}]}'
+LEGACY_DIFFERENCES = [
+    {'action': 'open', 'author': AUTHOR, 'timestamp': 1600000000.5},
+    {'action': 'set-message', 'params': {'text': 'legacy'}, 'author': AUTHOR, 'timestamp': 1600000001},
+]
+
+
+class EncodingTests(unittest.TestCase):
+    def test_round_trip(self):
+        for differences in (DIFFERENCES, []):
+            with self.subTest(differences = differences):
+                self.assertEqual(issue.objects.encoding.decode(issue.objects.encoding.encode(differences)), differences)
+
+    def test_legacy_binary_is_decoded(self):
+        decoded = issue.objects.encoding.decode(LEGACY_BINARY)
+        # Equal is not enough: 1 == 1.0, but they are written differently.
+        self.assertEqual(json.dumps(decoded, sort_keys = True), json.dumps(LEGACY_DIFFERENCES, sort_keys = True))
+        self.assertEqual(json.loads(issue.objects.encoding.as_json(LEGACY_BINARY)), LEGACY_DIFFERENCES)
+
+    def test_corrupted_binary_raises_value_error(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            corrupted = bytearray(LEGACY_BINARY)
+            for _ in range(rng.randint(1, 4)):
+                corrupted[rng.randrange(len(issue.objects.encoding.MAGIC), len(corrupted))] = rng.randrange(256)
+            corrupted = bytes(corrupted[:rng.randint(len(issue.objects.encoding.MAGIC), len(corrupted))])
+            try:
+                issue.objects.encoding.decode(corrupted)
+            except ValueError:
+                pass
+
+    def test_mismatched_payload_raises_value_error(self):
+        for payload in (b'[]', b'{"authors": [], "rest": []}', b'{"authors": [], "rest": [1, 2, 3]}'):
+            records_end = len(issue.objects.encoding.MAGIC) + 4 + (len(LEGACY_DIFFERENCES) * 12)
+            corrupted = LEGACY_BINARY[:records_end] + len(payload).to_bytes(4, 'big') + payload
+            with self.subTest(payload = payload), self.assertRaises(ValueError):
+                issue.objects.encoding.decode(corrupted)
+
+
+class EncodingRepositoryTests(scratch.ScratchRepositoryTestCase):
+    def test_diffs_are_written_as_json(self):
+        # The key selected the binary encoding in earlier versions.
+        self.configure(**{'objects.encoding': 'binary'})
+        issue_uid = self.repository.open('json issue')
+        issue.objects.tags.make('json-tag')
+        diff_paths = list(issue.objects.store._loose_files(issue_uid, issue.objects.store.KIND_DIFF).values())
+        tag_diff_path = os.path.join(issue.util.paths.tags_path(), 'json-tag', 'diff')
+        diff_paths.extend(os.path.join(tag_diff_path, each) for each in os.listdir(tag_diff_path))
+        for each in diff_paths:
+            self.assertTrue(each.endswith('.json'))
+            with open(each) as ifstream:
+                json.load(ifstream)
+
+    def test_legacy_binary_diffs_are_read(self):
+        issue_uid = self.repository.open('legacy issue')
+        issue.util.atomic.write(os.path.join(issue.objects.store._loose_dir(issue_uid, issue.objects.store.KIND_DIFF), 'legacy.bin'), LEGACY_BINARY)
+        self.assertIn('legacy', issue.objects.store.ls(issue_uid, issue.objects.store.KIND_DIFF))
+        self.assertEqual(issue.util.issues.getIssueDifferences(issue_uid, 'legacy'), LEGACY_DIFFERENCES)
@@ -0,0 +1,34 @@
+import unittest
+
+import issue
+
+from tests import indexes
+
+
+class GraphIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        return dict((each, issue.index.graph.related(each)) for each in uids)
+
+    def test_edges_match_issues_in_both_directions(self):
+        uids = self.populate(seed = 4, issues = 30, changes = 120)
+        summaries = issue.index.summary.read()
+        def status(issue_uid):
+            return (summaries[issue_uid].get('status', '') if issue_uid in summaries else None)
+        expected = dict((each, {}) for each in uids)
+        for each in uids:
+            issue_data = self.repository.get(each)
+            for relation, reverse in issue.index.graph.RELATIONS.items():
+                others = issue_data.get(relation, [])
+                for other in (others if isinstance(others, list) else [others]):
+                    expected[each].setdefault(relation, set()).add((other, status(other)))
+                    if other in expected:
+                        expected[other].setdefault(reverse, set()).add((each, status(each)))
+        self.assertTrue(any(expected.values()))
+        for each in uids:
+            for relation in issue.index.graph._MIRRORS:
+                with self.subTest(issue = each, relation = relation):
+                    self.assertEqual(expected[each].get(relation, set()), set(issue.index.graph.related(each, relation)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import unittest
+
+import issue
+
+from tests import cli, scratch
+
+
+RECORDS = [
+    {'message': 'Imported bug\n\nWith a longer description.', 'tags': ['bug'], 'milestones': ['v1'],
+        'params': {'priority': '1'}, 'author': {'name': 'Importer', 'email': 'importer@example.com'},
+        'timestamp': 1.5e9},
+    {'message': 'Imported and closed', 'timestamp': 1.5e9, 'closed': (1.5e9 + 3600)},
+    {'message': 'Imported with comments', 'comments': [
+        {'message': 'First comment', 'timestamp': (1.5e9 + 60)},
+        {'message': 'Second comment', 'author': {'name': 'Commenter'}},
+    ]},
+]
+
+
+def by_message(summaries):
+    return dict((v['message'], k) for k, v in summaries.items())
+
+
+class ImportTests(scratch.ScratchRepositoryTestCase):
+    def test_records_are_imported(self):
+        results = self.repository.import_issues(RECORDS)
+        self.assertEqual([None] * len(RECORDS), [error for _, _, error in results])
+        imported = by_message(self.repository.query()[0])
+        self.assertEqual({'Imported bug', 'Imported and closed', 'Imported with comments'}, set(imported))
+
+        bug = self.repository.get(imported['Imported bug'])
+        self.assertEqual('open', bug['status'])
+        self.assertEqual(['bug'], bug['tags'])
+        self.assertEqual(['v1'], bug['milestones'])
+        self.assertEqual({'priority': '1'}, bug['parameters'])
+        self.assertEqual(('Importer', 'importer@example.com'), (bug['open.author.name'], bug['open.author.email']))
+        self.assertEqual(1.5e9, bug['open.timestamp'])
+
+        closed = self.repository.get(imported['Imported and closed'])
+        self.assertEqual('closed', closed['status'])
+        self.assertEqual((1.5e9 + 3600), closed['close.timestamp'])
+        self.assertEqual('Tester', closed['open.author.name'])
+
+        comments = issue.util.issues.getIssueComments(imported['Imported with comments'])
+        self.assertEqual({('First comment', 'Tester', (1.5e9 + 60)), ('Second comment', 'Commenter')},
+            set(((c['message'], c['author.name'], c['timestamp']) if c['message'] == 'First comment'
+                else (c['message'], c['author.name'])) for c in comments.values()))
+
+        self.assertEqual(sorted(imported.values()), sorted(e['issue_uid'] for e in issue.shortlog.query(events = ['open'])))
+        self.assertEqual(3, issue.index.statistics.counters()['count'])
+
+    def test_workers_import_like_a_single_process(self):
+        records = [{'message': 'Issue {0}'.format(i), 'tags': ['bug'] * (i % 2), 'timestamp': (1.5e9 + i)} for i in range(20)]
+        self.repository.import_issues(records, jobs = 4)
+        summaries = self.repository.query()[0]
+        self.assertEqual(set(r['message'] for r in records), set(v['message'] for v in summaries.values()))
+        self.assertEqual(10, len(issue.index.tags.issues_of('bug')))
+        self.assertEqual(20, issue.index.uids.count())
+
+    def test_record_without_message_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.repository.import_issues([{'message': 'Fine'}, {'tags': ['bug']}])
+
+
+class ImportCommandTests(cli.CommandTestCase):
+    def test_file_is_imported(self):
+        path = os.path.join(self.directory, 'issues.jsonl')
+        with open(path, 'w') as ofstream:
+            ofstream.write(''.join('{0}\n'.format(json.dumps(each)) for each in RECORDS))
+        output = self.assertSucceeds('import', '--jobs', '2', path)
+        self.assertIn('imported 3 issue(s)', output)
+        self.assertIn('"issue tag new --missing"', output)
+        self.assertEqual(3, len(self.repository.ls()))
+
+    def test_standard_input_is_imported(self):
+        self.assertSucceeds('import', input = '{"message": "From standard input"}\n\n')
+        self.assertEqual(['From standard input'], [v['message'] for v in self.repository.query()[0].values()])
+
+    def test_invalid_lines_are_reported(self):
+        status, output, _ = self.issue('import', input = '{"message": "Fine"}\n{"tags": []}\n')
+        self.assertEqual(1, status)
+        self.assertIn('line 2: issue without a message', output)
+        self.assertEqual([], self.repository.ls())
+
+
+if __name__ == '__main__':
+    unittest.main()
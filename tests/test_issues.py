@@ -0,0 +1,120 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+
+import issue
+
+from tests import scratch
+
+
+class IndexIssueTests(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        for tag in ('a', 'b'):
+            issue.objects.tags.make(tag)
+        self.issue_uid = self.repository.open('tagged issue')
+
+    def fully_indexed(self):
+        with open(issue.util.paths.indexed_path_of(self.issue_uid)) as ifstream:
+            incremental = ifstream.read()
+        issue.util.issues.indexIssue(self.issue_uid, full = True)
+        full = issue.util.issues.getIssue(self.issue_uid, comments = False)
+        issue.util.atomic.write(issue.util.paths.indexed_path_of(self.issue_uid), incremental)
+        return full
+
+    def assertIncrementalIsFull(self):
+        incremental = issue.util.issues.getIssue(self.issue_uid, comments = False)
+        self.assertEqual(incremental, self.fully_indexed())
+        return incremental
+
+    def test_repeated_tags(self):
+        r = self.repository
+        r.tag(self.issue_uid, ['a'])
+        r.tag(self.issue_uid, ['a', 'b'])
+        self.assertEqual(self.assertIncrementalIsFull()['tags'], ['a', 'b'])
+        r.tag(self.issue_uid, ['a'], remove = True)
+        self.assertEqual(self.assertIncrementalIsFull()['tags'], ['a', 'b'])
+        r.tag(self.issue_uid, ['a'], remove = True)
+        self.assertEqual(self.assertIncrementalIsFull()['tags'], ['b'])
+
+    def test_undecodable_diff_is_not_retried(self):
+        bad_path = os.path.join(issue.util.paths.diffs_path_of(self.issue_uid), 'bad.json')
+        with open(bad_path, 'w') as ofstream:
+            ofstream.write('[{"action": "close"')
+        warnings = io.StringIO()
+        with contextlib.redirect_stderr(warnings):
+            self.assertIsNotNone(issue.util.issues.indexIssue(self.issue_uid))
+            self.assertIsNone(issue.util.issues.indexIssue(self.issue_uid))
+        self.assertEqual(warnings.getvalue().count('diff bad'), 1)
+        issue_data = issue.util.issues.getIssue(self.issue_uid, comments = False)
+        self.assertNotIn('bad', issue_data['index.diffs'])
+        self.assertEqual(issue_data['index.failed'], ['bad'])
+
+        # A repaired diff is applied when the whole history is replayed.
+        with open(bad_path, 'w') as ofstream:
+            ofstream.write('[{"action": "close", "params": {}, "timestamp": 9e9,'
+                ' "author": {"author.email": "tester@example.com", "author.name": "Tester"}}]')
+        self.assertIsNone(issue.util.issues.indexIssue(self.issue_uid))
+        issue_data = issue.util.issues.indexIssue(self.issue_uid, full = True)
+        self.assertEqual(issue_data['status'], 'closed')
+        self.assertEqual(issue_data['index.failed'], [])
+
+    def test_out_of_order_diff_replays_history(self):
+        r = self.repository
+        r.tag(self.issue_uid, ['a'])
+        diff_uid = r._write(self.issue_uid, [r._difference('push-tags', {'tags': ['b']}, timestamp = 1.0)])
+        issue_data = issue.util.issues.indexIssue(self.issue_uid, diff_uid)
+        self.assertEqual(sorted(issue_data['tags']), ['a', 'b'])
+        self.assertIncrementalIsFull()
+
+
+class IndexIssuesTests(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.repository.batched():
+            self.issue_uids = [self.repository.open('issue {0}'.format(i)) for i in range(12)]
+            for each in self.issue_uids[::3]:
+                self.repository.close(each)
+
+    def reindexed(self, jobs):
+        results = issue.util.issues.indexIssues(self.issue_uids, jobs = jobs, full = True)
+        summaries = issue.index.summary.read()
+        return (dict((i, data) for i, data, _ in results), summaries)
+
+    def test_workers_index_like_a_single_process(self):
+        sequential = self.reindexed(jobs = 1)
+        parallel = self.reindexed(jobs = 4)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(len(parallel[1]), len(self.issue_uids))
+
+    def test_failures_are_reported(self):
+        # A diff that cannot be read at all (not one that cannot be decoded).
+        broken_uid = self.issue_uids[2]
+        for each in issue.objects.store._loose_files(broken_uid, issue.objects.store.KIND_DIFF).values():
+            os.unlink(each)
+            os.mkdir(each)
+        results = issue.util.issues.indexIssues(self.issue_uids[:3], jobs = 2, full = True)
+        self.assertEqual([each[0] for each in results], self.issue_uids[:3])
+        self.assertIsNotNone(results[0][1])
+        self.assertIsNone(results[2][1])
+        self.assertIsNotNone(results[2][2])
+
+    def test_workers_do_not_run_the_main_script(self):
+        # The issue.py script is the main module of the process; spawned (or
+        # forkserver) workers would import it, and run it again.
+        script = os.path.join(self.directory, 'script.py')
+        with open(script, 'w') as ofstream:
+            ofstream.write('\n'.join([
+                'import multiprocessing, sys',
+                'sys.path.insert(0, {0!r})'.format(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                'import issue',
+                'multiprocessing.set_start_method("spawn")',
+                'print("started", flush = True)',
+                'results = issue.util.issues.indexIssues(issue.util.issues.ls(), jobs = 2, full = True)',
+                'print(sum(1 for each in results if each[1] is not None))',
+            ]))
+        output = subprocess.run([sys.executable, script], cwd = self.directory, check = True,
+            stdout = subprocess.PIPE, universal_newlines = True).stdout
+        self.assertEqual(output.split(), ['started', str(len(self.issue_uids))])
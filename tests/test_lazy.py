@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import issue
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Submodules imported only when a command first uses them.
+LAZY = (
+    'issue.index',
+    'issue.index.summary',
+    'issue.objects',
+    'issue.repository',
+    'issue.serve',
+    'issue.shortlog',
+    'issue.util.issues',
+)
+
+
+def imported_after(code):
+    """Return set of modules imported by a fresh interpreter running `code`.
+    """
+    output = subprocess.check_output([sys.executable, '-c', '\n'.join([
+        'import sys',
+        code,
+        'print("\\n".join(sorted(sys.modules)))',
+    ])], cwd = ROOT)
+    return set(output.decode('utf-8').split())
+
+
+class LazySubmodulesTests(unittest.TestCase):
+    def test_submodules_are_not_imported_with_the_package(self):
+        imported = imported_after('import issue')
+        self.assertIn('issue.config', imported)
+        self.assertEqual(set(), imported.intersection(LAZY))
+
+    def test_submodules_are_imported_on_first_use(self):
+        imported = imported_after('import issue; issue.index.summary')
+        self.assertLessEqual({'issue.index', 'issue.index.summary'}, imported)
+        self.assertNotIn('issue.index.trigrams', imported)
+
+    def test_unknown_names_raise_attribute_error(self):
+        with self.assertRaises(AttributeError):
+            issue.no_such_module
+        with self.assertRaises(AttributeError):
+            issue.index.no_such_index
+
+
+class LazyModuleTests(unittest.TestCase):
+    def test_module_is_imported_on_first_use(self):
+        self.assertNotIn('issue.release', imported_after('import issue; issue.util.misc.LazyModule("issue.release")'))
+        lazy = issue.util.misc.LazyModule('json')
+        self.assertEqual('[1]', lazy.dumps([1]))
+
+    def test_missing_optional_module_is_false(self):
+        lazy = issue.util.misc.LazyModule('no_such_module_anywhere', optional = True)
+        self.assertFalse(lazy)
+        with self.assertRaises(AttributeError):
+            lazy.anything
+
+    def test_missing_required_module_raises(self):
+        lazy = issue.util.misc.LazyModule('no_such_module_anywhere')
+        with self.assertRaises(ImportError):
+            lazy.anything
+
+
+if __name__ == '__main__':
+    unittest.main()
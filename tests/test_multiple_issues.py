@@ -0,0 +1,73 @@
+import unittest
+
+import issue
+
+from tests import cli
+
+
+class MultipleIssuesCommandTests(cli.CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        issue.objects.tags.make('bug')
+        issue.objects.tags.make('ui')
+        self.first = self.repository.open('First issue', tags = ['ui'])
+        self.second = self.repository.open('Second issue')
+        self.third = self.repository.open('Third issue', tags = ['ui'])
+
+    def statuses(self):
+        self.repository.invalidate()
+        return [self.repository.get(each)['status'] for each in (self.first, self.second, self.third)]
+
+    def test_close_many(self):
+        self.assertSucceeds('close', self.first[:10], self.second[:10])
+        self.assertEqual(['closed', 'closed', 'open'], self.statuses())
+
+    def test_close_chained_issues_together(self):
+        self.repository.chain(self.first, [self.second])
+        status, output, _ = self.issue('close', self.first)
+        self.assertEqual(1, status)
+        self.assertIn('unclosed chained issues', output)
+        self.assertSucceeds('close', self.first, self.second)
+        self.assertEqual(['closed', 'closed', 'open'], self.statuses())
+
+    def test_close_reports_each_failure(self):
+        self.repository.close(self.first)
+        status, output, _ = self.issue('close', self.first, self.second)
+        self.assertEqual(1, status)
+        self.assertIn('{0}: fatal: issue already closed'.format(self.first), output)
+        self.assertEqual(['closed', 'closed', 'open'], self.statuses())
+
+    def test_close_selected(self):
+        self.assertSucceeds('close', '--tag', 'ui')
+        self.assertEqual(['closed', 'open', 'closed'], self.statuses())
+
+    def test_tag_many(self):
+        self.assertSucceeds('tag', 'tag', 'bug', self.first, self.second)
+        self.assertEqual({self.first, self.second}, issue.index.tags.issues_of('bug'))
+        self.assertSucceeds('tag', 'tag', '--remove', 'bug', self.first, self.second)
+        self.assertEqual(set(), issue.index.tags.issues_of('bug'))
+
+    def test_tag_selected(self):
+        self.repository.close(self.third)
+        self.assertSucceeds('tag', 'tag', 'bug', '--status', 'open')
+        self.assertEqual({self.first, self.second}, issue.index.tags.issues_of('bug'))
+
+    def test_param_many(self):
+        self.assertSucceeds('param', self.first, self.third, 'priority', '1')
+        self.repository.invalidate()
+        self.assertEqual([{'priority': '1'}, {}, {'priority': '1'}],
+            [self.repository.get(each).get('parameters', {}) for each in (self.first, self.second, self.third)])
+        self.assertSucceeds('param', '--remove', self.first, self.third, 'priority')
+        self.repository.invalidate()
+        self.assertEqual([{}, {}, {}],
+            [self.repository.get(each).get('parameters', {}) for each in (self.first, self.second, self.third)])
+
+    def test_param_selected(self):
+        self.assertSucceeds('param', '--keyword', 'second', 'priority', '2')
+        self.repository.invalidate()
+        self.assertEqual({'priority': '2'}, self.repository.get(self.second).get('parameters'))
+        self.assertEqual({}, self.repository.get(self.first).get('parameters', {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
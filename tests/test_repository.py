@@ -0,0 +1,69 @@
+import unittest
+
+import issue
+
+from tests import scratch
+
+
+class RepositoryTests(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        issue.objects.tags.make('bug')
+        issue.objects.tags.make('feature')
+
+    def test_library_workflow(self):
+        repository = issue.Repository(where = self.directory)
+        first = repository.open('First issue', tags = ['bug'])
+        second = repository.open('Second issue')
+        repository.tag(second, ['feature'])
+        repository.close(repository.expand(first[:8]))
+        repository.param(second, 'priority', '1')
+
+        self.assertEqual(sorted([first, second]), repository.ls())
+        self.assertEqual(second, repository.last())
+        self.assertEqual('closed', repository.get(first)['status'])
+        self.assertEqual({'priority': '1'}, repository.get(second)['parameters'])
+
+        summaries, not_indexed = repository.query(statuses = {'open'})
+        self.assertEqual([second], list(summaries))
+        self.assertEqual([], not_indexed)
+        self.assertEqual([first], list(repository.query(tags = ['bug'])[0]))
+        self.assertEqual([second], list(repository.query(keywords = ['second'])[0]))
+        with self.assertRaises(issue.exceptions.IssueClosed):
+            repository.close(first)
+
+        # A new object reads back what the first one wrote.
+        reopened = issue.Repository(where = self.directory)
+        self.assertEqual(repository.ls(), reopened.ls())
+        self.assertEqual(second, reopened.last())
+        self.assertEqual(['feature'], reopened.get(second)['tags'])
+
+    def test_batched_updates_are_applied_at_the_end(self):
+        with self.repository.batched():
+            issue_uid = self.repository.open('Batched issue', tags = ['bug'])
+            self.repository.tag(issue_uid, ['feature'])
+            self.assertEqual([], issue.index.summary.read().get(issue_uid, {}).get('tags', []))
+            self.assertEqual(issue_uid, self.repository.last())
+        self.assertEqual(['bug', 'feature'], sorted(issue.index.summary.read()[issue_uid]['tags']))
+        self.assertEqual(issue_uid, issue.Repository(where = self.directory).last())
+
+    def test_work_done_before_an_exception_is_flushed(self):
+        with self.assertRaises(RuntimeError):
+            with self.repository.batched():
+                issue_uid = self.repository.open('Interrupted issue')
+                self.repository.tag(issue_uid, ['bug'])
+                raise RuntimeError('interrupted')
+
+        reopened = issue.Repository(where = self.directory)
+        self.assertEqual([issue_uid], reopened.ls())
+        self.assertEqual(issue_uid, reopened.last())
+        self.assertEqual([issue_uid], list(reopened.query(tags = ['bug'])[0]))
+        self.assertEqual(['tagged', 'open'], [e['event'] for e in issue.shortlog.query(issue_uid = issue_uid)][:2])
+        # Nothing is left pending for later blocks.
+        self.assertIsNone(issue.index._pending)
+        self.assertIsNone(issue.shortlog._pending)
+        self.assertEqual(0, self.repository._batched)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import os
+import signal
+import tempfile
+import textwrap
+import time
+import unittest
+
+import issue
+
+from tests import scratch
+
+
+# Stands in for issue.py: `ls` prints the indexed issues, and with --cached
+# fails if it has to read any index file to do so.
+SCRIPT = textwrap.dedent('''
+    import builtins
+    import json
+    import sys
+
+    import issue
+
+    if sys.argv[1:2] == ['ls']:
+        if '--cached' in sys.argv:
+            index_path = issue.util.paths.index_path()
+            real_open = builtins.open
+            def guarded_open(path, *args, **kwargs):
+                if str(path).startswith(index_path):
+                    raise AssertionError('{0} read again'.format(path))
+                return real_open(path, *args, **kwargs)
+            builtins.open = guarded_open
+        uids = issue.index.uids.ls()
+        summaries, _ = issue.index.summary.load(uids)
+        print(json.dumps({
+            'count': issue.index.uids.count(),
+            'messages': sorted(summaries[each]['message'] for each in uids),
+        }))
+''')
+
+
+class ServeTests(scratch.ScratchRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ.pop('XDG_RUNTIME_DIR', None)
+        self.repository.open('first')
+        self.script = os.path.join(self.directory, 'issue.py')
+        with open(self.script, 'w') as ofstream:
+            ofstream.write(SCRIPT)
+        self.socket_path = issue.util.paths.serve_socket_path()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                issue.serve.serve(self.script, self.socket_path)
+            finally:
+                os._exit(0)
+        def stop():
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        self.addCleanup(stop)
+        deadline = time.monotonic() + 10
+        while not issue.serve.running(self.socket_path):
+            self.assertLess(time.monotonic(), deadline, 'daemon did not start')
+            time.sleep(0.01)
+
+    def forward(self, *args):
+        """Return a tuple `(exit code, output)` of a forwarded command.
+        """
+        with tempfile.TemporaryFile() as output:
+            saved = os.dup(1)
+            os.dup2(output.fileno(), 1)
+            try:
+                status = issue.serve.forward(list(args))
+            finally:
+                os.dup2(saved, 1)
+                os.close(saved)
+            output.seek(0)
+            return (status, output.read().decode('utf-8'))
+
+    def test_forwarded_command_is_answered(self):
+        status, output = self.forward('ls')
+        self.assertEqual(0, status)
+        self.assertEqual({'count': 1, 'messages': ['first']}, json.loads(output))
+
+    def test_loaded_indexes_are_kept(self):
+        status, output = self.forward('ls', '--cached')
+        self.assertEqual(0, status, output)
+        self.assertEqual({'count': 1, 'messages': ['first']}, json.loads(output))
+
+    def test_changed_indexes_are_loaded_again(self):
+        self.forward('ls')
+        self.repository.open('second')
+        status, output = self.forward('ls', '--cached')
+        self.assertEqual(0, status, output)
+        self.assertEqual({'count': 2, 'messages': ['first', 'second']}, json.loads(output))
+
+    def test_other_commands_are_not_forwarded(self):
+        self.assertIsNone(self.forward('open', 'third')[0])
+        self.assertIsNone(self.forward('log', 'squash')[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import random
+import unittest
+import unittest.mock
+
+import issue
+
+from tests import scratch
+
+
+EVENTS = ('show', 'slug', 'comment', 'open', 'close', 'tagged', 'chained_to')
+
+
+class ShortlogTests(scratch.ScratchRepositoryTestCase):
+    def test_query_matches_filtered_read(self):
+        self.configure(events_log_size = 40)
+        rng = random.Random(1)
+        uids = ['{0:02x}'.format(i) * 4 for i in range(5)]
+        for _ in range(100):
+            issue.shortlog.append_event(rng.choice(uids), rng.choice(EVENTS))
+        events_log = issue.shortlog.read()
+        self.assertEqual(len(events_log), 40)
+        self.assertEqual(issue.shortlog.query(), events_log[::-1])
+        self.assertEqual(issue.shortlog.query(issue_uid = uids[0]), [e for e in events_log[::-1] if e['issue_uid'] == uids[0]])
+        self.assertEqual(issue.shortlog.query(events = ['open', 'close']), [e for e in events_log[::-1] if e['event'] in ('open', 'close')])
+
+    def test_batched_events_are_appended_at_the_end(self):
+        with issue.shortlog.batched():
+            issue.shortlog.append_event_open('ab' * 4, 'message')
+            self.assertEqual(issue.shortlog.read(), [])
+        self.assertEqual([e['event'] for e in issue.shortlog.read()], ['open'])
+
+    def test_query_since_does_not_stop_at_older_events(self):
+        timestamps = [100.0, 300.0, 200.0, 50.0, 400.0]
+        for n, each in enumerate(timestamps):
+            with unittest.mock.patch('issue.shortlog.timestamp', return_value = each):
+                issue.shortlog.append_event('ab' * 4, 'open', {'n': n})
+        self.assertEqual([e['timestamp'] for e in issue.shortlog.query(since = 150.0)], [400.0, 200.0, 300.0])
+        self.assertEqual([e['timestamp'] for e in issue.shortlog.query(since = 150.0, until = 250.0)], [200.0])
+
+    def test_compaction_keeps_concurrently_appended_events(self):
+        self.configure(events_log_size = 1000)
+        processes, events = 4, 100
+        # Compacted after nearly every append, but never short of space.
+        with unittest.mock.patch('issue.shortlog.COMPACTION_BYTES_PER_EVENT', 0.1):
+            children = []
+            for n in range(processes):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        for i in range(events):
+                            issue.shortlog.append_event('{0:02x}'.format(n) * 4, 'show', {'i': i})
+                    finally:
+                        os._exit(0)
+                children.append(pid)
+            for each in children:
+                os.waitpid(each, 0)
+        events_log = issue.shortlog.read()
+        self.assertEqual(len(events_log), processes * events)
+        for n in range(processes):
+            self.assertEqual([e['parameters']['i'] for e in events_log if e['issue_uid'] == '{0:02x}'.format(n) * 4], list(range(events)))
+
+    def test_squash_rewrites_retained_events(self):
+        for each in ('open', 'show', 'show', 'close'):
+            issue.shortlog.append_event('ab' * 4, each)
+        events_log, squashed = issue.shortlog.squash()
+        self.assertEqual([e['event'] for e in events_log], ['close', 'show', 'show', 'open'])
+        self.assertEqual([e['event'] for e in squashed], ['close', 'show', 'open'])
+        self.assertEqual(issue.shortlog.sort(issue.shortlog.read()), squashed)
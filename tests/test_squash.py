@@ -0,0 +1,79 @@
+import random
+import unittest
+
+import issue
+
+
+EVENTS = tuple(issue.shortlog.EVENTS_LOG_EVENT_WEIGHTS)
+
+
+def baseline_squash(events_log, aggressive=0):
+    """Squashing as it was implemented before finding the last event of an
+    issue stopped scanning the log.
+    """
+    weights = issue.shortlog.EVENTS_LOG_EVENT_WEIGHTS
+    if len(events_log) < 2:
+        return events_log
+    squashed = [events_log[0]]
+    for event in events_log[1:]:
+        if event['issue_uid'] == squashed[-1]['issue_uid'] and event['event'] == squashed[-1]['event']:
+            continue
+        squashed.append(event)
+    if aggressive > 0 and len(squashed) > 1:
+        events_log, squashed = squashed, [squashed[0]]
+        for event in events_log[1:]:
+            if event['issue_uid'] == squashed[-1]['issue_uid']:
+                last, this = weights[squashed[-1]['event']], weights[event['event']]
+                if last > this:
+                    squashed.pop()
+                elif last < this:
+                    continue
+            squashed.append(event)
+    if aggressive > 1 and len(squashed) > 1:
+        events_log, squashed = squashed, [squashed[0]]
+        for event in events_log[1:]:
+            index = len(squashed) - 1
+            while index > -1 and squashed[index]['issue_uid'] != event['issue_uid']:
+                index -= 1
+            if index > -1:
+                last, this = weights[squashed[index]['event']], weights[event['event']]
+                if last > this:
+                    squashed.pop()
+                elif last < this:
+                    continue
+            squashed.append(event)
+    return sorted(squashed, key = lambda each: each['timestamp'], reverse = True)
+
+
+def random_log(rng, length, issues, ties=False):
+    uids = ['{0:02x}'.format(i) * 4 for i in range(issues)]
+    timestamp = 1.6e9
+    events_log = []
+    for _ in range(length):
+        if not (ties and rng.random() < 0.3):
+            timestamp += rng.randint(1, 100)
+        events_log.append({'issue_uid': rng.choice(uids), 'event': rng.choice(EVENTS), 'timestamp': timestamp, 'parameters': {}})
+    return events_log
+
+
+class SquashTests(unittest.TestCase):
+    def test_squash_matches_baseline(self):
+        rng = random.Random(0)
+        for n in range(300):
+            events_log = random_log(rng, rng.randint(0, 120), rng.randint(1, 8), ties = (n % 2 == 0))
+            for aggressive in (0, 1, 2):
+                with self.subTest(n = n, aggressive = aggressive):
+                    self.assertEqual(issue.shortlog.squash_events_log(events_log, aggressive), baseline_squash(events_log, aggressive))
+
+
+class SortTests(unittest.TestCase):
+    def test_sort_matches_sorted(self):
+        rng = random.Random(1)
+        for n in range(100):
+            events_log = random_log(rng, rng.randint(0, 30), 3, ties = (n % 2 == 0))
+            for shuffled in (events_log, events_log[::-1], rng.sample(events_log, len(events_log))):
+                with self.subTest(n = n):
+                    self.assertEqual(
+                        [e['timestamp'] for e in issue.shortlog.sort(shuffled)],
+                        sorted((e['timestamp'] for e in events_log), reverse = True),
+                    )
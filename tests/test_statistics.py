@@ -0,0 +1,101 @@
+import bisect
+import datetime
+import random
+import threading
+import unittest
+import unittest.mock
+
+import issue
+
+from tests import indexes
+
+
+NOW = int((indexes.BASE_TIME + indexes.SPREAD) * 1e6)
+
+
+def baseline_median(seq):
+    """Median as `issue statistics` used to compute it, from all lifetimes.
+    """
+    if not seq:
+        return None
+    s = sorted(seq)
+    i = len(s) // 2
+    if len(s) % 2 == 0:
+        return (s[i - 1] + s[i]) / 2
+    return s[i]
+
+
+class ValuesTests(unittest.TestCase):
+    def test_indexing_matches_merged_list(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            values = sorted(rng.randint(0, 20) for _ in range(rng.randint(0, 30)))
+            removed = sorted(rng.sample(values, rng.randint(0, len(values))))
+            added = sorted(rng.randint(0, 20) for _ in range(rng.randint(0, 5)))
+            merged = list(values)
+            for each in removed:
+                del merged[bisect.bisect_left(merged, each)]
+            merged = sorted(merged + added)
+            sequence = issue.index.statistics._Values(values, removed, added)
+            self.assertEqual(len(sequence), len(merged))
+            self.assertEqual([sequence[k] for k in range(len(merged))], merged)
+
+
+class StatisticsIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        return {
+            'statistics': issue.index.statistics.counters(),
+            'lifetimes': issue.index.statistics.lifetimes(now = NOW),
+        }
+
+    def test_medians_match_baseline(self):
+        uids = self.populate(seed = 4)
+        current_datetime = datetime.datetime.fromtimestamp(NOW / 1e6)
+        closed, still_open = [], []
+        for each in uids:
+            issue_data = self.repository.get(each)
+            opened = datetime.datetime.fromtimestamp(issue_data['open.timestamp'])
+            if issue_data['status'] == 'closed':
+                closed.append(datetime.datetime.fromtimestamp(issue_data['close.timestamp']) - opened)
+            elif issue_data['status'] == 'open':
+                still_open.append(current_datetime - opened)
+        lifetimes = issue.index.statistics.lifetimes(now = NOW)
+        self.assertEqual(lifetimes['closed']['med'], baseline_median(closed))
+        self.assertEqual(lifetimes['open']['med'], baseline_median(still_open))
+        self.assertEqual(lifetimes['all']['med'], baseline_median(closed + still_open))
+
+    def test_stale_arrays_are_recomputed(self):
+        uids = self.populate(seed = 5, issues = 20, changes = 0)
+        issue.index.journal.compact(issue.index.statistics._statistics_path(), issue.index.statistics._fold)
+        # As if a compaction crashed after writing only some of the files.
+        issue.util.atomic.write(issue.index.statistics._statistics_path('.closed'), b'')
+        issue.util.atomic.write(issue.index.statistics._statistics_path('.open'), b'')
+        self.repository.close(uids[0], timestamp = indexes.BASE_TIME)
+        lifetimes = issue.index.statistics.lifetimes(now = NOW)
+        counters = issue.index.statistics.counters()
+        issue.index.statistics.rebuild()
+        self.assertEqual(lifetimes, issue.index.statistics.lifetimes(now = NOW))
+        self.assertEqual(counters, issue.index.statistics.counters())
+        self.assertEqual(lifetimes['closed']['total'], datetime.timedelta(seconds = (indexes.BASE_TIME - self.repository.get(uids[0])['open.timestamp'])))
+
+    def test_concurrent_updates_are_counted(self):
+        uids = self.populate(seed = 10, issues = 10, changes = 0)
+        counters = issue.index.statistics.counters()
+        replaced = issue.index.summary.get(uids[:2])
+        closing = dict((each, dict(self.repository.get(each), **{'status': 'closed', 'close.timestamp': indexes.BASE_TIME})) for each in uids[:2])
+        # Both updates read the aggregates before either of them writes.
+        barrier = threading.Barrier(len(closing))
+        read = issue.index.journal.read
+        def racing_read(path):
+            entries = read(path)
+            barrier.wait(timeout = 10)
+            return entries
+        with unittest.mock.patch('issue.index.journal.read', side_effect = racing_read):
+            threads = [threading.Thread(target = issue.index.statistics.update, args = ({each: data}, {each: replaced[each]}))
+                for each, data in closing.items()]
+            for each in threads:
+                each.start()
+            for each in threads:
+                each.join()
+        self.assertEqual(issue.index.statistics.counters()['statuses'].get('closed', 0), counters['statuses'].get('closed', 0) + 2)
+        self.assertEqual(issue.index.statistics.counters()['statuses'].get('open', 0), counters['statuses'].get('open', 0) - 2)
@@ -0,0 +1,89 @@
+import json
+import os
+
+import issue
+
+from tests import scratch, test_encoding
+
+
+class GcTests(scratch.ScratchRepositoryTestCase):
+    def populate(self):
+        r = self.repository
+        uids = [r.open('issue {0}'.format(i)) for i in range(5)]
+        r.comment(uids[0], 'a comment')
+        r.param(uids[1], 'key', 'value')
+        r.close(uids[2])
+        return uids
+
+    def contents(self, uids):
+        contents = {}
+        for issue_uid in uids:
+            for kind in issue.objects.store.KINDS:
+                object_ids = issue.objects.store.ls(issue_uid, kind)
+                contents[(issue_uid, kind)] = dict(zip(object_ids, issue.objects.store.read(issue_uid, kind, *object_ids)))
+        return contents
+
+    def issues(self, uids):
+        return dict((each, issue.util.issues.getIssue(each)) for each in uids)
+
+    def assertReadable(self, uids, contents, issues):
+        self.assertEqual(self.contents(uids), contents)
+        for each in uids:
+            issue.util.issues.indexIssue(each, full = True)
+        self.assertEqual(self.issues(uids), issues)
+
+    def test_gc_then_read(self):
+        uids = self.populate()
+        contents, issues = self.contents(uids), self.issues(uids)
+        pack_name, count = issue.objects.store.gc()
+        self.assertIsNotNone(pack_name)
+        self.assertEqual(count, sum(len(each) for each in contents.values()))
+        for each in uids:
+            self.assertEqual(issue.objects.store._loose_files(each, issue.objects.store.KIND_DIFF), {})
+        self.assertReadable(uids, contents, issues)
+        self.assertEqual(issue.objects.store.gc(), (None, 0))
+
+    def test_repack_drops_objects_of_dropped_issues(self):
+        uids = self.populate()
+        issue.objects.store.gc()
+        self.repository.drop(uids[0])
+        uids = uids[1:]
+        contents, issues = self.contents(uids), self.issues(uids)
+        pack_name, count = issue.objects.store.gc(repack = True)
+        self.assertEqual(issue.objects.store.ls_packs(), [pack_name])
+        self.assertEqual(count, sum(len(each) for each in contents.values()))
+        self.assertReadable(uids, contents, issues)
+
+    def test_repack_converts_binary_diffs(self):
+        uids = self.populate()
+        legacy_path = os.path.join(issue.objects.store._loose_dir(uids[0], issue.objects.store.KIND_DIFF), 'legacy.bin')
+        issue.util.atomic.write(legacy_path, test_encoding.LEGACY_BINARY)
+        issue.util.issues.indexIssue(uids[0], full = True)
+        issues = self.issues(uids)
+        issue.objects.store.gc(repack = True)
+        for each in uids:
+            for contents in issue.objects.store.read(each, issue.objects.store.KIND_DIFF, *issue.objects.store.ls(each, issue.objects.store.KIND_DIFF)):
+                json.loads(bytes(contents))
+        for each in uids:
+            issue.util.issues.indexIssue(each, full = True)
+        self.assertEqual(self.issues(uids), issues)
+
+    def test_transfer_path_extracts_json(self):
+        uids = self.populate()
+        issue.objects.store.gc()
+        diff_uid = issue.objects.store.ls(uids[0], issue.objects.store.KIND_DIFF)[0]
+        path = issue.objects.store.transfer_path(uids[0], issue.objects.store.KIND_DIFF, diff_uid)
+        self.assertTrue(path.endswith('.json'))
+        self.assertEqual(issue.objects.encoding.read(path), issue.util.issues.getIssueDifferences(uids[0], diff_uid))
+
+
+class ExchangeGcTests(scratch.ScratchRepositoryTestCase):
+    status = 'exchange'
+
+    def test_gc_is_refused(self):
+        issue_uid = self.repository.open('exchanged issue')
+        with self.assertRaises(issue.exceptions.ExchangeRepository):
+            issue.objects.store.gc()
+        self.assertEqual(issue.objects.store.ls_packs(), [])
+        self.assertTrue(issue.objects.store._loose_files(issue_uid, issue.objects.store.KIND_DIFF))
+        self.assertTrue(os.path.isdir(issue.util.paths.diffs_path_of(issue_uid)))
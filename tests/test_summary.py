@@ -0,0 +1,43 @@
+import os
+import unittest.mock
+
+import issue
+
+from tests import indexes
+
+
+class SummaryIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        def summaries(statuses=None):
+            return dict((k, dict(v, tags = sorted(v.get('tags', [])))) for k, v in issue.index.summary.read(statuses).items())
+        return {
+            'summary': summaries(),
+            'summary of open': summaries(['open']),
+            'summary of closed and wip': summaries(['closed', 'wip']),
+        }
+
+    def test_lookups_match_read(self):
+        uids = self.populate(seed = 4, issues = 20, changes = 40)
+        summaries = issue.index.summary.read()
+        self.assertEqual(set(uids), set(summaries))
+        self.assertEqual(summaries, issue.index.summary.get(uids + ['0' * 128]))
+        self.assertEqual((summaries, []), issue.index.summary.load(uids))
+
+    def test_missing_summaries_are_added(self):
+        uids = self.populate(seed = 5, issues = 5, changes = 0)
+        summaries = issue.index.summary.read()
+        # Only the summary index is lost; issues keep their own indexes.
+        issue.index.journal.compact(issue.util.paths.summary_index_path(), issue.index.summary._fold)
+        os.unlink(issue.util.paths.summary_index_path())
+        self.assertEqual((summaries, []), issue.index.summary.load(uids))
+        self.assertEqual(summaries, issue.index.summary.read())
+
+    def test_journal_is_compacted(self):
+        with unittest.mock.patch('issue.index.journal.COMPACTION_MIN_SIZE', 0):
+            self.populate(seed = 3, issues = 5, changes = 5)
+        self.assertFalse(os.path.exists(issue.index.journal.journal_path(issue.util.paths.summary_index_path())))
+        self.assertEqual(len(issue.index.summary.read()), issue.index.uids.count())
+
+
+if __name__ == '__main__':
+    unittest.main()
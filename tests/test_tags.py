@@ -0,0 +1,38 @@
+import unittest
+
+import issue
+
+from tests import indexes
+
+
+class TagsIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        return {
+            'counts': issue.index.tags.counts(),
+            'tagged': dict((t, issue.index.tags.issues_of(t)) for t in indexes.TAGS),
+            'selected': dict((t, issue.index.tags.select(uids, [t])) for t in ('bug', '^bug')),
+        }
+
+    def test_queries_match_summaries(self):
+        uids = self.populate(seed = 4, issues = 30, changes = 80)
+        tags_of = dict((k, set(v.get('tags', []))) for k, v in issue.index.summary.read().items())
+        counts = {}
+        for each in tags_of.values():
+            for t in each:
+                counts[t] = counts.get(t, 0) + 1
+        self.assertEqual(counts, issue.index.tags.counts())
+        for t in indexes.TAGS:
+            with self.subTest(tag = t):
+                self.assertEqual(set(k for k, v in tags_of.items() if t in v), issue.index.tags.issues_of(t))
+        self.assertEqual(set(k for k, v in tags_of.items() if v.intersection({'bug', 'ui'}) and 'core' not in v),
+            issue.index.tags.select(uids, ['bug', 'ui', '^core']))
+        self.assertEqual(set(k for k, v in tags_of.items() if 'core' not in v), issue.index.tags.select(uids, ['^core']))
+        self.assertEqual(set(), issue.index.tags.select(uids, []))
+
+    def test_known_tags_include_unused_ones(self):
+        issue.objects.tags.make('unused')
+        self.assertEqual(set(indexes.TAGS + ('unused',)), issue.index.tags.known())
+
+
+if __name__ == '__main__':
+    unittest.main()
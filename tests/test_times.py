@@ -0,0 +1,38 @@
+import unittest
+
+import issue
+
+from tests import indexes
+
+
+WINDOWS = (
+    (None, None),
+    ((indexes.BASE_TIME - (indexes.SPREAD / 2)), indexes.BASE_TIME),
+    (indexes.BASE_TIME, None),
+    (None, (indexes.BASE_TIME - indexes.SPREAD)),
+)
+
+
+class TimesIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        return dict(('{0} {1} {2}'.format(field, since, until), issue.index.times.between(field, since, until))
+            for field in issue.index.times.FIELDS for since, until in WINDOWS)
+
+    def test_windows_match_summaries(self):
+        self.populate(seed = 4, issues = 30, changes = 80)
+        summaries = issue.index.summary.read()
+        for field in issue.index.times.FIELDS:
+            for since, until in WINDOWS:
+                with self.subTest(field = field, since = since, until = until):
+                    expected = set(k for k, v in summaries.items()
+                        if (since is None or v.get(field, 0) >= since) and (until is None or v.get(field, 0) <= until))
+                    self.assertEqual(expected, issue.index.times.between(field, since, until))
+
+    def test_bounds_are_inclusive(self):
+        uids = self.populate(seed = 5, issues = 5, changes = 0)
+        opened = issue.index.summary.read()[uids[0]]['open.timestamp']
+        self.assertIn(uids[0], issue.index.times.between('open.timestamp', opened, opened))
+
+
+if __name__ == '__main__':
+    unittest.main()
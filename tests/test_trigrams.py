@@ -0,0 +1,33 @@
+import unittest
+
+import issue
+
+from tests import indexes
+
+
+KEYWORDS = [[w] for w in indexes.WORDS] + [['=pars'], ['+gam'], ['alpha', '=leak'], ['ab'], ['^slow', 'memory']]
+
+
+class TrigramsIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        return dict((' '.join(each), issue.index.trigrams.candidates(uids, each)) for each in KEYWORDS)
+
+    def test_candidates_include_all_matches(self):
+        uids = self.populate(seed = 4, issues = 30, changes = 80)
+        for each in KEYWORDS:
+            with self.subTest(keywords = each):
+                candidates = issue.index.trigrams.candidates(uids, each)
+                matching = set(k for k in uids
+                    if issue.repository.keyword_score(self.repository.get(k)['message'].lower(), each) > 0)
+                self.assertLessEqual(matching, candidates)
+
+    def test_candidates_are_narrowed(self):
+        uids = self.populate(seed = 5, issues = 20, changes = 0)
+        self.assertEqual(set(), issue.index.trigrams.candidates(uids, ['zebra']))
+        self.assertEqual(set(uids), issue.index.trigrams.candidates(uids, ['ab']))
+        with_alpha = set(k for k in uids if 'alpha' in self.repository.get(k)['message'])
+        self.assertEqual(with_alpha, issue.index.trigrams.candidates(uids, ['alpha']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import re
+import unittest
+
+from tests import cli
+
+
+class UiCacheTests(cli.CommandTestCase):
+    def ui_model(self):
+        """Return how the UI model was obtained by a run of issue.py: 'built'
+        or 'cached'.
+        """
+        status, output, error = self.issue('--timing', '--version')
+        self.assertEqual(0, status, (output + error))
+        return re.search(r'^timing: ui model .*\((\w+)\)$', error, re.MULTILINE).group(1)
+
+    def cache_path(self):
+        return os.path.join(self.directory, '.cache', 'issue', 'ui.pickle')
+
+    def test_built_model_is_cached(self):
+        self.assertEqual('built', self.ui_model())
+        self.assertTrue(os.path.isfile(self.cache_path()))
+        self.assertEqual('cached', self.ui_model())
+
+    def test_changed_ui_description_is_built_again(self):
+        self.ui_model()
+        with open(os.path.join(self.directory, '.local', 'share', 'issue', 'ui.json'), 'a') as ofstream:
+            ofstream.write('\n')
+        self.assertEqual('built', self.ui_model())
+        self.assertEqual('cached', self.ui_model())
+
+    def test_unreadable_cache_is_built_again(self):
+        self.ui_model()
+        with open(self.cache_path(), 'wb') as ofstream:
+            ofstream.write(b'not a pickle')
+        self.assertEqual('built', self.ui_model())
+        self.assertEqual('cached', self.ui_model())
+
+    def test_cached_model_parses_commands(self):
+        self.ui_model()
+        self.assertSucceeds('open', 'Cached model')
+        self.assertIn('Cached model', self.assertSucceeds('ls'))
+
+
+if __name__ == '__main__':
+    unittest.main()
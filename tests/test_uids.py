@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+import unittest.mock
+
+import issue
+
+from tests import indexes
+
+
+class UidsIndexTests(indexes.IndexTestCase):
+    def snapshot(self, uids):
+        return {
+            'uids': issue.index.uids.ls(),
+            'count': issue.index.uids.count(),
+            'shortest unique prefix': issue.index.uids.shortest_unique_prefix(),
+            'match': [issue.index.uids.match(each[:2], limit = None) for each in uids],
+            'present': issue.index.uids.present(uids + ['0' * 128]),
+        }
+
+    def assertConsistent(self):
+        uids = issue.index.uids.ls()
+        self.assertEqual(issue.index.uids.count(), len(uids))
+        prefix = issue.index.uids.shortest_unique_prefix()
+        self.assertEqual(len(set(each[:prefix] for each in uids)), len(uids))
+        self.assertLess(len(set(each[:(prefix - 1)] for each in uids)), len(uids))
+
+    def test_updates_do_not_rewrite_histogram(self):
+        self.populate(seed = 6, issues = 5, changes = 0)
+        issue.index.uids.count()
+        stat = os.stat(issue.index.uids._lcp_path())
+        self.populate(seed = 7, issues = 5, changes = 0)
+        self.assertEqual(os.stat(issue.index.uids._lcp_path()).st_mtime_ns, stat.st_mtime_ns)
+        self.assertEqual(issue.index.uids.count(), 10)
+        self.assertConsistent()
+
+    def test_stale_histogram_is_recomputed(self):
+        self.populate(seed = 8, issues = 10, changes = 0)
+        issue.index.journal.compact(issue.index.uids._uids_path(), issue.index.uids._fold)
+        # As if a crash happened between writing the index and its histogram.
+        issue.util.atomic.write(issue.index.uids._lcp_path(), json.dumps({
+            'stamp': [0, 0, 0],
+            'count': 1000,
+            'lcp': {'127': 999},
+        }))
+        self.assertConsistent()
+        with open(issue.index.uids._lcp_path()) as ifstream:
+            self.assertEqual(json.loads(ifstream.read())['count'], 10)
+
+    def test_concurrent_updates_are_counted(self):
+        uids = self.populate(seed = 9, issues = 10, changes = 0)
+        added = ['a' * 128, ('a' * 127) + 'b']
+        # Both updates read the index before either of them writes.
+        barrier = threading.Barrier(len(added))
+        read = issue.index.journal.read
+        def racing_read(path):
+            entries = read(path)
+            barrier.wait(timeout = 10)
+            return entries
+        with unittest.mock.patch('issue.index.journal.read', side_effect = racing_read):
+            threads = [threading.Thread(target = issue.index.uids.update, kwargs = {'added': [each]}) for each in added]
+            for each in threads:
+                each.start()
+            for each in threads:
+                each.join()
+        self.assertEqual(issue.index.uids.ls(), sorted(uids + added))
+        self.assertEqual(issue.index.uids.shortest_unique_prefix(), 128)
+        self.assertConsistent()